@@ -1,2 +1,49 @@
+"""Convert OmniGraffle documents to svg.
 
-from main import *
+The names exported here are imported from their modules when first
+used, so importing the package - or one module of it, as the command
+line tool does - doesn't load the whole converter.
+"""
+import sys
+import types
+import importlib
+import pkgutil
+
+# exported name -> module it comes from; any other name is a module of
+# the package, or comes from main
+EXPORTS = {
+    "convert": "engine",
+    "ConversionEngine": "engine",
+    "iter_graphics": "query",
+    "GraphicInfo": "query",
+    "read_info": "fileinfo",
+    "ResourceLimits": "limits",
+    "ResourceLimitExceeded": "limits",
+}
+
+
+class LazyPackage(types.ModuleType):
+    """The package, importing what it exports on first use"""
+    def __getattr__(self, name):
+        if name == "__all__":
+            main = importlib.import_module(__name__ + ".main")
+            value = [n for n in dir(main) if not n.startswith("_")] + sorted(EXPORTS)
+        elif name.startswith("__"):
+            raise AttributeError(name)
+        elif name not in EXPORTS and pkgutil.find_loader(__name__ + "." + name) is not None:
+            value = importlib.import_module(__name__ + "." + name)
+        else:
+            module = importlib.import_module(__name__ + "." + EXPORTS.get(name, "main"))
+            try:
+                value = getattr(module, name)
+            except AttributeError:
+                raise AttributeError("'module' object has no attribute '%s'" % name)
+        setattr(self, name, value)
+        return value
+
+
+_package = LazyPackage(__name__, __doc__)
+_package.__dict__.update(globals())
+# this module's globals are cleared when it is collected, so keep it
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -0,0 +1,411 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Convert a whole archive of diagrams, split between build machines.
+
+Either give each machine a fixed share of the files:
+
+    graffle2svg --batch --shard 1/3 --report r1.json SOURCEDIR DESTDIR
+    graffle2svg --batch --shard 2/3 --report r2.json SOURCEDIR DESTDIR
+    ...
+
+(a file's shard only depends on its path, so every machine agrees on
+the split without talking to the others), or let them take files from
+a spool directory they all share, so faster machines do more:
+
+    graffle2svg --batch --spool /shared/spool SOURCEDIR DESTDIR
+
+A file is claimed by renaming its job from todo/ into claimed/, which
+only one machine can do. The claim is a lease, kept alive while the file
+converts: a machine which crashes stops renewing it, and once it expires
+the job goes back to todo/ for another. A job is therefore done at least
+once - converting a file twice writes the same svg. A job names the
+file and a hash of its contents, so a spool can be used again for the
+next run: only files changed since are converted again.
+
+Leases are timed by the spool's file system, not the machines' clocks:
+a lease's start is the mtime the file server sets on its job, and
+"now" is read back from a probe file touched on the same server.
+
+Each machine's report lists the files it converted, how long they took
+and any errors; --merge-reports joins them (the spool's own report, made
+from its done/ directory, already covers every machine).
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+from main import GraffleParser
+from parallel import renderSheets
+from graffledir import graffleFiles, fileHash
+from watch import sheetOutputName
+import filepack
+
+# seconds a claimed job is kept without its lease being renewed
+DEFAULT_LEASE = 300.
+# seconds between looks at the spool while waiting for other machines
+POLL_INTERVAL = 1.
+
+
+def parseShard(text):
+    """"2/4" -> (2, 4) - shards are numbered from 1"""
+    try:
+        index, count = [int(part) for part in text.split("/")]
+    except ValueError:
+        raise ValueError("a shard is written INDEX/COUNT, e.g. 2/4: %r" % text)
+    if not 1 <= index <= count:
+        raise ValueError("shard %d/%d: INDEX must be from 1 to COUNT" % (index, count))
+    return index, count
+
+def pathKey(path):
+    """A relative path as bytes with / between its parts - the same on
+       every machine (paths from os.walk are already bytes)"""
+    path = path.replace(os.sep, "/")
+    if isinstance(path, unicode):
+        path = path.encode("utf-8")
+    return path
+
+def shardOf(path, count):
+    """The shard (from 1) a file belongs to, from a hash of its relative
+       path - the same on every machine and every run"""
+    return int(hashlib.md5(pathKey(path)).hexdigest(), 16) % count + 1
+
+def shardFiles(paths, index, count):
+    return [path for path in paths if shardOf(path, count) == index]
+
+def workerName():
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+def writeAtomically(filename, data):
+    """Write a file so readers (and other machines) only ever see it whole"""
+    tmpname = "%s.tmp-%s" % (filename, workerName())
+    f = open(tmpname, "wb")
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    os.rename(tmpname, filename)
+
+
+def convertFile(task):
+    """Convert every sheet of one file - what the workers run. Returns
+       its report entry: the svg files written, bytes, seconds and any
+       error."""
+    srcdir, destdir, path, options = task
+    started = time.time()
+    record = {"path": path, "outputs": [], "bytes": 0, "error": None,
+              "worker": workerName()}
+    try:
+        grafflefilepack = filepack.GraffleFilePack(os.path.join(srcdir, path))
+        try:
+            document = GraffleParser().decodeGraffle(grafflefilepack, streaming = True)
+        finally:
+            grafflefilepack.close()
+        svgs = renderSheets(document, processes = 1, **options)
+        outdir = os.path.join(destdir, os.path.dirname(path))
+        if not os.path.isdir(outdir):
+            try:
+                os.makedirs(outdir)
+            except OSError:
+                # made by another worker meanwhile
+                if not os.path.isdir(outdir):
+                    raise
+        for page, svg in enumerate(svgs):
+            outname = sheetOutputName(outdir, path, page, len(svgs))
+            writeAtomically(outname, svg)
+            record["outputs"].append(os.path.relpath(outname, destdir))
+            record["bytes"] += len(svg)
+    except Exception, e:
+        record["error"] = "%s: %s" % (e.__class__.__name__, e)
+    record["seconds"] = round(time.time() - started, 3)
+    return record
+
+
+def summarise(records):
+    """A report of the given file entries, one per path (the last wins),
+       with totals"""
+    files = dict((record["path"], record) for record in records)
+    files = [files[path] for path in sorted(files)]
+    return {"files": files,
+            "converted": len([r for r in files if r["error"] is None]),
+            "failed": len([r for r in files if r["error"] is not None]),
+            "bytes": sum(r["bytes"] for r in files),
+            "seconds": round(sum(r["seconds"] for r in files), 3)}
+
+def mergeReports(reports):
+    """Join reports from several machines into one"""
+    records = []
+    for report in reports:
+        records.extend(report["files"])
+    return summarise(records)
+
+def readReport(filename):
+    f = open(filename)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def writeReport(report, filename):
+    writeAtomically(filename, json.dumps(report, indent = 2, sort_keys = True) + "\n")
+
+
+def runShard(srcdir, destdir, shard = None, processes = None, **options):
+    """Convert the files of one shard ((index, count), or all files when
+       None) - options are those of the GraffleParser. Returns the report."""
+    paths = graffleFiles(srcdir)
+    if shard is not None:
+        paths = shardFiles(paths, *shard)
+    tasks = [(srcdir, destdir, path, options) for path in paths]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(tasks))
+    if processes <= 1:
+        records = [convertFile(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            records = pool.map(convertFile, tasks, chunksize = 1)
+        finally:
+            pool.close()
+            pool.join()
+    return summarise(records)
+
+
+class Spool(object):
+    """A work queue in a directory shared between machines:
+
+         todo/JOB     files no one is converting (JOB holds the path,
+                      and is named PATHHASH-VERSIONHASH)
+         claimed/JOB  files being converted - the mtime is when the
+                      lease was last renewed
+         done/JOB     the report entry of each file converted
+         clock-WORKER made and removed again to read the spool's time
+
+       Every step is a rename, which happens entirely or not at all, so
+       no locks are needed.
+    """
+    def __init__(self, directory, lease = DEFAULT_LEASE):
+        self.directory = directory
+        self.lease = lease
+        for state in ("todo", "claimed", "done"):
+            path = os.path.join(directory, state)
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    if not os.path.isdir(path):
+                        raise
+
+    def jobFile(self, state, job):
+        return os.path.join(self.directory, state, job)
+
+    def jobName(self, srcdir, path):
+        """The job converting srcdir/path as it is now - a hash of the path,
+           then a hash of the file's contents"""
+        return "%s-%s" % (hashlib.md5(pathKey(path)).hexdigest(),
+                          fileHash(os.path.join(srcdir, path))[:16])
+
+    def currentJobs(self, srcdir, paths):
+        """job name -> path, for those of the files which still exist"""
+        current = {}
+        for path in paths:
+            try:
+                current[self.jobName(srcdir, path)] = path
+            except (IOError, OSError):
+                # deleted meanwhile
+                pass
+        return current
+
+    def jobs(self, state):
+        return sorted(name for name in os.listdir(os.path.join(self.directory, state))
+                      if ".tmp-" not in name)
+
+    def fill(self, srcdir, paths):
+        """Queue the files (relative to srcdir) not already queued, being
+           converted or done as they are now - every machine can do this,
+           as a job always has the same name. Jobs for earlier versions of
+           the files are dropped. Returns how many were added."""
+        current = self.currentJobs(srcdir, paths)
+        files = set(job.split("-")[0] for job in current)
+        for state in ("todo", "done"):
+            for job in self.jobs(state):
+                if job.split("-")[0] in files and job not in current:
+                    try:
+                        os.remove(self.jobFile(state, job))
+                    except OSError:
+                        # claimed, or dropped by someone else
+                        pass
+        added = 0
+        for job, path in sorted(current.items()):
+            # in the order jobs move, so one moving on isn't missed
+            if os.path.exists(self.jobFile("todo", job)) or \
+                    os.path.exists(self.jobFile("claimed", job)) or \
+                    os.path.exists(self.jobFile("done", job)):
+                continue
+            if isinstance(path, unicode):
+                path = path.encode("utf-8")
+            writeAtomically(self.jobFile("todo", job), path)
+            added += 1
+        return added
+
+    def claim(self):
+        """Take a job from todo/, returning (job, path) - None when
+           there are none left"""
+        for job in self.jobs("todo"):
+            try:
+                # the lease starts now, not when the job was queued
+                os.utime(self.jobFile("todo", job), None)
+                os.rename(self.jobFile("todo", job), self.jobFile("claimed", job))
+            except OSError:
+                # claimed by someone else first
+                continue
+            try:
+                f = open(self.jobFile("claimed", job))
+                try:
+                    return job, f.read()
+                finally:
+                    f.close()
+            except IOError:
+                # its lease expired already, and someone else has it
+                continue
+        return None
+
+    def renew(self, job):
+        try:
+            os.utime(self.jobFile("claimed", job), None)
+        except OSError:
+            pass
+
+    def finish(self, job, record):
+        writeAtomically(self.jobFile("done", job), json.dumps(record))
+        for state in ("claimed", "todo"):
+            try:
+                os.remove(self.jobFile(state, job))
+            except OSError:
+                pass
+
+    def now(self):
+        """The time on the spool's file system - touching a probe file
+           there, so leases (timed by the mtimes the server sets) don't
+           depend on this machine's clock agreeing with it"""
+        probe = os.path.join(self.directory, "clock-%s" % workerName())
+        open(probe, "w").close()
+        try:
+            return os.stat(probe).st_mtime
+        finally:
+            os.remove(probe)
+
+    def requeueExpired(self, now = None):
+        """Put jobs whose lease has run out back in todo/. Returns how many."""
+        if now is None:
+            now = self.now()
+        requeued = 0
+        for job in self.jobs("claimed"):
+            try:
+                if os.stat(self.jobFile("claimed", job)).st_mtime + self.lease >= now:
+                    continue
+                os.rename(self.jobFile("claimed", job), self.jobFile("todo", job))
+                requeued += 1
+            except OSError:
+                # finished, or requeued by someone else
+                pass
+        return requeued
+
+    def report(self, srcdir = None):
+        """The report of every file done, by every machine - given srcdir,
+           only of the files there as they are now"""
+        jobs = self.jobs("done")
+        if srcdir is not None:
+            current = self.currentJobs(srcdir, graffleFiles(srcdir))
+            jobs = [job for job in jobs if job in current]
+        records = []
+        for job in jobs:
+            try:
+                f = open(self.jobFile("done", job))
+                try:
+                    records.append(json.load(f))
+                finally:
+                    f.close()
+            except IOError:
+                pass
+        return summarise(records)
+
+
+class LeaseKeeper(object):
+    """Renews a job's lease from a thread while the file converts"""
+    def __init__(self, spool, job):
+        self.spool = spool
+        self.job = job
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target = self.run)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.spool.lease / 3.):
+            self.spool.renew(self.job)
+
+
+def spoolWorker(task):
+    """Convert files from the spool until every job is done.
+       Returns the report entries of the files this worker converted."""
+    spool_dir, lease, srcdir, destdir, options, poll = task
+    spool = Spool(spool_dir, lease)
+    records = []
+    while True:
+        spool.requeueExpired()
+        claimed = spool.claim()
+        if claimed is None:
+            if not spool.jobs("claimed"):
+                return records
+            # wait for the other machines, taking over any job they drop
+            time.sleep(poll)
+            continue
+        job, path = claimed
+        with LeaseKeeper(spool, job):
+            record = convertFile((srcdir, destdir, path, options))
+        spool.finish(job, record)
+        records.append(record)
+
+def runSpool(spool_dir, srcdir, destdir, processes = None, lease = DEFAULT_LEASE,
+             poll = POLL_INTERVAL, **options):
+    """Queue srcdir's files in the spool (if they aren't yet) and convert
+       them with the other machines sharing it, until all are done.
+       Returns the report of the files converted here - Spool.report()
+       has those of every machine."""
+    spool = Spool(spool_dir, lease)
+    spool.fill(srcdir, graffleFiles(srcdir))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    task = (spool_dir, lease, srcdir, destdir, options, poll)
+    if processes <= 1:
+        records = spoolWorker(task)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            records = sum(pool.map(spoolWorker, [task] * processes, chunksize = 1), [])
+        finally:
+            pool.close()
+            pool.join()
+    return summarise(records)
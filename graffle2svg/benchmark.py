@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Conversion benchmarks over synthetic documents.
+
+   python benchmark.py                 run and compare with the baseline
+   python benchmark.py --save          record this machine's figures as the baseline
+   python benchmark.py --golden        only check converted output against the golden hashes
+   python benchmark.py --update-golden accept the current output as golden
+   python benchmark.py --emitters      time each scene emitter on its own
+   python benchmark.py --startup       only time the command line tool starting up
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+from main import GraffleParser
+from synthetic import SyntheticGraffle
+import filepack
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(PACKAGE_DIR, "benchmarks")
+SCRIPT = os.path.join(PACKAGE_DIR, "scripts", "graffle2svg")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+GOLDEN_FILE = os.path.join(BENCH_DIR, "golden.json")
+
+# name -> (SyntheticGraffle arguments, stored gzipped?)
+CASES = [
+    ("small",       dict(shapes=50), False),
+    ("text-heavy",  dict(shapes=500, text_density=1.0), False),
+    ("nested",      dict(shapes=500, depth=6), False),
+    ("many-sheets", dict(shapes=100, sheets=20), False),
+    ("images",      dict(shapes=200, images=50), False),
+    ("gzip",        dict(shapes=500), True),
+    ("large",       dict(shapes=5000, depth=2), False),
+]
+
+# seconds from starting the command line tool on a trivial document to
+# the first byte of its svg
+STARTUP_BUDGET = 0.050
+# document for the startup case
+STARTUP_DOCUMENT = dict(shapes=5, seed=1)
+
+# small documents whose output must not change by accident
+GOLDEN_CASES = [
+    ("golden-basic",  dict(shapes=40, seed=11)),
+    ("golden-text",   dict(shapes=30, text_density=1.0, seed=12)),
+    ("golden-nested", dict(shapes=40, depth=3, seed=13)),
+    ("golden-sheets", dict(shapes=15, sheets=3, images=4, seed=14)),
+]
+
+
+def convertAll(data, sheets):
+    """Convert every sheet, returning the svg of each"""
+    gp = GraffleParser()
+    mydict = gp.decodeGraffle(data)
+    out = []
+    for page in range(sheets):
+        gp.reset()
+        gp.walkGraffleDict(mydict, page)
+        gp.svg_add_requirements()
+        out.append(gp.svg.encode("utf-8"))
+    return out
+
+
+def goldenOutput(args):
+    """sha1 of the svg of every sheet of a golden document"""
+    gen = SyntheticGraffle(**args)
+    digest = hashlib.sha1()
+    for svg in convertAll(gen.xml(), gen.sheets):
+        digest.update(svg)
+    return digest.hexdigest()
+
+
+def checkGolden(update = False):
+    """Compare (or replace) the golden hashes; returns the mismatching case names"""
+    golden = {}
+    if os.path.exists(GOLDEN_FILE):
+        golden = json.load(open(GOLDEN_FILE))
+    current = dict([(name, goldenOutput(args)) for (name, args) in GOLDEN_CASES])
+    if update:
+        writeJSON(GOLDEN_FILE, current)
+        return []
+    return [name for name in sorted(current.keys()) if golden.get(name) != current[name]]
+
+
+def measureCase(name, args, gzipped, repeat = 3):
+    gen = SyntheticGraffle(**args)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(tmpdir, name + ".graffle")
+        f = open(fn, "wb")
+        if gzipped:
+            f.write(gen.gzipped())
+        else:
+            f.write(gen.xml())
+        f.close()
+        file_bytes = os.path.getsize(fn)
+
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            gfp = filepack.GraffleFilePack(fn)
+            data = gfp.read()
+            gfp.close()
+            svgs = convertAll(data, gen.sheets)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+
+        peak = measurePeak(fn, gen.sheets)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    output_bytes = sum([len(s) for s in svgs])
+    return {"seconds": best,
+            "shapes_per_second": gen.shapeCount() / best,
+            "mb_per_second": len(data) / best / 1e6,
+            "input_bytes": len(data),
+            "file_bytes": file_bytes,
+            "output_bytes": output_bytes,
+            "peak_memory": peak}
+
+
+def peakGrowth(fn, sheets):
+    """Read and convert a file, returning how far this process's peak
+       resident size grew meanwhile - what measurePeak runs in a fresh
+       interpreter"""
+    from memory import peakResidentSize
+    before = peakResidentSize()
+    gfp = filepack.GraffleFilePack(fn)
+    convertAll(gfp.read(), sheets)
+    gfp.close()
+    return peakResidentSize() - before
+
+
+def measurePeak(fn, sheets):
+    """Bytes of memory converting a file needs, measured in a fresh
+       interpreter so earlier cases don't hide it - None where that
+       can't be done"""
+    child = subprocess.Popen([sys.executable, "-c",
+                              "import sys, benchmark\n"
+                              "sys.stdout.write(repr(benchmark.peakGrowth(%r, %d)))\n"
+                              % (fn, sheets)],
+                             stdout = subprocess.PIPE, cwd = PACKAGE_DIR)
+    output = child.communicate()[0]
+    if child.returncode != 0:
+        return None
+    return int(output)
+
+
+def measureEmitters(args, repeat = 3):
+    """Best seconds to write one scene with each of the scene emitters"""
+    import StringIO
+    import scene
+    document = GraffleParser().decodeGraffle(SyntheticGraffle(**args).xml())
+    built = scene.buildScene(document)
+    times = []
+    for emitter in (scene.DOMEmitter(), scene.StreamEmitter(), scene.JSONEmitter()):
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            emitter.write(built, StringIO.StringIO())
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        times.append((emitter.__class__.__name__, best))
+    return times
+
+
+def startupEnvironment():
+    """Environment for a fresh interpreter which imports this checkout"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(PACKAGE_DIR)] +
+                                        filter(None, [env.get("PYTHONPATH")]))
+    return env
+
+
+def measureStartup(repeat = 10):
+    """Best seconds for a fresh interpreter to import the conversion
+       code, and for graffle2svg --stdout to write the first byte of a
+       trivial document's svg (which includes starting python)"""
+    env = startupEnvironment()
+    import_seconds = None
+    for i in range(repeat):
+        child = subprocess.Popen([sys.executable, "-c",
+                                  "import sys, time\n"
+                                  "start = time.time()\n"
+                                  "import graffle2svg.engine\n"
+                                  "sys.stdout.write(repr(time.time() - start))\n"],
+                                 stdout = subprocess.PIPE, env = env)
+        elapsed = float(child.communicate()[0])
+        if import_seconds is None or elapsed < import_seconds:
+            import_seconds = elapsed
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(tmpdir, "startup.graffle")
+        f = open(fn, "wb")
+        f.write(SyntheticGraffle(**STARTUP_DOCUMENT).xml())
+        f.close()
+        first_byte = None
+        for i in range(repeat):
+            start = time.time()
+            child = subprocess.Popen([sys.executable, SCRIPT, "--stdout", fn],
+                                     stdout = subprocess.PIPE, env = env)
+            byte = os.read(child.stdout.fileno(), 1)
+            elapsed = time.time() - start
+            child.communicate()
+            if not byte or child.returncode != 0:
+                raise RuntimeError("graffle2svg --stdout failed on the startup document")
+            if first_byte is None or elapsed < first_byte:
+                first_byte = elapsed
+    finally:
+        shutil.rmtree(tmpdir)
+    return {"import_seconds": import_seconds,
+            "first_byte_seconds": first_byte}
+
+
+def compareStartup(result, baseline, tolerance):
+    """Lines describing the startup times; second value is True when
+       they are over the budget or slower than tolerated"""
+    lines = []
+    regressed = False
+    for key, label in (("import_seconds", "import"), ("first_byte_seconds", "first byte")):
+        notes = []
+        if baseline is not None and baseline.get(key) is not None:
+            ratio = result[key] / max(baseline[key], 1e-9)
+            notes.append("%+.0f%%" % ((ratio - 1) * 100))
+            if ratio > 1 + tolerance:
+                regressed = True
+                notes[-1] += " !"
+        if key == "first_byte_seconds" and result[key] > STARTUP_BUDGET:
+            regressed = True
+            notes.append("over the %.0f ms budget !" % (STARTUP_BUDGET * 1000))
+        lines.append("%-12s %-10s %7.1f ms  %s" % ("startup", label, result[key] * 1000,
+                                                   ", ".join(notes)))
+    return lines, regressed
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each case against the baseline; second value is
+       True when something got slower, bigger or hungrier than tolerated"""
+    lines = []
+    regressed = False
+    fmt = "%-12s %9s %12s %10s %12s %12s  %s"
+    lines.append(fmt % ("case", "seconds", "shapes/s", "MB/s", "output", "peak mem", "vs baseline"))
+    for name, args, gzipped in CASES:
+        if name not in results:
+            continue
+        r = results[name]
+        base = baseline.get(name)
+        notes = []
+        if base is not None:
+            for key in ("seconds", "output_bytes", "peak_memory"):
+                if r.get(key) is None or base.get(key) is None:
+                    continue
+                ratio = float(r[key]) / max(base[key], 1e-9)
+                notes.append("%s %+.0f%%" % (key.split("_")[0], (ratio - 1) * 100))
+                if ratio > 1 + tolerance:
+                    regressed = True
+                    notes[-1] += " !"
+        peak = r["peak_memory"] is not None and "%d" % r["peak_memory"] or "-"
+        lines.append(fmt % (name, "%.4f" % r["seconds"], "%.0f" % r["shapes_per_second"],
+                            "%.2f" % r["mb_per_second"], r["output_bytes"], peak, ", ".join(notes)))
+    return lines, regressed
+
+
+def writeJSON(fn, value):
+    f = open(fn, "w")
+    json.dump(value, f, indent=2, sort_keys=True)
+    f.write("\n")
+    f.close()
+
+
+def main(argv):
+    from optparse import OptionParser
+    parser = OptionParser(usage = "%prog [options]")
+    parser.add_option("--save", action="store_true", dest="save",
+                      help="store these results as the new baseline")
+    parser.add_option("--golden", action="store_true", dest="golden",
+                      help="only run the golden output check")
+    parser.add_option("--update-golden", action="store_true", dest="update_golden",
+                      help="accept the current output as golden")
+    parser.add_option("--tolerance", type="float", dest="tolerance", default=0.25,
+                      help="allowed fractional slowdown against the baseline [default: %default]")
+    parser.add_option("--repeat", type="int", dest="repeat", default=3,
+                      help="take the best of this many runs [default: %default]")
+    parser.add_option("--case", action="append", dest="cases",
+                      help="only run the named case (may be repeated)")
+    parser.add_option("--emitters", action="store_true", dest="emitters",
+                      help="only time the scene emitters, on the cases given (default large)")
+    parser.add_option("--startup", action="store_true", dest="startup",
+                      help="only time importing and starting the command line tool")
+    options, args = parser.parse_args(argv)
+
+    if options.emitters:
+        for name, case_args, gzipped in CASES:
+            if name in (options.cases or ["large"]):
+                for emitter, seconds in measureEmitters(case_args, options.repeat):
+                    sys.stdout.write("%-12s %-14s %.4f\n" % (name, emitter, seconds))
+        return 0
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        baseline = json.load(open(BASELINE_FILE))
+
+    if options.startup:
+        startup = measureStartup(max(options.repeat, 10))
+        lines, regressed = compareStartup(startup, baseline.get("startup"), options.tolerance)
+        sys.stdout.write("\n".join(lines) + "\n")
+        if options.save:
+            baseline["startup"] = startup
+            writeJSON(BASELINE_FILE, baseline)
+        return regressed and not options.save and 1 or 0
+
+    mismatched = checkGolden(update = options.update_golden)
+    for name in mismatched:
+        sys.stderr.write("golden output changed: %s\n" % name)
+    if options.golden or options.update_golden:
+        return len(mismatched) and 1 or 0
+
+    results = dict(baseline)
+    for name, case_args, gzipped in CASES:
+        if options.cases and name not in options.cases:
+            continue
+        results[name] = measureCase(name, case_args, gzipped, options.repeat)
+
+    lines, regressed = compare(results, baseline, options.tolerance)
+    if not options.cases or "startup" in options.cases:
+        results["startup"] = measureStartup(max(options.repeat, 10))
+        startup_lines, startup_regressed = compareStartup(results["startup"],
+                                                          baseline.get("startup"),
+                                                          options.tolerance)
+        lines.extend(startup_lines)
+        regressed = regressed or startup_regressed
+    sys.stdout.write("\n".join(lines) + "\n")
+    if options.save:
+        writeJSON(BASELINE_FILE, results)
+    if mismatched or (regressed and not options.save):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Draft level of detail, for thumbnails and previews.
+
+A draft leaves out text (and the RTF parsing behind it), shadows and
+arrow markers, drops graphics too small to see, simplifies long point
+lists and writes coordinates with fewer decimal places.
+"""
+
+
+def simplifyPoints(pts, tolerance):
+    """Ramer-Douglas-Peucker: drop points closer than tolerance to the
+       line through their neighbours that are kept"""
+    if len(pts) < 3:
+        return pts
+    keep = [False] * len(pts)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = pts[first]
+        x2, y2 = pts[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = (dx * dx + dy * dy) ** 0.5
+        furthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            x, y = pts[i]
+            if length == 0:
+                d = ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+            else:
+                d = abs(dy * x - dx * y + x2 * y1 - y2 * x1) / length
+            if d > distance:
+                furthest, distance = i, d
+        if furthest is not None:
+            keep[furthest] = True
+            stack.append((first, furthest))
+            stack.append((furthest, last))
+    return [pt for pt, kept in zip(pts, keep) if kept]
+
+
+class DraftSettings(object):
+    """How rough a draft may be.
+
+       tolerance - how far (in points) simplified lines may stray
+       min_size  - graphics smaller than this both ways are left out
+       precision - decimal places written for coordinates
+    """
+    def __init__(self, tolerance = 1., min_size = 4., precision = 1):
+        self.tolerance = tolerance
+        self.min_size = min_size
+        self.precision = precision
+
+    def number(self, value):
+        text = "%.*f" % (self.precision, float(value))
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        if text == "-0":
+            text = "0"
+        return text
+
+    def simplify(self, pts):
+        return simplifyPoints(pts, self.tolerance)
+
+    def tooSmall(self, width, height):
+        return width < self.min_size and height < self.min_size
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""One-shot conversion API:
+
+    from graffle2svg import convert
+    svg = convert("diagram.graffle")
+    convert("diagram.graffle", "diagram.svg", page = 2)
+"""
+import re
+import threading
+import StringIO
+
+from main import GraffleParser
+from instrument import Instrumentation, CountingStream
+from layers import LayerFilter
+from draft import DraftSettings
+from pathdata import DEFAULT_PRECISION
+import filepack
+# memory and parallel (which imports multiprocessing) are imported when
+# an option needs them, to keep the start up of a simple conversion quick
+
+
+# the first bytes of gzipped data
+GZIP_MAGIC = "\x1f\x8b"
+
+def isXMLData(source):
+    """Is the string source a document (xml, perhaps gzipped) rather than
+       the name of a file?"""
+    return source[:2] == GZIP_MAGIC or re.match(r"\s*<", source) is not None
+
+def documentXML(source):
+    """The xml of a document given as a string - unzipped, and without any
+       white space before it, which expat refuses"""
+    if source[:2] == GZIP_MAGIC:
+        import zlib
+        source = zlib.decompress(source, 16 + zlib.MAX_WBITS)
+    return source.lstrip()
+
+
+class ConversionEngine(object):
+    """Converts any number of documents, from any number of threads.
+
+       The engine only holds its default options; the state of a
+       conversion lives in a GraffleParser belonging to the calling
+       thread, which is reset before and after every document.
+
+       Options (as defaults here, or per call to convert):
+         page       - sheet number to draw (default 0)
+         streaming  - decode without building a DOM of the input
+         max_memory - memory budget in MB, implies streaming; the budget
+                      covers the whole process (see memory.MemoryBudget),
+                      so don't convert in other threads meanwhile
+         stats      - an Instrumentation to record the conversion in
+         processes  - split the sheet's graphics between this many
+                      processes (see parallel.renderPartitioned)
+         layers     - names (or indices) of the only layers to draw
+         skip_hidden_layers, skip_nonprinting_layers
+                    - leave out layers hidden, or not printed, in OmniGraffle
+         draft      - True (or a draft.DraftSettings) for a quick, rough
+                      drawing without text, shadows or arrow heads;
+                      implies streaming
+         precision  - decimal places kept in path data (default 3)
+         fragment_cache - a fragments.FragmentCache, to reuse the svg of
+                      graphics unchanged since an earlier conversion
+                      (not used when optimising)
+         limits     - a limits.ResourceLimits for untrusted documents (such
+                      as limits.UNTRUSTED); implies streaming and one process
+         optimise   - make the svg smaller (see optimise.optimiseSvg)
+         merge_paths - join neighbouring lines and shapes drawn alike into
+                      one <path>, for documents with very many of them
+         stable_ids - give elements ids from their graphic's ID (see
+                      main.sheetElementIds), so an edit changes few lines
+    """
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.local = threading.local()
+
+    def parser(self):
+        gp = getattr(self.local, "parser", None)
+        if gp is None:
+            gp = GraffleParser()
+            self.local.parser = gp
+        return gp
+
+    def convert(self, source, sink = None, **options):
+        """Convert source - a file name, a file object or the xml itself -
+           writing the svg to sink - a file name or file object. Without a
+           sink the svg is returned as a utf-8 string, otherwise the
+           number of bytes written is returned."""
+        opts = dict(self.defaults)
+        opts.update(options)
+        stats = opts.get("stats")
+        if stats is None:
+            stats = Instrumentation()
+        budget = None
+        if opts.get("max_memory") is not None:
+            from memory import MemoryBudget
+            budget = MemoryBudget(int(opts["max_memory"] * 1048576)).start()
+        limits = opts.get("limits")
+        if limits is not None:
+            limits = limits.start()
+        # drafts want speed, and streaming decodes a good deal faster
+        streaming = opts.get("streaming", False) or budget is not None \
+                    or bool(opts.get("draft")) or limits is not None
+
+        gp = self.parser()
+        gp.stats = stats
+        gp.budget = budget
+        gp.limits = limits
+        gp.layers = LayerFilter(opts.get("layers"),
+                                opts.get("skip_hidden_layers", False),
+                                opts.get("skip_nonprinting_layers", False))
+        gp.precision = opts.get("precision", DEFAULT_PRECISION)
+        gp.fragment_cache = opts.get("fragment_cache")
+        gp.optimise = bool(opts.get("optimise"))
+        gp.merge_paths = bool(opts.get("merge_paths"))
+        gp.stable_ids = bool(opts.get("stable_ids"))
+        gp.draft = opts.get("draft") or None
+        if gp.draft is True:
+            gp.draft = DraftSettings()
+        gp.reset()
+        processes = opts.get("processes") or 1
+        if budget is not None or limits is not None:
+            # the budget and limits only cover this process
+            processes = 1
+        try:
+            svg = self.walk(gp, source, opts.get("page", 0), streaming, processes)
+            return self.write(gp, sink, svg)
+        finally:
+            gp.reset()
+            gp.stats = None
+            gp.budget = None
+            gp.limits = None
+            gp.layers = LayerFilter()
+            gp.draft = None
+            gp.optimise = False
+            gp.merge_paths = False
+            gp.stable_ids = False
+            gp.precision = DEFAULT_PRECISION
+            gp.fragment_cache = None
+            if budget is not None:
+                budget.stop()
+
+    def walk(self, gp, source, page, streaming, processes = 1):
+        """Draw the page into gp - or, with several processes, return
+           the svg drawn by parallel.renderPartitioned"""
+        grafflefilepack = None
+        if isinstance(source, basestring):
+            if isXMLData(source):
+                source = documentXML(source)
+            else:
+                grafflefilepack = filepack.GraffleFilePack(source)
+                source = grafflefilepack
+        try:
+            if not streaming and hasattr(source, "read"):
+                with gp.stats.timer("read"):
+                    source = source.read()
+            if isinstance(source, basestring):
+                gp.stats.count("input bytes", len(source))
+            if processes > 1:
+                import parallel
+                document = gp.decodeGraffle(source, streaming = streaming)
+                return parallel.renderPartitioned(document, page, processes,
+                                                  stats = gp.stats, layers = gp.layers,
+                                                  draft = gp.draft, precision = gp.precision,
+                                                  optimise = gp.optimise,
+                                                  merge_paths = gp.merge_paths,
+                                                  stable_ids = gp.stable_ids)
+            gp.walkGraffle(source, page = page, streaming = streaming)
+        finally:
+            if grafflefilepack is not None:
+                grafflefilepack.close()
+
+    def write(self, gp, sink, svg = None):
+        """Write gp's svg, or svg if it's already been drawn, to sink"""
+        def emit(stream):
+            if svg is None:
+                gp.writeSvg(stream)
+            else:
+                stream.write(svg)
+        with gp.stats.timer("write"):
+            if sink is None:
+                if svg is None:
+                    out = StringIO.StringIO()
+                    gp.writeSvg(CountingStream(out, gp.limits))
+                    svg = out.getvalue()
+                gp.stats.count("output bytes", len(svg))
+                return svg
+            if isinstance(sink, basestring):
+                stream = CountingStream(open(sink, "wb"), gp.limits)
+                try:
+                    emit(stream)
+                finally:
+                    stream.close()
+            else:
+                stream = CountingStream(sink, gp.limits)
+                emit(stream)
+            gp.stats.count("output bytes", stream.count)
+            return stream.count
+
+
+_default_engine = ConversionEngine()
+
+def convert(source, sink = None, **options):
+    """Convert a graffle document to svg - see ConversionEngine.convert"""
+    return _default_engine.convert(source, sink, **options)
@@ -55,3 +55,84 @@ class PrintInfo(object):
             pass
             #raise NotImplementedError("'Coded' type not implemented")
         return default
+
+
+# top level keys read_info wants
+INFO_KEYS = ("ApplicationVersion", "CreationDate", "Creator", "GraphDocumentVersion",
+             "ModificationDate", "PrintInfo", "SheetTitle", "Sheets")
+
+
+def scanInfo(scanner):
+    """The INFO_KEYS of a document's top level dict, with only the titles
+       of its Sheets. As OmniGraffle writes keys in order, this stops once
+       the keys still missing would have come before the one just read."""
+    tag = scanner.nextTag()
+    while tag == "plist":
+        tag = scanner.nextTag()
+    top = {}
+    if tag != "dict":
+        return top
+    last_key = ""
+    in_order = True
+    for key in scanner.dictKeys():
+        if key < last_key:
+            in_order = False
+        last_key = key
+        missing = [k for k in INFO_KEYS if k not in top]
+        if not missing or (in_order and key > max(missing)):
+            break
+        if key == "Sheets":
+            top[key] = scanSheetTitles(scanner)
+        elif key in INFO_KEYS:
+            top[key] = scanner.readValue()
+        else:
+            scanner.skipNext()
+    return top
+
+def scanSheetTitles(scanner):
+    sheets = []
+    if scanner.nextTag() != "array":
+        return sheets
+    for tag in scanner.arrayItems():
+        sheet = {}
+        if tag == "dict":
+            for key in scanner.dictKeys():
+                if key == "SheetTitle":
+                    sheet[key] = scanner.readValue()
+                else:
+                    scanner.skipNext()
+        else:
+            scanner.skipValue(tag)
+        sheets.append(sheet)
+    return sheets
+
+
+def read_info(source):
+    """What a document list needs to know about a document, reading as
+       little of it as possible: source is a file name, file object or
+       the xml. Returns a dict which json can write."""
+    import plist
+    import filepack
+    if isinstance(source, basestring) and source.lstrip()[:1] != "<":
+        gfp = filepack.GraffleFilePack(source)
+        try:
+            top = scanInfo(plist.PlistScanner(gfp))
+        finally:
+            gfp.close()
+    else:
+        top = scanInfo(plist.PlistScanner(source))
+    info = FileInfo(top)
+    sheets = top.get("Sheets")
+    if sheets is not None:
+        titles = [sheet.get("SheetTitle") for sheet in sheets]
+    else:
+        titles = [top.get("SheetTitle")]
+    return {"version": info.fmt_version,
+            "creator": info.creator,
+            "created": info.creationdate,
+            "modified": info.modified,
+            "application": info.app_version,
+            "paper_size": info.printinfo.paper_size,
+            "paper_name": info.printinfo.paper_name,
+            "sheet_count": len(titles),
+            "sheet_titles": titles}
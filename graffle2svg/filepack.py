@@ -10,8 +10,8 @@
 
 #THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import gzip
-import zipfile
+# gzip and zipfile are imported only for files which aren't plain xml,
+# as importing them adds to the start up time of every conversion
 
 class GraffleFilePack(object):
     __file = None
@@ -20,19 +20,22 @@ class GraffleFilePack(object):
         if self.detectXMLFile(fn):
             self.__file = open(fn,"r")
         elif self.detectGZipXMLFile(fn):
+            import gzip
             self.__file = gzip.open(fn, "rb")
         elif self.detectZipFile(fn):
+            import zipfile
             self.__file = zipfile.ZipFile(fn, 'rb')
         else: 
             raise Exception('Unknown File Type')
             
-    def read(self):
-        return self.__file.read()
+    def read(self, size = -1):
+        return self.__file.read(size)
         
     def close(self):
         self.__file.close()
     
     def detectGZipXMLFile(self,fn):
+        import gzip
         try:
             f = gzip.open(fn, 'rb')
             return self.detectXML(f.readline())
@@ -40,6 +43,7 @@ class GraffleFilePack(object):
             return False
 
     def detectZipFile(self, fn):
+        import zipfile
         try: 
             f = zipfile.ZipFile(fn, 'rb')
             return self.detectXML(f.readline())
@@ -0,0 +1,220 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Cache the svg drawn for each top level graphic.
+
+A graphic is looked up by a fingerprint of everything its drawing
+depends on: the graphic itself, the shapes its lines are connected to,
+the style and font it is drawn under and the parser's settings. When
+it is found, the svg text drawn last time goes into the new document
+as it is, so a re-conversion after a small edit only draws what changed.
+"""
+import os
+import json
+import time
+import hashlib
+import xml.dom.minidom
+from collections import OrderedDict
+
+# bytes of fragments kept in a cache directory - the least recently used
+# go once there are more
+DEFAULT_MAX_BYTES = 64 * 1048576
+# the directory is looked through (to remove what's over the limit) at
+# least this often, in seconds - its mtime is kept by PRUNE_MARKER
+PRUNE_AGE = 3600
+PRUNE_MARKER = "pruned"
+
+
+class CachedFragment(xml.dom.minidom.Comment):
+    """Stands in the svg DOM for already serialised svg.
+
+       The text was serialised at depth indent; written anywhere else it
+       is indented again."""
+    def __init__(self, text, indent):
+        xml.dom.minidom.Comment.__init__(self, "")
+        self.text = text
+        self.indent = indent
+
+    def writexml(self, writer, indent = "", addindent = "", newl = ""):
+        if indent == self.indent:
+            writer.write(self.text)
+            return
+        lines = self.text.split("\n")
+        for line in lines[:-1]:
+            writer.write(indent + line[len(self.indent):] + "\n")
+        if lines[-1]:
+            writer.write(indent + lines[-1][len(self.indent):])
+
+
+class Fragment(object):
+    """What drawing a graphic produced, and left behind"""
+    __slots__ = ("text", "indent", "required_defs", "font")
+
+    def __init__(self, text, indent, required_defs, font):
+        self.text = text
+        self.indent = indent
+        self.required_defs = required_defs
+        self.font = font
+
+    def __getstate__(self):
+        return (self.text, self.indent, self.required_defs, self.font)
+
+    def __setstate__(self, state):
+        self.text, self.indent, self.required_defs, self.font = state
+
+    def toJSON(self):
+        return json.dumps({"text": self.text, "indent": self.indent,
+                           "required_defs": list(self.required_defs), "font": self.font})
+
+    @classmethod
+    def fromJSON(cls, data):
+        """The Fragment written by toJSON - ValueError if data isn't one"""
+        value = json.loads(data)
+        if not isinstance(value, dict) or \
+                not isinstance(value.get("required_defs"), list) or \
+                not all(isinstance(value.get(name), basestring) for name in ("text", "indent", "font")) or \
+                not all(isinstance(name, basestring) for name in value["required_defs"]):
+            raise ValueError("not a Fragment")
+        return cls(value["text"], str(value["indent"]),
+                   tuple(str(name) for name in value["required_defs"]), value["font"])
+
+
+class FragmentCache(object):
+    """A least recently used cache of Fragments by key.
+
+       With a directory, fragments are also kept there as JSON files, so
+       they last between processes; only maxsize are held in memory, and
+       the least recently used files go once there are over max_bytes."""
+    def __init__(self, maxsize = 10000, directory = None, max_bytes = DEFAULT_MAX_BYTES):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # bytes written since the directory was last pruned
+        self.unpruned = 0
+        self.prune_checked = False
+        self.entries = OrderedDict()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        fragment = self.entries.pop(key, None)
+        if fragment is None and self.directory is not None:
+            fragment = self.load(key)
+        if fragment is not None:
+            self.remember(key, fragment)
+        return fragment
+
+    def load(self, key):
+        """The fragment kept in the directory, or None. A file which can't
+           be read back (truncated, or written by another version) is a
+           miss, and is removed so the graphic is drawn and stored again."""
+        path = self.path(key)
+        try:
+            f = open(path, "rb")
+        except IOError:
+            return None
+        try:
+            try:
+                fragment = Fragment.fromJSON(f.read())
+            finally:
+                f.close()
+            # the mtime says when it was last used
+            os.utime(path, None)
+            return fragment
+        except Exception:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def put(self, key, fragment):
+        self.entries.pop(key, None)
+        self.remember(key, fragment)
+        if self.directory is not None:
+            path = self.path(key)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            # write then rename, so readers never see half a file
+            tmp = "%s.%d.tmp" % (path, os.getpid())
+            data = fragment.toJSON()
+            f = open(tmp, "wb")
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tmp, path)
+            self.unpruned += len(data)
+            if self.unpruned > self.max_bytes // 10 or self.pruneDue():
+                self.prune()
+
+    def pruneDue(self):
+        """Whether the directory hasn't been pruned (by any process) for
+           PRUNE_AGE - only asked once per cache"""
+        if self.prune_checked:
+            return False
+        self.prune_checked = True
+        try:
+            return os.stat(os.path.join(self.directory, PRUNE_MARKER)).st_mtime \
+                   < time.time() - PRUNE_AGE
+        except OSError:
+            return True
+
+    def prune(self):
+        """Remove the least recently used files until those left take no
+           more than max_bytes"""
+        files = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            if dirpath == self.directory:
+                continue
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    # still being written
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        f = open(os.path.join(self.directory, PRUNE_MARKER), "w")
+        f.close()
+        self.unpruned = 0
+
+    def remember(self, key, fragment):
+        self.entries[key] = fragment
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def fragmentKey(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, unicode) else str(part))
+        digest.update("\0")
+    return digest.hexdigest()
@@ -74,3 +74,21 @@ def rotate_points(pts, angle=0, centre=None):
         newy = yc + (sn*relx+cs*rely)
         outpts.append( [newx,newy] )
     return outpts
+
+def in_rect(bounds, pt, slack=0.):
+    """Is pt inside the (x, y, width, height) rectangle, grown by slack"""
+    x, y, width, height = bounds
+    return (x - slack <= pt[0] <= x + width + slack and
+            y - slack <= pt[1] <= y + height + slack)
+
+def rect_edge_point(bounds, pt):
+    """Where the line from the rectangle's centre towards pt leaves it"""
+    x, y, width, height = bounds
+    xc, yc = x + 0.5 * width, y + 0.5 * height
+    dx, dy = pt[0] - xc, pt[1] - yc
+    scale = 1.
+    if dx != 0:
+        scale = min(scale, abs(0.5 * width / dx))
+    if dy != 0:
+        scale = min(scale, abs(0.5 * height / dy))
+    return [xc + scale * dx, yc + scale * dy]
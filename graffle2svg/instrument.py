@@ -0,0 +1,113 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Timers, counters and warnings collected during a conversion"""
+import time
+
+class PhaseTimer(object):
+    """with stats.timer("parse"): ... adds the elapsed time to that phase"""
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        # list phases in the order they start
+        self.stats.addTime(self.phase, 0.)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, typ, value, tb):
+        self.stats.addTime(self.phase, time.time() - self.start)
+        return False
+
+
+class Instrumentation(object):
+    """Collects where a conversion spent its time.
+
+       Phases are timed wall clock seconds (phases may nest, e.g. "rtf"
+       inside "render"), counters are plain integers and warnings are
+       counted by message rather than printed as they happen.
+    """
+    def __init__(self):
+        self.times = {}
+        self.phase_order = []
+        self.counters = {}
+        self.warnings = {}
+
+    def timer(self, phase):
+        return PhaseTimer(self, phase)
+
+    def addTime(self, phase, seconds):
+        if phase not in self.times:
+            self.times[phase] = 0.
+            self.phase_order.append(phase)
+        self.times[phase] += seconds
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def warn(self, message):
+        self.warnings[message] = self.warnings.get(message, 0) + 1
+
+    def merge(self, other):
+        """Add another Instrumentation's figures to this one"""
+        for phase in other.phase_order:
+            self.addTime(phase, other.times[phase])
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for message, n in other.warnings.items():
+            self.warnings[message] = self.warnings.get(message, 0) + n
+
+    def asDict(self):
+        return {"times": dict(self.times),
+                "phases": list(self.phase_order),
+                "counters": dict(self.counters),
+                "warnings": dict(self.warnings)}
+
+    def report(self):
+        """A human readable breakdown"""
+        lines = ["%-24s %10s" % ("phase", "seconds")]
+        for phase in self.phase_order:
+            lines.append("%-24s %10.4f" % (phase, self.times[phase]))
+        if self.counters:
+            lines.append("")
+            lines.append("%-24s %10s" % ("counter", "count"))
+            for name in sorted(self.counters.keys()):
+                lines.append("%-24s %10d" % (name, self.counters[name]))
+        return "\n".join(lines) + "\n"
+
+    def writeWarnings(self, stream):
+        """Write each distinct warning once, with how often it happened"""
+        for message in sorted(self.warnings.keys()):
+            n = self.warnings[message]
+            if n > 1:
+                stream.write("warning: %s (x%d)\n" % (message, n))
+            else:
+                stream.write("warning: %s\n" % message)
+
+
+class CountingStream(object):
+    """Wraps a writable file, counting the bytes written through it (and
+       checking them against a limits.ResourceLimits, if given)"""
+    def __init__(self, stream, limits = None):
+        self.stream = stream
+        self.count = 0
+        self.limits = limits
+
+    def write(self, data):
+        self.count += len(data)
+        if self.limits is not None:
+            self.limits.checkOutput(self.count)
+        self.stream.write(data)
+
+    def close(self):
+        self.stream.close()
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Which of a sheet's layers to draw.
+
+Each sheet has a Layers list, front-most first, and every top level
+graphic names its layer by index. Layers are drawn back to front, each
+into its own <g>; graphics on layers which aren't wanted are dropped
+before anything is done with them.
+"""
+
+
+def layerFlag(layer, key):
+    """View and Print are "YES"/"NO" (or missing, meaning YES)"""
+    return layer.get(key, "YES") not in ("NO", False)
+
+
+class LayerFilter(object):
+    """Chooses the layers to draw.
+
+       names            - only draw layers with these names (or indices)
+       skip_hidden      - leave out layers hidden in OmniGraffle
+       skip_nonprinting - leave out layers marked not to print
+    """
+    def __init__(self, names = None, skip_hidden = False, skip_nonprinting = False):
+        if names is not None:
+            names = set(unicode(n) for n in names)
+        self.names = names
+        self.skip_hidden = skip_hidden
+        self.skip_nonprinting = skip_nonprinting
+
+    def wanted(self, index, layer):
+        if self.names is not None and unicode(index) not in self.names \
+                and layer.get("Name") not in self.names:
+            return False
+        if self.skip_hidden and not layerFlag(layer, "View"):
+            return False
+        if self.skip_nonprinting and not layerFlag(layer, "Print"):
+            return False
+        return True
+
+    def sheetLayers(self, sheet):
+        """[(layer, graphics)] for the sheet, in the order to draw them.
+           Sheets without a Layers list give [(None, all graphics)]."""
+        graphics = sheet["GraphicsList"]
+        layers = sheet.get("Layers")
+        if not layers:
+            return [(None, graphics)]
+        bylayer = {}
+        for index, layer in enumerate(layers):
+            if self.wanted(index, layer):
+                bylayer[index] = []
+        for graphic in graphics:
+            try:
+                index = int(graphic.get("Layer", 0))
+            except ValueError:
+                index = 0
+            if not 0 <= index < len(layers):
+                # keep graphics with a missing layer rather than lose them
+                index = 0
+            if index in bylayer:
+                bylayer[index].append(graphic)
+        return [(layers[index], bylayer[index])
+                for index in sorted(bylayer.keys(), reverse = True)
+                if bylayer[index]]
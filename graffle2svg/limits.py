@@ -0,0 +1,136 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Limits on what converting an untrusted document may use.
+
+A crafted document can ask for far more work than its size suggests -
+deeply nested groups, lines with millions of points, megabytes of RTF.
+A ResourceLimits given to a conversion is checked as the document is
+decoded, drawn and written, and the conversion stops with one of the
+ResourceLimitExceeded errors below as soon as a limit is passed.
+"""
+import copy
+import time
+
+# how many elements to decode between checks of the time limit
+TIME_CHECK_INTERVAL = 1000
+
+
+class ResourceLimitExceeded(Exception):
+    """Raised when a conversion needs more of something than it's allowed"""
+    what = "resource use"
+
+    def __init__(self, stage, used, limit):
+        Exception.__init__(self, self.describe(stage, used, limit))
+        self.stage = stage
+        self.used = used
+        self.limit = limit
+
+    def describe(self, stage, used, limit):
+        return "%s: %s %s is over the limit of %s" % (stage, self.what, used, limit)
+
+class TooManyElements(ResourceLimitExceeded):
+    what = "element count"
+
+class NestingTooDeep(ResourceLimitExceeded):
+    what = "nesting depth"
+
+class TooManyPoints(ResourceLimitExceeded):
+    what = "points in one graphic"
+
+class TooMuchText(ResourceLimitExceeded):
+    what = "bytes of text"
+
+class OutputTooLarge(ResourceLimitExceeded):
+    what = "bytes of output"
+
+class EntityDeclared(ResourceLimitExceeded):
+    """Entities declared in the document itself are refused: expat expands
+       them (in attribute values too) without anything counting the result"""
+    def describe(self, stage, used, limit):
+        return "%s: %s is declared in the document, which isn't allowed" % (stage, used)
+
+class TimeLimitExceeded(ResourceLimitExceeded):
+    def describe(self, stage, used, limit):
+        return "%s: %.1f seconds is over the time limit of %.1f" % (stage, used, limit)
+
+
+class ResourceLimits(object):
+    """Caps on one conversion - None for no limit on that resource.
+
+       max_elements - xml elements in the document
+       max_depth    - nesting of dicts and arrays in the document
+       max_points   - points in any one line or shape
+       max_text     - total bytes of the document's strings (mostly RTF)
+       max_output   - bytes of svg written
+       max_seconds  - wall clock time of the whole conversion
+
+       start() gives the copy which keeps count for a conversion, so one
+       ResourceLimits can be shared by any number of them.
+    """
+    def __init__(self, max_elements = None, max_depth = None, max_points = None,
+                 max_text = None, max_output = None, max_seconds = None):
+        self.max_elements = max_elements
+        self.max_depth = max_depth
+        self.max_points = max_points
+        self.max_text = max_text
+        self.max_output = max_output
+        self.max_seconds = max_seconds
+        self.started = None
+        self.text = 0
+
+    def start(self):
+        limits = copy.copy(self)
+        limits.started = time.time()
+        limits.text = 0
+        return limits
+
+    def checkElement(self, elements, depth):
+        """Called for each element decoded"""
+        if elements % TIME_CHECK_INTERVAL == 0:
+            self.checkTime("decode")
+        if self.max_elements is not None and elements > self.max_elements:
+            raise TooManyElements("decode", elements, self.max_elements)
+        if self.max_depth is not None and depth > self.max_depth:
+            raise NestingTooDeep("decode", depth, self.max_depth)
+
+    def addText(self, size):
+        """Called with the size of each piece of string data decoded"""
+        self.text += size
+        if self.max_text is not None and self.text > self.max_text:
+            raise TooMuchText("decode", self.text, self.max_text)
+
+    def refuseEntity(self, name):
+        """Called for any entity (or internal DTD subset) the document declares"""
+        raise EntityDeclared("decode", name, None)
+
+    def checkPoints(self, stage, count):
+        if self.max_points is not None and count > self.max_points:
+            raise TooManyPoints(stage, count, self.max_points)
+
+    def checkOutput(self, size):
+        if self.max_output is not None and size > self.max_output:
+            raise OutputTooLarge("write", size, self.max_output)
+        self.checkTime("write")
+
+    def checkTime(self, stage):
+        if self.max_seconds is not None and self.started is not None:
+            elapsed = time.time() - self.started
+            if elapsed > self.max_seconds:
+                raise TimeLimitExceeded(stage, elapsed, self.max_seconds)
+
+
+# reasonable limits for a service converting documents from anyone - a
+# decoded element takes around 130 bytes, so the element cap keeps the
+# decoded document to about 130 MB
+UNTRUSTED = ResourceLimits(max_elements = 1000000, max_depth = 256, max_points = 100000,
+                           max_text = 50 * 1048576, max_output = 200 * 1048576,
+                           max_seconds = 60)
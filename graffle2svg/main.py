@@ -10,11 +10,22 @@
 
 #THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import codecs
+import hashlib
+import StringIO
+import threading
 import xml.dom.minidom
+import xml.dom.minicompat
 from rtf import extractRTFString
 from styles import CascadingStyles
 import geom
 import fileinfo
+from instrument import Instrumentation
+from layers import LayerFilter
+from shapes import shapeRenderer
+from pathdata import encodePath, DEFAULT_PRECISION
+from fragments import CachedFragment, Fragment, fragmentKey
+import plist
 
 def mkHex(s):
     # s is a string of a float
@@ -26,18 +37,294 @@ def nodeListGen(nodelist):
     for e in nodelist:
         yield e
         
+# elements whose value is their text
+GRAFFLE_SCALARS = ("string", "real", "integer", "date")
+
 def parseCoords(s):
     """in: "{0,1}" -> [0,1]"""
     return [float(a) for a in s[1:-1].split(",")]
 
+def graffleFingerprint(obj):
+    """A stable hash of a decoded graffle structure (dict key order ignored)"""
+    digest = hashlib.sha1()
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if isinstance(o, dict):
+            digest.update("{%d" % len(o))
+            for k in sorted(o.keys(), reverse=True):
+                stack.append(o[k])
+                stack.append(k)
+        elif isinstance(o, (list, tuple)):
+            digest.update("[%d" % len(o))
+            stack.extend(reversed(o))
+        else:
+            digest.update("%s:%r;" % (type(o).__name__, o))
+    return digest.hexdigest()
+
+def graffleSheets(mydict):
+    """The list of sheets in a decoded document - older files only have one"""
+    if mydict.get("Sheets") is not None:
+        return mydict["Sheets"]
+    return [mydict]
+
+def graphicID(graphic):
+    """A graphic's ID (or a line end's reference to one) as an int"""
+    try:
+        return int(graphic.get("ID"))
+    except (TypeError, ValueError):
+        return None
+
+def graphicIndex(sheet):
+    """{ID: graphic} for every graphic on the sheet, including those
+       inside groups"""
+    index = {}
+    stack = list(sheet.get("GraphicsList", []))
+    while stack:
+        graphic = stack.pop()
+        gid = graphicID(graphic)
+        if gid is not None:
+            index[gid] = graphic
+        if graphic.get("Graphics") is not None:
+            stack.extend(graphic["Graphics"])
+    return index
+
+def sheetElementIds(header, sheet):
+    """{id(graphic): the id of its svg element} for every graphic on the
+       sheet with an ID - "s<sheet>-g<ID>", the sheet being its UniqueID
+       (or number), with a suffix for a repeated ID. Other elements a
+       graphic draws add ".1", ".2", ... to it."""
+    prefix = sheet.get("UniqueID")
+    if prefix is None:
+        prefix = [i for (i, s) in enumerate(graffleSheets(header)) if s is sheet][0]
+    ids = {}
+    used = set()
+    graphics = list(reversed(sheet.get("GraphicsList", [])))
+    if sheet.get("BackgroundGraphic") is not None:
+        graphics.append(sheet["BackgroundGraphic"])
+    # in the order they're drawn, so an ID seen again gets the suffix
+    stack = graphics
+    while stack:
+        graphic = stack.pop()
+        gid = graphicID(graphic)
+        if gid is not None:
+            base = name = "s%s-g%d" % (prefix, gid)
+            n = 1
+            while name in used:
+                n += 1
+                name = "%s-%d" % (base, n)
+            used.add(name)
+            ids[id(graphic)] = name
+        if graphic.get("Graphics") is not None:
+            stack.extend(graphic["Graphics"])
+    return ids
+
+def connectedIDs(graphic):
+    """IDs of the graphics lines in graphic (or graphic itself) connect to"""
+    ids = []
+    stack = [graphic]
+    while stack:
+        g = stack.pop()
+        if g.get("Class") == "LineGraphic":
+            for end in ("Tail", "Head"):
+                if g.get(end) is not None:
+                    ids.append(graphicID(g[end]))
+        if g.get("Graphics") is not None:
+            stack.extend(g["Graphics"])
+    return ids
+
+def nodeIndent(node):
+    """The indent pretty printing gives node's children"""
+    depth = 1
+    while node.parentNode is not None and \
+            node.parentNode.nodeType != node.DOCUMENT_NODE:
+        depth += 1
+        node = node.parentNode
+    return "\t" * depth
+
+def xmlEscape(data):
+    """Text or an attribute value escaped as minidom writes it"""
+    return data.replace("&", "&amp;").replace("<", "&lt;"). \
+                replace("\"", "&quot;").replace(">", "&gt;")
+
+def writeXML(node, writer, indent = "", addindent = "", newl = ""):
+    """node.writexml(writer, indent, addindent, newl) - the same output,
+       without recursing, as groups may be nested deeper than the stack"""
+    # entries are (node, its indent), or (None, the end tag of an element)
+    stack = [(node, indent)]
+    while stack:
+        node, indent = stack.pop()
+        if node is None:
+            writer.write(indent)
+        elif node.nodeType == node.DOCUMENT_NODE:
+            writer.write('<?xml version="1.0" ?>' + newl)
+            stack.extend([(child, indent) for child in reversed(node.childNodes)])
+        elif node.nodeType != node.ELEMENT_NODE:
+            node.writexml(writer, indent, addindent, newl)
+        else:
+            writer.write(indent + "<" + node.tagName)
+            attrs = node.attributes
+            for name in sorted(attrs.keys()):
+                writer.write(' %s="%s"' % (name, xmlEscape(attrs[name].value)))
+            children = node.childNodes
+            if not children:
+                writer.write("/>" + newl)
+            elif len(children) == 1 and children[0].nodeType == node.TEXT_NODE:
+                writer.write(">" + xmlEscape(children[0].data) + "</%s>%s" % (node.tagName, newl))
+            else:
+                writer.write(">" + newl)
+                stack.append((None, "%s</%s>%s" % (indent, node.tagName, newl)))
+                stack.extend([(child, indent + addindent) for child in reversed(children)])
+
+def unlinkDOM(node):
+    """node.unlink(), without recursing"""
+    nodes = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        nodes.append(n)
+        stack.extend(n.childNodes)
+    for n in reversed(nodes):
+        if n.childNodes:
+            # its children are already unlinked
+            n.childNodes = xml.dom.minicompat.NodeList()
+        n.unlink()
+
+# how far (in points) a line's end may be from the shape it's connected
+# to before it is treated as out of date and moved back onto the shape
+ENDPOINT_SLACK = 4.
+
+# most subpaths merge_paths joins into one <path>
+MAX_MERGED_PATHS = 500
+
+# Definitions (markers, filters) added to <defs> when a drawing needs them,
+# in the order they are written out
+DEF_TEMPLATES = [
+    ("Arrow1Lend", """
+            <defs><marker
+               orient='auto'
+               refY='0.0'
+               refX='0.0'
+               id='Arrow1Lend'
+               style='overflow:visible;'>
+              <path
+                 id='path3666'
+                 d='M -10,0.0 L -10.0,-2.0 L 0.0,0.0 L -10.0,2.0 z '
+                 style='fill-rule:evenodd;stroke:#000000;stroke-width:1.0px;marker-start:none;' />
+            </marker></defs>"""),
+    ("Arrow1Lstart", """
+            <defs><marker
+               orient='auto'
+               refY='0.0'
+               refX='0.0'
+               id='Arrow1Lstart'
+               style='overflow:visible'>
+              <path
+                 id='path3663'
+                 d='M 10,0.0 L 10.0,-2.0 L 0.0,0.0 L 10.0,2.0 z'
+                 style='fill-rule:evenodd;stroke:#000000;stroke-width:1.0px;marker-start:none'/>
+            </marker></defs>"""),
+    ("DropShadow", """
+            <defs><filter id='DropShadow' filterRes='100' x='0' y='0'>
+               <feGaussianBlur stdDeviation='3' result='MyBlur'/>
+               <feOffset in='MyBlur' dx='2' dy='4' result='movedBlur'/>
+               <feMerge>
+                   <feMergeNode in='movedBlur'/>
+                   <feMergeNode in='SourceGraphic'/>
+               </feMerge>
+          </filter></defs>"""),
+    ("CrowBall", """
+            <defs><marker
+            refX='0'
+            refY='0'
+            orient='auto'
+            id='mCrowBall'
+            style='overflow:visible'>
+            <path d='M 0.0,2.5 L 7.5,0.0 L 0.0,-2.5' 
+             style='stroke:#000;stroke-width:1.0px;marker-start:none;fill:none;' />
+            <circle cx='10' cy='0' r='2.5' style='stroke-width:1px; stroke: #000; fill:none;'/>
+            </marker></defs>"""),
+    ("Bar", """
+            <defs><marker
+            refX='0'
+            refY='0'
+            orient='auto'
+            id='mBar'
+            style='overflow:visible'>
+            <path d='M -7.5,-2.5 L -7.5,2.5' 
+             style='stroke:#000;stroke-width:1.0px;marker-start:none;fill:none;' />
+            </marker></defs>"""),
+]
+
+_def_cache = {}
+_def_cache_lock = threading.Lock()
+
+def defTemplate(name):
+    """The parsed nodes of a DEF_TEMPLATES entry - parsed once, then only read"""
+    nodes = _def_cache.get(name)
+    if nodes is None:
+        with _def_cache_lock:
+            nodes = _def_cache.get(name)
+            if nodes is None:
+                p = xml.dom.minidom.parseString(dict(DEF_TEMPLATES)[name])
+                nodes = list(p.childNodes[0].childNodes)
+                _def_cache[name] = nodes
+    return nodes
+
+class MergedPath(object):
+    """A <path> the paths drawn next to it can be joined onto"""
+    def __init__(self, path, style, d, box):
+        self.path = path
+        self.style = style
+        self.parts = [d]
+        # the bounds of each filled path joined, which mustn't overlap -
+        # None for paths which aren't filled
+        self.boxes = box and [box]
+
+
 class GraffleParser(object):
-    g_dom = None
-    svg_dom = None
-    svg_current_layer = None
-    svg_current_font  = ""
-    svg_def = None
-    
-    def __init__(self):
+    """Converts one document at a time - reset() before reusing it"""
+    def __init__(self, stats = None, budget = None, layers = None, draft = None,
+                 precision = DEFAULT_PRECISION, fragment_cache = None, limits = None,
+                 optimise = False, merge_paths = False, stable_ids = False):
+        if stats is None:
+            stats = Instrumentation()
+        self.stats = stats
+        # a memory.MemoryBudget to check as we go, if any
+        self.budget = budget
+        # a limits.ResourceLimits (as started) for untrusted documents, if any
+        self.limits = limits
+        # a layers.LayerFilter choosing which layers to draw
+        if layers is None:
+            layers = LayerFilter()
+        self.layers = layers
+        # draft.DraftSettings for a rough, quick drawing - None for full detail
+        self.draft = draft
+        # decimal places kept in path data
+        self.precision = precision
+        # a fragments.FragmentCache of top level graphics already drawn
+        self.fragment_cache = fragment_cache
+        # run optimise.optimiseSvg over each drawn sheet
+        self.optimise = optimise
+        # join neighbouring paths drawn alike into one <path>
+        self.merge_paths = merge_paths
+        # give elements ids from their graphic's ID (sheetElementIds)
+        self.stable_ids = stable_ids
+        self.reset()
+        
+    def reset(self):
+        """Discard any previous document and start a fresh svg document,
+           so one parser can be reused for several conversions"""
+        self.g_dom = None
+        self.svg_current_font = ""
+        # graphics of the sheet being drawn, by ID
+        self.graphic_index = {}
+        # the MergedPath the next path drawn may join
+        self.merged_path = None
+        # with stable_ids: sheetElementIds of the sheet, and [id, elements
+        # given it so far] of each graphic being drawn
+        self.element_ids = {}
+        self.svg_id_stack = []
         self.svg_dom = xml.dom.minidom.Document()
         self.svg_dom.doctype = ""
         svg_tag = self.svg_dom.createElement("svg")
@@ -65,48 +352,203 @@ class GraffleParser(object):
     @property
     def svg(self):
         """Return the svg document"""
-        return self.svg_dom.toprettyxml()
+        with self.stats.timer("serialise"):
+            out = StringIO.StringIO()
+            writeXML(self.svg_dom, out, "", "\t", "\n")
+            return out.getvalue()
         
-    def walkGraffle(self, xmlstr, **kwargs):
+    def writeSvg(self, stream):
+        """Write the svg document to stream as utf-8 - the same bytes as
+           self.svg, without holding the whole text in memory"""
+        writer = codecs.getwriter("utf-8")(stream)
+        with self.stats.timer("serialise"):
+            writeXML(self.svg_dom, writer, "", "\t", "\n")
+        
+    def walkGraffle(self, xmlstr, page = 0, streaming = False):
         """Walk over the file"""
-        self.g_dom = xml.dom.minidom.parseString(xmlstr)
+        mydict = self.decodeGraffle(xmlstr, streaming)
+        if mydict is not None:
+            self.walkGraffleDict(mydict, page)
+        # nothing refers to the decoded document once the page is drawn
+        del mydict
+        with self.stats.timer("requirements"):
+            self.svg_add_requirements()
+        self.svgOptimise()
+        self.checkBudget("render")
+        
+    def svgOptimise(self):
+        """Optimise the drawn svg, if asked to"""
+        if self.optimise:
+            import optimise
+            with self.stats.timer("optimise"):
+                optimise.optimiseSvg(self.svg_dom)
+        
+    def decodeGraffle(self, xmlstr, streaming = False):
+        """Return the document's top level dict without drawing anything.
+           streaming decodes straight from the xml (a string or file)
+           without building a DOM first - always the case with limits,
+           which are checked as each element is decoded."""
+        if streaming or self.limits is not None:
+            with self.stats.timer("decode"):
+                mydict = plist.decodePlist(xmlstr, self.decodeProgress, self.limits)
+            self.checkBudget("decode")
+            return mydict
+        with self.stats.timer("parse"):
+            self.g_dom = xml.dom.minidom.parseString(xmlstr)
+        self.checkBudget("parse")
+        with self.stats.timer("decode"):
+            mydict = self.findGraffleDict(self.g_dom)
+        # the DOM holds several times the memory of the decoded dict
+        unlinkDOM(self.g_dom)
+        self.g_dom = None
+        self.checkBudget("decode")
+        return mydict
         
-        self.walkGraffleDoc(self.g_dom, **kwargs)
-        self.svg_add_requirements()
+    def decodeProgress(self, elements, depth):
+        self.checkBudget("decode")
         
+    def checkBudget(self, stage):
+        if self.budget is not None:
+            self.budget.check(stage)
+        if self.limits is not None:
+            self.limits.checkTime(stage)
+            
+    def checkPoints(self, graphic):
+        """Refuse lines and shapes with more points than the limits allow"""
+        if self.limits is not None:
+            points = graphic.get("Points")
+            shape_data = graphic.get("ShapeData")
+            if points is None and isinstance(shape_data, dict):
+                points = shape_data.get("UnitPoints")
+            if points is not None:
+                self.limits.checkPoints("render", len(points))
         
     def walkGraffleDoc(self, parent, page = 0):
+        with self.stats.timer("decode"):
+            mydict = self.findGraffleDict(parent)
+        if mydict is not None:
+            self.walkGraffleDict(mydict, page)
+            
+    def findGraffleDict(self, parent):
+        """Find the top level <dict> inside Apple's <plist> container"""
         # want to pass this around like a continuation
         cont = nodeListGen(parent.childNodes)
-        i = 0
         mydict = None
         for e in cont:
-            if e.nodeType == e.DOCUMENT_TYPE_NODE:
-                pass
             localname = e.localName
             
             if localname == "plist":
                 # Apple's main container
-                self.walkGraffleDoc(e,page)
+                mydict = self.findGraffleDict(e)
                 
             if localname == "dict":
                 mydict = self.ReturnGraffleDict(e)
-
-        if mydict is not None:
-            # Extract file information
-            self.fileinfo = fileinfo.FileInfo(mydict)
-            # Graffle lists it's image references separately
-            self.imagelist = mydict.get("ImageList",[])
-            # Sometimes have multiple sheets
-            if mydict.get("Sheets") is not None:
-                self.extractPage(mydict["Sheets"][page])
-            else:
-                self.extractPage(mydict)
+        return mydict
+        
+    def walkGraffleDict(self, mydict, page = 0):
+        """Draw one page of an already decoded document"""
+        # Sometimes have multiple sheets
+        self.renderSheet(mydict, graffleSheets(mydict)[page])
+        
+    def renderSheet(self, header, sheet):
+        """Draw a sheet; header is the document's top level dict (only the
+           file information and ImageList are used from it)"""
+        # Extract file information
+        self.fileinfo = fileinfo.FileInfo(header)
+        # Graffle lists it's image references separately
+        self.imagelist = header.get("ImageList",[])
+        if self.stable_ids:
+            self.element_ids = sheetElementIds(header, sheet)
+        with self.stats.timer("render"):
+            self.extractPage(sheet)
                 
                 
     def extractPage(self, grafflenodeasdict):
         mydict = grafflenodeasdict
+        self.graphic_index = graphicIndex(mydict)
+        if self.fragment_cache is not None:
+            # what every graphic on the sheet is drawn with
+            draft = self.draft and sorted(vars(self.draft).items())
+            self.fragment_context = graffleFingerprint([self.fileinfo.fmt_version,
+                                                        self.imagelist,
+                                                        self.precision, draft,
+                                                        self.merge_paths, self.stable_ids])
+        self.extractBackground(mydict)
+        
+        for layer, graphics in self.layers.sheetLayers(mydict):
+            self.svgDrawLayer(layer, graphics)
+        
+    def svgDrawLayer(self, layer, graphics):
+        """Draw a layer's graphics into a <g> of their own"""
+        if layer is None:
+            # no layers in this sheet
+            self.svgDrawGraphics(graphics)
+            return
+        current_layer = self.svg_current_layer
+        self.svg_current_layer = self.svgAddLayer(layer)
+        self.svgDrawGraphics(graphics)
+        self.svg_current_layer = current_layer
+        
+    def svgDrawGraphics(self, GraphicsList):
+        """Draw top level graphics, reusing the svg drawn for them before
+           when there's a fragment cache"""
+        # cached fragments are text the optimiser can't see into, so it
+        # would leave them as drawn - optimising draws everything afresh
+        if self.fragment_cache is None or self.optimise:
+            self.svgItterateGraffleGraphics(GraphicsList)
+            return
+        node = self.svg_current_layer
+        indent = nodeIndent(node)
+        for graphic in GraphicsList:
+            key = self.fragmentKey(graphic)
+            fragment = self.fragment_cache.get(key)
+            if fragment is None:
+                self.stats.count("fragment cache misses")
+                fragment = self.svgDrawFragment(graphic, node, indent)
+                self.fragment_cache.put(key, fragment)
+            else:
+                self.stats.count("fragment cache hits")
+                node.appendChild(CachedFragment(fragment.text, fragment.indent))
+                self.required_defs.update(fragment.required_defs)
+                self.svg_current_font = fragment.font
+                
+    def svgDrawFragment(self, graphic, node, indent):
+        """Draw a graphic, returning it as a Fragment to cache"""
+        drawn = len(node.childNodes)
+        outer_defs = self.required_defs
+        self.required_defs = set()
+        # paths are only joined within the fragment
+        self.merged_path = None
+        try:
+            self.svgItterateGraffleGraphics([graphic])
+            required_defs = tuple(sorted(self.required_defs))
+        finally:
+            outer_defs.update(self.required_defs)
+            self.required_defs = outer_defs
+            self.merged_path = None
+        out = StringIO.StringIO()
+        for child in node.childNodes[drawn:]:
+            writeXML(child, out, indent, "\t", "\n")
+        return Fragment(out.getvalue(), indent, required_defs, self.svg_current_font)
+        
+    def fragmentKey(self, graphic):
+        """The fragment cache key for drawing graphic now"""
+        parts = [self.fragment_context, str(self.style), self.svg_current_font,
+                 graffleFingerprint(graphic)]
+        if self.stable_ids:
+            parts.append(repr(self.subgraphicIds(graphic)))
+        # where lines end depends on the shapes they're connected to
+        for gid in connectedIDs(graphic):
+            connected = self.graphic_index.get(gid, {})
+            parts.append(graffleFingerprint([connected.get("Bounds"), connected.get("Magnets")]))
+        return fragmentKey(*parts)
         
+    def svgAddLayer(self, layer):
+        """Add (and return) the <g> for one of the sheet's layers"""
+        return self.svg_addGroup(self.svg_current_layer, cls = "layer")
+        
+    def extractBackground(self, mydict):
+        """Draw the page's background"""
         if self.fileinfo.fmt_version >= 6:
             # Graffle version 6 has a background graphic
             background = mydict["BackgroundGraphic"]
@@ -142,25 +584,51 @@ class GraffleParser(object):
                                         rx=None,
                                         ry=None)
         
-        graphics = mydict["GraphicsList"]
-        self.svgItterateGraffleGraphics(graphics)
-        
     def ReturnGraffleNode(self, parent):
         """Return a python representation of the 
            node passed"""
-        if parent.nodeType == parent.TEXT_NODE:
-            return parent.wholeText
-        elif parent.localName == "dict":
-            return self.ReturnGraffleDict(parent)
-        elif parent.localName == "array":
-            return self.ReturnGraffleArray(parent)
-        elif parent.localName == "true":
-            return True
-        elif parent.localName == "false":
-            return False
-        elif parent.localName in ["string","real","integer"]:
-            return self.ReturnGraffleNode(parent.firstChild)
-        return parent.nodeType
+        # walked with a stack of our own rather than by recursion, so
+        # nesting is only limited by memory
+        top = []
+        # frames are [container, its child nodes left, key for the next value]
+        stack = [[top, iter((parent,)), None]]
+        while stack:
+            frame = stack[-1]
+            container = frame[0]
+            e = next(frame[1], None)
+            if e is None:
+                stack.pop()
+                continue
+            if e.nodeType == e.TEXT_NODE and container is not top:
+                # whitespace between the elements of a dict or array
+                continue
+            if e.localName == "key" and isinstance(container, dict):
+                frame[2] = u"".join([c.data for c in e.childNodes
+                                     if c.nodeType == c.TEXT_NODE])
+                continue
+            while e is not None and e.localName in GRAFFLE_SCALARS:
+                e = e.firstChild
+            if e is None:
+                value = u""
+            elif e.nodeType == e.TEXT_NODE:
+                value = e.wholeText
+            elif e.localName == "dict":
+                value = {}
+            elif e.localName == "array":
+                value = []
+            elif e.localName == "true":
+                value = True
+            elif e.localName == "false":
+                value = False
+            else:
+                value = e.nodeType
+            if isinstance(container, dict):
+                container[frame[2]] = value
+            else:
+                container.append(value)
+            if isinstance(value, (dict, list)):
+                stack.append([value, iter(e.childNodes), None])
+        return top[0]
         
     def ReturnGraffleDict(self, parent):
         """Graffle has dicts like
@@ -172,19 +640,7 @@ class GraffleParser(object):
             </dict>
             - pass the <dict> node to this method
         """
-        retdict = {}
-        cont = nodeListGen(parent.childNodes)
-        key, val = None, None
-        for e in cont:
-            if e.nodeType == e.TEXT_NODE:
-                continue
-            localname = e.localName
-            if localname == "key":
-                key = self.ReturnGraffleNode(e.firstChild)
-            else:
-                val = self.ReturnGraffleNode(e)
-                retdict[key] = val
-        return retdict
+        return self.ReturnGraffleNode(parent)
         
     def ReturnGraffleArray(self, parent):
         """Graffle has arrays like
@@ -194,19 +650,59 @@ class GraffleParser(object):
             </array>
             - pass the <array> node to this method
         """
-        retlist = []
-        cont = nodeListGen(parent.childNodes)
-        for e in cont:
-            if e.nodeType == e.TEXT_NODE:
-                continue
-            retlist.append(self.ReturnGraffleNode(e))
-        return retlist
+        return self.ReturnGraffleNode(parent)
         
         
     def extractMagnetCoordinates(self,mgnts):
         pts = [parseCoords(a) for a in mgnts]
         return pts
         
+    def connectedGraphic(self, end):
+        """The graphic a line's Head or Tail is connected to, if any"""
+        if end is None:
+            return None
+        graphic = self.graphic_index.get(graphicID(end))
+        if graphic is None or graphic.get("Bounds") is None:
+            return None
+        return graphic
+        
+    def connectLineEnds(self, line, pts):
+        """Move the ends of a line back onto the shapes they're connected
+           to, where the shapes have moved since the line was saved"""
+        tail = self.connectedGraphic(line.get("Tail"))
+        head = self.connectedGraphic(line.get("Head"))
+        if len(pts) < 2 or (tail is None and head is None):
+            return pts
+        pts = list(pts)
+        if tail is not None:
+            toward = pts[1]
+            if head is not None and len(pts) == 2:
+                toward = self.graphicCentre(head)
+            pts[0] = self.lineEndPoint(tail, pts[0], toward)
+        if head is not None:
+            pts[-1] = self.lineEndPoint(head, pts[-1], pts[-2])
+        return pts
+        
+    def graphicCentre(self, graphic):
+        x, y, width, height = self.extractBoundCOordinates(graphic["Bounds"])
+        return [x + 0.5 * width, y + 0.5 * height]
+        
+    def lineEndPoint(self, graphic, pt, toward):
+        """Where a line heading from toward should meet graphic: pt if it
+           still does, otherwise the graphic's magnet nearest toward, or
+           the edge of its bounds"""
+        bounds = self.extractBoundCOordinates(graphic["Bounds"])
+        if geom.in_rect(bounds, pt, ENDPOINT_SLACK):
+            return pt
+        self.stats.count("moved line ends")
+        magnets = graphic.get("Magnets")
+        if magnets:
+            x, y, width, height = bounds
+            points = [[x + 0.5 * width * (1 + mx), y + 0.5 * height * (1 + my)]
+                      for mx, my in self.extractMagnetCoordinates(magnets)]
+            return min(points, key = lambda p: (p[0] - toward[0]) ** 2 + (p[1] - toward[1]) ** 2)
+        return geom.rect_edge_point(bounds, toward)
+        
     def extractBoundCOordinates(self,bnds):
         bnds = bnds[1:-1].strip()
         bnds = bnds.split(",")
@@ -220,100 +716,190 @@ class GraffleParser(object):
 
                 
     def svgItterateGraffleGraphics(self,GraphicsList):
-        """parent should be a list of """
-        for graphics in GraphicsList:
-            # Styling
-            self.style.appendScope()
-            if graphics.get("Style") is not None:
-                self.svgSetGraffleStyle(graphics.get("Style"))
+        """Draw a list of graphics, and the graphics of the groups among
+           them, into svg_current_layer"""
+        # a stack of our own rather than recursion for groups, so nesting
+        # is only limited by memory. Frames are (graphics left to draw,
+        # the group they're in, the layer to go back to after it)
+        stack = [(iter(GraphicsList), None, None)]
+        while stack:
+            graphics_left, group, layer = stack[-1]
+            graphics = next(graphics_left, None)
+            if graphics is None:
+                stack.pop()
+                if group is not None:
+                    self.style.popScope()
+                    self.svg_current_layer = layer
+                    self.svgFinishGraffleGraphic(group)
+                continue
+            self.checkBudget("render")
+            self.checkPoints(graphics)
+            if self.draft is not None and self.draftTooSmall(graphics):
+                self.stats.count("draft skipped")
+                continue
+            subgraphics = self.svgStartGraffleGraphic(graphics)
+            if subgraphics is None:
+                self.svgFinishGraffleGraphic(graphics)
+            else:
+                current_layer = self.svg_current_layer
+                self.style.appendScope()
+                self.svg_current_layer = self.svg_addGroup(current_layer, style = str(self.style))
+                stack.append((reversed(subgraphics), graphics, current_layer))
             
-            cls = graphics["Class"]
-            if cls == "SolidGraphic":
-                # used as background - add a 
-                shallowcopy = {"Shape":"Rectangle"}
-                shallowcopy.update(graphics)
-                self.svgAddGraffleShapedGraphic(shallowcopy)
-                
-            elif cls == "ShapedGraphic":
-                try:
-                    self.svgAddGraffleShapedGraphic(graphics)
-                except:
-                    raise
-                    print "could not show shaped graphic"
-                
-            elif cls == "LineGraphic":
-                pts = self.extractMagnetCoordinates(graphics["Points"])
-                self.style["fill"] = "none"
-                if graphics.get("OrthogonalBarAutomatic") == False:
-                    bar_pos = graphics.get("OrthogonalBarPosition")
-                    if bar_pos is not None:
-                        # Decide where to place the orthogonal position
-                        
-                        bar_pos = float(bar_pos)
-                        """
-                        # This isn't right
-                        out_pts = []
-                        i = 0
-                        while i < len(pts) - 1:
-                            p1 = pts[i]
-                            p2 = pts[i+1]
-                            newpt = [p1[0] + bar_pos, p1[1]]
-                            out_pts.append(p1)
-                            out_pts.append(newpt)
-                            out_pts.append(p2)
-                            i+=2
-                        pts = out_pts
-                        """
-                        
-                    
-                self.svg_addPath(self.svg_current_layer, pts)
-                
-            elif cls == "TableGroup":
-                # In Progress
-                table_graphics = graphics.get("Graphics")
-                if table_graphics is not None:
-                    current_layer = self.svg_current_layer
-                    self.style.appendScope()
-                    g_emt = self.svg_dom.createElement("g")
-                    g_emt.setAttribute("style",str(self.style))
-                    current_layer.appendChild(g_emt)
-                    self.svg_current_layer = g_emt
+    def subgraphicIds(self, graphic):
+        """The element ids of graphic and the graphics inside it"""
+        ids = []
+        stack = [graphic]
+        while stack:
+            g = stack.pop()
+            ids.append(self.element_ids.get(id(g)))
+            if g.get("Graphics") is not None:
+                stack.extend(g["Graphics"])
+        return ids
+        
+    def svgStartGraffleGraphic(self, graphics):
+        """Draw a graphic - for a group, return its graphics to draw
+           inside it, then svgFinishGraffleGraphic"""
+        if self.stable_ids:
+            self.svg_id_stack.append([self.element_ids.get(id(graphics)), 0])
+        # Styling
+        self.style.appendScope()
+        if graphics.get("Style") is not None:
+            self.svgSetGraffleStyle(graphics.get("Style"))
+        
+        cls = graphics["Class"]
+        self.stats.count("class:%s" % cls)
+        if cls == "SolidGraphic":
+            # used as background - add a 
+            shallowcopy = {"Shape":"Rectangle"}
+            shallowcopy.update(graphics)
+            self.svgAddGraffleShapedGraphic(shallowcopy)
+            
+        elif cls == "ShapedGraphic":
+            try:
+                self.svgAddGraffleShapedGraphic(graphics)
+            except:
+                self.stats.warn("could not show shaped graphic")
+                raise
+            
+        elif cls == "LineGraphic":
+            pts = self.extractMagnetCoordinates(graphics["Points"])
+            pts = self.connectLineEnds(graphics, pts)
+            self.style["fill"] = "none"
+            if graphics.get("OrthogonalBarAutomatic") == False:
+                bar_pos = graphics.get("OrthogonalBarPosition")
+                if bar_pos is not None:
+                    # Decide where to place the orthogonal position
                     
-                    self.svgItterateGraffleGraphics(reversed(table_graphics))
+                    bar_pos = float(bar_pos)
+                    """
+                    # This isn't right
+                    out_pts = []
+                    i = 0
+                    while i < len(pts) - 1:
+                        p1 = pts[i]
+                        p2 = pts[i+1]
+                        newpt = [p1[0] + bar_pos, p1[1]]
+                        out_pts.append(p1)
+                        out_pts.append(newpt)
+                        out_pts.append(p2)
+                        i+=2
+                    pts = out_pts
+                    """
                     
-                    self.style.popScope()
-                    self.svg_current_layer = current_layer
-            elif cls == "Group":
-                subgraphics = graphics.get("Graphics")
-                if subgraphics is not None:
-                    current_layer = self.svg_current_layer
-                    self.style.appendScope()
-                    g_emt = self.svg_dom.createElement("g")
-                    g_emt.setAttribute("style",str(self.style))
-                    current_layer.appendChild(g_emt)
-                    self.svg_current_layer = g_emt
-                    self.svgItterateGraffleGraphics(reversed(subgraphics))
-                    self.style.popScope()
-                    self.svg_current_layer = current_layer
-            else:
-                print "Don't know how to display Class \"%s\""%cls
                 
+            self.svg_addPath(self.svg_current_layer, pts)
+            
+        elif cls == "TableGroup":
+            # In Progress
+            return graphics.get("Graphics")
+        elif cls == "Group":
+            return graphics.get("Graphics")
+        else:
+            self.stats.warn("Don't know how to display Class \"%s\""%cls)
+        return None
                 
+    def svgFinishGraffleGraphic(self, graphics):
+        """Add a graphic's text, once it (and any graphics inside) are drawn"""
+        if graphics.get("Text") is not None and self.draft is None:
+            # have to write some text too ...
+            coords = self.extractBoundCOordinates(graphics['Bounds'])
+            self.svgSetGraffleFont(graphics.get("FontInfo"))
+            
+            x, y, width, height = coords
+            x += float(graphics['Text'].get('Pad',0))
+            y += float(graphics['Text'].get('VerticalPad',0))
+            self.svg_addText(self.svg_current_layer, rtftext = graphics.get("Text").get("Text",""),
+                             x = x, y = y, width = width, height = height)
+        self.style.popScope()
+        if self.stable_ids:
+            self.svg_id_stack.pop()
+        
+    def svgElementId(self, opts):
+        """The id of the next element drawn: the one in opts, else with
+           stable_ids the next of the graphic being drawn, else """""
+        if opts.get("id") or not self.svg_id_stack:
+            return opts.get("id", "")
+        drawing = self.svg_id_stack[-1]
+        name, count = drawing
+        if name is None:
+            return ""
+        drawing[1] += 1
+        if count:
+            return "%s.%d" % (name, count)
+        return name
+        
+        
+    def draftTooSmall(self, graphic):
+        """Is the graphic too small to bother with in a draft"""
+        if graphic.get("Bounds") is not None:
+            x, y, width, height = self.extractBoundCOordinates(graphic["Bounds"])
+        elif graphic.get("Points"):
+            pts = self.extractMagnetCoordinates(graphic["Points"])
+            xs = [pt[0] for pt in pts]
+            ys = [pt[1] for pt in pts]
+            width, height = max(xs) - min(xs), max(ys) - min(ys)
+        else:
+            return False
+        return self.draft.tooSmall(width, height)
+        
+    def svgNumber(self, value):
+        """A coordinate as written in the svg"""
+        if self.draft is not None:
+            return self.draft.number(value)
+        return str(value)
+        
+    def svgPathData(self, commands):
+        """The d attribute for a list of pathdata commands"""
+        precision = self.precision
+        if self.draft is not None:
+            precision = min(precision, self.draft.precision)
+        return encodePath(commands, precision)
+        
+    def draftPoints(self, pts):
+        if self.draft is not None:
+            return self.draft.simplify(pts)
+        return pts
+        
+    def svgSkipGraffleGraphics(self, GraphicsList):
+        """Leave the parser as drawing GraphicsList would (the current
+           font carries on to later text), without drawing anything"""
+        # entries are (graphic, whether the graphics inside it are done)
+        stack = [(graphics, False) for graphics in reversed(list(GraphicsList))]
+        while stack:
+            graphics, inside_done = stack.pop()
+            if not inside_done and graphics.get("Class") in ("Group", "TableGroup") and \
+                    graphics.get("Graphics") is not None:
+                # a group's graphics are drawn last to first, then its text
+                stack.append((graphics, True))
+                stack.extend([(g, False) for g in graphics["Graphics"]])
+                continue
             if graphics.get("Text") is not None:
-                # have to write some text too ...
-                coords = self.extractBoundCOordinates(graphics['Bounds'])
                 self.svgSetGraffleFont(graphics.get("FontInfo"))
                 
-                x, y, width, height = coords
-                x += float(graphics['Text'].get('Pad',0))
-                y += float(graphics['Text'].get('VerticalPad',0))
-                self.svg_addText(self.svg_current_layer, rtftext = graphics.get("Text").get("Text",""),
-                                 x = x, y = y, width = width, height = height)
-            self.style.popScope()
-            
-            
     def svgAddGraffleShapedGraphic(self, graphic):
         shape = graphic['Shape']
+        self.stats.count("shape:%s" % shape)
         
         extra_opts = {}
         if graphic.get("HFlip","NO")=="YES":
@@ -323,93 +909,29 @@ class GraffleParser(object):
         if graphic.get("Rotation") is not None:
             extra_opts["Rotation"] = float(graphic["Rotation"])
             
-        if shape in ("Rectangle", "RoundRect"):
-            coords = self.extractBoundCOordinates(graphic['Bounds'])
-            if graphic.get("ImageID") is not None:
-                # TODO: images
-                image_id = int(graphic["ImageID"])
-                if len(self.imagelist) <= image_id:
-                    print "Error - image out of range"
-                    return
-                image = self.imagelist[image_id]
-                self.svg_addImage(self.svg_current_layer, bounds = coords, \
-                                  href = image)
-                print "Insert Image - " + str(image)
-            else:
-                # radius of corners is stored on the style in graffle
-                sty = graphic.get("Style",{})
-                stroke = sty.get("stroke",{})
-                radius = stroke.get("CornerRadius",None)
-                
-                x, y   = coords[0], coords[1]
-                width  = coords[2]# - coords[0]
-                height = coords[3]# - coords[1]
-                self.svg_addRect(self.svg_current_layer,
-                                        x = x,
-                                        y = y,
-                                        width = width,
-                                        height = height,
-                                        rx=radius,
-                                        ry=radius,
-                                        **extra_opts)
-
-        elif shape == "HorizontalTriangle":
-            bounds = self.extractBoundCOordinates(graphic['Bounds'])
-            self.svg_addHorizontalTriangle(self.svg_current_layer,
-                                        bounds = bounds,
-                                        **extra_opts \
-                                        )
-        elif shape == "RightTriangle":
-            bounds = self.extractBoundCOordinates(graphic['Bounds'])
-            self.svg_addRightTriangle(self.svg_current_layer,
-                                        bounds = bounds,
-                                        **extra_opts \
-                                        )
-        elif shape == "VerticalTriangle":
-            bounds = self.extractBoundCOordinates(graphic['Bounds'])
-            self.svg_addVerticalTriangle(self.svg_current_layer,
-                                         bounds = bounds,
-                                         **extra_opts \
-                                         )
-        elif shape == "Circle":
-            # Actually can be an ellipse
-            bounds = self.extractBoundCOordinates(graphic["Bounds"])
-            self.svg_addEllipse(self.svg_current_layer,
-                                        bounds = bounds,
-                                        **extra_opts \
-                                        )
-        elif shape == "Bezier":
-            bounds = self.extractBoundCOordinates(graphic["Bounds"])
-            self.svg_addBezier(self.svg_current_layer,
-                                        bounds, graphic["ShapeData"],
-                                        **extra_opts)
-        elif shape == "AdjustableArrow":
-            bounds = self.extractBoundCOordinates(graphic["Bounds"])
-            self.svg_addAdjustableArrow(self.svg_current_layer,
-                                        bounds = bounds,
-                                        graphic = graphic,
-                                        **extra_opts \
-                                        )
-        elif shape == "Diamond":
-            bounds = self.extractBoundCOordinates(graphic["Bounds"])
-            self.svg_addDiamond(self.svg_current_layer,
-                                        bounds = bounds,
-                                        **extra_opts \
-                                        )
-        elif shape == "Subprocess":
-            bounds = self.extractBoundCOordinates(graphic["Bounds"])
-            self.svg_addSubprocess(self.svg_current_layer,
-                                        bounds = bounds,
-                                        **extra_opts \
-                                        )
-        elif shape == "Cloud":
-            bounds = self.extractBoundCOordinates(graphic["Bounds"])
-            self.svg_addCloud(self.svg_current_layer,
-                                        bounds = bounds,
-                                        **extra_opts \
-                                        )
-        else:
-            print "Don't know how to display Shape %s"%str(graphic['Shape'])
+        renderer = shapeRenderer(shape)
+        if renderer is None:
+            self.stats.warn("Don't know how to display Shape %s"%str(graphic['Shape']))
+            return
+        bounds = self.extractBoundCOordinates(graphic['Bounds'])
+        renderer(self, self.svg_current_layer, graphic, bounds, **extra_opts)
+        
+    def svgAddGraffleImage(self, node, graphic, bounds):
+        # TODO: images
+        image_id = int(graphic["ImageID"])
+        if len(self.imagelist) <= image_id:
+            self.stats.warn("image out of range")
+            return
+        image = self.imagelist[image_id]
+        self.svg_addImage(node, bounds = bounds, href = image)
+        self.stats.count("images")
+            
+    def svgScopeStyle(self):
+        """The style attribute for an element drawn in the current scope"""
+        # counted rather than timed - it's called for every element, and
+        # timing each call would cost more than the call itself
+        self.stats.count("styles")
+        return str(self.style.scopeStyle())
             
     def extract_colour(self,col):
         # only gets rgb values (ignores a)
@@ -442,29 +964,8 @@ class GraffleParser(object):
                 if grap_col is not None:
                     stroke_col = self.extract_colour(grap_col)
                     self.style["stroke"]="#%s"%stroke_col
-            if stroke.get("HeadArrow") is not None:
-                headarrow = stroke["HeadArrow"]
-                if headarrow == "FilledArrow":
-                    self.style["marker-end"]=":url(#Arrow1Lend)"
-                    self.required_defs.add("Arrow1Lend")
-                elif headarrow == "Bar":
-                    #TODO
-                    self.style["marker-end"]="url(#mBar)"
-                    self.required_defs.add("Bar")                    
-                elif headarrow == "0":
-                    self.style["marker-end"] = "none"
-                    
-            if stroke.get("TailArrow") is not None:
-                tailarrow = stroke["TailArrow"]
-                if tailarrow == "FilledArrow":
-                    self.style["marker-start"]="url(#Arrow1Lstart)"
-                    self.required_defs.add("Arrow1Lstart")
-                elif tailarrow == "CrowBall":
-                    self.style["marker-start"]  = "url(#mCrowBall)"
-                    self.required_defs.add("CrowBall")
-                    
-                elif tailarrow == "0":
-                    self.style["marker-start"]="none"
+            if self.draft is None:
+                self.svgSetGraffleArrows(stroke)
             if stroke.get("Width") is not None:
                 width = stroke["Width"]
                 self.style["stroke-width"]="%fpx"%float(width)
@@ -476,11 +977,37 @@ class GraffleParser(object):
                 elif pattern == 2:
                     self.style["stroke-dasharray"]="5 5"
             
-        if style.get("shadow",{}).get("Draws","NO") != "NO":
+        if style.get("shadow",{}).get("Draws","NO") != "NO" and self.draft is None:
             # for some reason graffle has a shadow by default
             self.required_defs.add("DropShadow")
             self.style["filter"]="url(#DropShadow)"
 
+    def svgSetGraffleArrows(self, stroke):
+        """Line ends are drawn with markers from <defs>"""
+        if stroke.get("HeadArrow") is not None:
+            headarrow = stroke["HeadArrow"]
+            if headarrow == "FilledArrow":
+                self.style["marker-end"]=":url(#Arrow1Lend)"
+                self.required_defs.add("Arrow1Lend")
+            elif headarrow == "Bar":
+                #TODO
+                self.style["marker-end"]="url(#mBar)"
+                self.required_defs.add("Bar")                    
+            elif headarrow == "0":
+                self.style["marker-end"] = "none"
+                
+        if stroke.get("TailArrow") is not None:
+            tailarrow = stroke["TailArrow"]
+            if tailarrow == "FilledArrow":
+                self.style["marker-start"]="url(#Arrow1Lstart)"
+                self.required_defs.add("Arrow1Lstart")
+            elif tailarrow == "CrowBall":
+                self.style["marker-start"]  = "url(#mCrowBall)"
+                self.required_defs.add("CrowBall")
+                
+            elif tailarrow == "0":
+                self.style["marker-start"]="none"
+
     def svgSetGraffleFont(self, font):
         if font is None: return
         fontstuffs = []
@@ -511,85 +1038,10 @@ class GraffleParser(object):
         
         
     def svg_add_requirements(self):
-        if "Arrow1Lend" in self.required_defs:
-            # TODO
-            p = xml.dom.minidom.parseString("""
-            <defs><marker
-               orient='auto'
-               refY='0.0'
-               refX='0.0'
-               id='Arrow1Lend'
-               style='overflow:visible;'>
-              <path
-                 id='path3666'
-                 d='M -10,0.0 L -10.0,-2.0 L 0.0,0.0 L -10.0,2.0 z '
-                 style='fill-rule:evenodd;stroke:#000000;stroke-width:1.0px;marker-start:none;' />
-            </marker></defs>""")
-            def_node = p.childNodes[0]
-            for node in def_node.childNodes:
-                self.svg_def.appendChild(node)
-                
-        if "Arrow1Lstart" in self.required_defs:
-            p = xml.dom.minidom.parseString("""
-            <defs><marker
-               orient='auto'
-               refY='0.0'
-               refX='0.0'
-               id='Arrow1Lstart'
-               style='overflow:visible'>
-              <path
-                 id='path3663'
-                 d='M 10,0.0 L 10.0,-2.0 L 0.0,0.0 L 10.0,2.0 z'
-                 style='fill-rule:evenodd;stroke:#000000;stroke-width:1.0px;marker-start:none'/>
-            </marker></defs>""")
-            def_node = p.childNodes[0]
-            for node in def_node.childNodes:
-                self.svg_def.appendChild(node)
-                
-        if "DropShadow" in self.required_defs:
-            p = xml.dom.minidom.parseString("""
-            <defs><filter id='DropShadow' filterRes='100' x='0' y='0'>
-               <feGaussianBlur stdDeviation='3' result='MyBlur'/>
-               <feOffset in='MyBlur' dx='2' dy='4' result='movedBlur'/>
-               <feMerge>
-                   <feMergeNode in='movedBlur'/>
-                   <feMergeNode in='SourceGraphic'/>
-               </feMerge>
-          </filter></defs>""")
-            def_node = p.childNodes[0]
-            for node in def_node.childNodes:
-                self.svg_def.appendChild(node)
-                
-        if "CrowBall" in self.required_defs:
-            p = xml.dom.minidom.parseString("""
-            <defs><marker
-            refX='0'
-            refY='0'
-            orient='auto'
-            id='mCrowBall'
-            style='overflow:visible'>
-            <path d='M 0.0,2.5 L 7.5,0.0 L 0.0,-2.5' 
-             style='stroke:#000;stroke-width:1.0px;marker-start:none;fill:none;' />
-            <circle cx='10' cy='0' r='2.5' style='stroke-width:1px; stroke: #000; fill:none;'/>
-            </marker></defs>""")
-            def_node = p.childNodes[0]
-            for node in def_node.childNodes:
-                self.svg_def.appendChild(node)
-                
-        if "Bar" in self.required_defs:
-            p = xml.dom.minidom.parseString("""
-            <defs><marker
-            refX='0'
-            refY='0'
-            orient='auto'
-            id='mBar'
-            style='overflow:visible'>
-            <path d='M -7.5,-2.5 L -7.5,2.5' 
-             style='stroke:#000;stroke-width:1.0px;marker-start:none;fill:none;' />
-            </marker></defs>""")
-            def_node = p.childNodes[0]
-            for node in def_node.childNodes:
-                self.svg_def.appendChild(node)
+        for name, template in DEF_TEMPLATES:
+            if name in self.required_defs:
+                for node in defTemplate(name):
+                    self.svg_def.appendChild(self.svg_dom.importNode(node, True))
 
     def svg_addBezier(self, node, bounds, shapeopts, **opts):
         points = shapeopts["UnitPoints"]
@@ -608,26 +1060,30 @@ class GraffleParser(object):
         if opts.get("Rotation") is not None:
             points = geom.rotate_points(points, opts["Rotation"])
 
-        ptStrings = [",".join([str(b) for b in a]) for a in points]
-        line_string = "M %s"%ptStrings[0] + " ".join(" L %s"%a for a in ptStrings[1:])
+        # UnitPoints are the start, then (control, control, end) for each
+        # curve - with two left over the last curve goes back to the start
+        commands = [("M", points[0])]
+        i = 1
+        while i + 2 < len(points):
+            commands.append(("C", points[i], points[i + 1], points[i + 2]))
+            i += 3
+        if len(points) - i == 2:
+            commands.append(("C", points[i], points[i + 1], points[0]))
+        commands.append(("Z",))
         
-        path_tag = self.svg_dom.createElement("path")
-        path_tag.setAttribute("id", opts.get("id",""))
-        path_tag.setAttribute("style", str(self.style.scopeStyle()))
-        path_tag.setAttribute("d", line_string)
-        node.appendChild(path_tag)
+        self.svg_addPathCommands(node, commands, **opts)
 
     def svg_addEllipse(self, node, bounds, **opts):
         c = [bounds[i] + (bounds[i+2]/2.) for i in [0,1]] # centre of circle
         rx = bounds[2]/2.
         ry = bounds[3]/2.
         circle_tag = self.svg_dom.createElement("ellipse")
-        circle_tag.setAttribute("id", opts.get("id",""))
-        circle_tag.setAttribute("style", str(self.style.scopeStyle()))
-        circle_tag.setAttribute("cx", str(c[0]))
-        circle_tag.setAttribute("cy", str(c[1]))
-        circle_tag.setAttribute("rx", str(rx))
-        circle_tag.setAttribute("ry", str(ry))
+        circle_tag.setAttribute("id", self.svgElementId(opts))
+        circle_tag.setAttribute("style", self.svgScopeStyle())
+        circle_tag.setAttribute("cx", self.svgNumber(c[0]))
+        circle_tag.setAttribute("cy", self.svgNumber(c[1]))
+        circle_tag.setAttribute("rx", self.svgNumber(rx))
+        circle_tag.setAttribute("ry", self.svgNumber(ry))
         node.appendChild(circle_tag)
 
     def svg_addAdjustableArrow(self, node, bounds, graphic,**opts):
@@ -639,34 +1095,33 @@ class GraffleParser(object):
                           [x+width,y+height/2], [x+width-neck,y+height], [x+width-neck,y+height-neck_delta],
                           [x,y+height-neck_delta]],closepath=True,**opts)
 
+    def svg_addShape(self, shape, node, bounds, **opts):
+        """Draw one of the Shapes in the shapes registry"""
+        shapeRenderer(shape)(self, node, None, [float(a) for a in bounds], **opts)
+
+    # the shapes are drawn by the shapes registry now - these are kept
+    # for code which called them directly
     def svg_addDiamond(self, node, bounds, **opts):
-        x, y, width, height = [float(a) for a in bounds]
-        self.svg_addPath(node,[[x + (width / 2), y],
-                               [x + width, y + (height / 2)],
-                               [x + (width / 2), y + height],
-                               [x, y + (height / 2)]],
-                                closepath=True, **opts)
-                                
+        self.svg_addShape("Diamond", node, bounds, **opts)
+
     def svg_addSubprocess(self, node, bounds, **opts):
-        # TODO: check ISO flowchart specification for correct ratio?
-        x, y, width, height = [float(a) for a in bounds]
-        self.svg_addRect(node, width=width, height=height, x=x, y=y, **opts)
-        # add the vertical lines
-        
-        x_offset = width * 0.1
-        self.svg_addPath(node, [[x + x_offset, y],
-                                [x + x_offset, y + height]],
-                                closepath=False, **opts)
-                                
-        self.svg_addPath(node, [[x + width - x_offset, y],
-                                [x + width - x_offset, y + height]],
-                                closepath=False, **opts)
-                                
+        self.svg_addShape("Subprocess", node, bounds, **opts)
+
     def svg_addCloud(self, node, bounds, **opts):
-        x, y, width, height = [float(a) for a in bounds]
-        #TODO: draw an actual shape (should abstract the shape scaling etc)
-        self.svg_addRect(node, x=x, y=y, width=width, height=height, **opts)
-                             
+        self.svg_addShape("Cloud", node, bounds, **opts)
+
+    def svg_addHorizontalTriangle(self, node, bounds, rotation = 0, **opts):
+        """Graffle has the "HorizontalTriangle" Shape"""
+        self.svg_addShape("HorizontalTriangle", node, bounds, **opts)
+
+    def svg_addRightTriangle(self, node, bounds, rotation = 0, **opts):
+        """Graffle has the "RightTriangle" Shape"""
+        self.svg_addShape("RightTriangle", node, bounds, **opts)
+
+    def svg_addVerticalTriangle(self, node, bounds, rotation = 0, **opts):
+        """Graffle has the "VerticalTriangle" Shape"""
+        self.svg_addShape("VerticalTriangle", node, bounds, **opts)
+
     def svg_addPath(self, node, pts, **opts):
         # do geometry mapping here
         mypts = pts
@@ -676,79 +1131,136 @@ class GraffleParser(object):
             mypts = geom.v_flip_points(mypts)
         if opts.get("Rotation") is not None:
             mypts = geom.rotate_points(mypts,opts["Rotation"])
+        mypts = self.draftPoints(mypts)
             
-        ptStrings = [",".join([str(b) for b in a]) for a in mypts]
-        line_string = "M %s"%ptStrings[0] + " ".join(" L %s"%a for a in ptStrings[1:] )
+        commands = [("M", mypts[0])] + [("L", pt) for pt in mypts[1:]]
         if opts.get("closepath",False) == True:
-            line_string = line_string + " z"
+            commands.append(("Z",))
+        self.svg_addPathCommands(node, commands, **opts)
+        
+    def svg_addPathCommands(self, node, commands, **opts):
+        """Add an svg path - commands as pathdata.encodePath takes them"""
+        style = self.svgScopeStyle()
+        d = self.svgPathData(commands)
+        if self.merge_paths and self.svgMergePath(node, commands, style, d, opts):
+            return
         path_tag = self.svg_dom.createElement("path")
-        path_tag.setAttribute("id", opts.get("id",""))
-        path_tag.setAttribute("style", str(self.style.scopeStyle()))
-        path_tag.setAttribute("d", line_string)
+        path_tag.setAttribute("id", self.svgElementId(opts))
+        path_tag.setAttribute("style", style)
+        path_tag.setAttribute("d", d)
         node.appendChild(path_tag)
+        if self.merge_paths and not opts.get("id") and self.svgMergeableStyle():
+            self.merged_path = MergedPath(path_tag, style, d, self.svgPathBox(commands))
+        
+    def svgMergePath(self, node, commands, style, d, opts):
+        """Join a path onto the <path> drawn just before it, if that looks
+           the same: it must be drawn alike, without markers, shadows or
+           transparency, and filled paths mustn't overlap"""
+        merged = self.merged_path
+        if merged is None or node.lastChild is not merged.path or style != merged.style \
+                or opts.get("id") or len(merged.parts) >= MAX_MERGED_PATHS:
+            return False
+        if merged.boxes is not None:
+            box = self.svgPathBox(commands)
+            for other in merged.boxes:
+                if box[0] <= other[2] and other[0] <= box[2] and \
+                        box[1] <= other[3] and other[1] <= box[3]:
+                    return False
+            merged.boxes.append(box)
+        merged.parts.append(d)
+        merged.path.setAttribute("d", "".join(merged.parts))
+        self.stats.count("merged paths")
+        return True
+        
+    def svgMergeableStyle(self):
+        """Can paths drawn in the current style be joined"""
+        style = self.style.currentStyle()
+        for name in ("marker-start", "marker-mid", "marker-end", "filter"):
+            if style.get(name, "none") != "none":
+                return False
+        for name in ("opacity", "fill-opacity", "stroke-opacity"):
+            if style.get(name) is not None and float(style[name]) != 1:
+                return False
+        return True
+        
+    def svgPathBox(self, commands):
+        """Bounds, with room for the stroke, of a filled path - None if
+           it isn't filled"""
+        if self.style["fill"] == "none":
+            return None
+        try:
+            width = float(str(self.style["stroke-width"]).replace("px", ""))
+        except KeyError:
+            width = 1.
+        # room for mitred corners too
+        pad = 2 * width
+        xs = [float(pt[0]) for command in commands for pt in command[1:]]
+        ys = [float(pt[1]) for command in commands for pt in command[1:]]
+        return (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
         
-    def svg_addHorizontalTriangle(self, node, bounds, rotation = 0, **opts):
-        """Graffle has the "HorizontalTriangle" Shape"""
-        x,y,width,height = [float(a) for a in bounds]
-        self.svg_addPath(node, [[x,y],[x+width,y+height/2], [x,y+height]], \
-                        closepath=True, **opts)
-                        
     def svg_addImage(self, node, bounds, **opts):
         """SVG viewers should support images - unfortunately many don't :-("""
         x,y,width,height = [float(a) for a in bounds]
         image_tag = self.svg_dom.createElement("image")
-        image_tag.setAttribute("x", str(x))
-        image_tag.setAttribute("y", str(y))
-        image_tag.setAttribute("width", str(width))
-        image_tag.setAttribute("height", str(height))
+        image_id = self.svgElementId(opts)
+        if image_id:
+            image_tag.setAttribute("id", image_id)
+        image_tag.setAttribute("x", self.svgNumber(x))
+        image_tag.setAttribute("y", self.svgNumber(y))
+        image_tag.setAttribute("width", self.svgNumber(width))
+        image_tag.setAttribute("height", self.svgNumber(height))
         image_tag.setAttribute("xlink:href", str(opts.get("href","")))
-        image_tag.setAttribute("style", str(self.style.scopeStyle()))
+        image_tag.setAttribute("style", self.svgScopeStyle())
         node.appendChild(image_tag)
         
-    def svg_addRightTriangle(self, node, bounds, rotation = 0, **opts):
-        """Graffle has the "RightTriangle" Shape"""
-        x,y,width,height = [float(a) for a in bounds]
-        self.svg_addPath(node, [[x,y],[x+width,y+height], [x,y+height]], \
-                        closepath=True, **opts)
-
-    def svg_addVerticalTriangle(self, node, bounds, rotation = 0, **opts):
-        """Graffle has the "RightTriangle" Shape"""
-        x,y,width,height = [float(a) for a in bounds]
-        self.svg_addPath(node, [[x,y],[x+width,y], [x+width/2,y+height]], \
-                        closepath=True, **opts)
-            
+    def svg_addGroup(self, node, style = None, cls = None):
+        """Add (and return) an svg g"""
+        g_emt = self.svg_dom.createElement("g")
+        g_id = self.svgElementId({})
+        if g_id:
+            g_emt.setAttribute("id", g_id)
+        if style is not None:
+            g_emt.setAttribute("style", style)
+        if cls is not None:
+            g_emt.setAttribute("class", cls)
+        node.appendChild(g_emt)
+        return g_emt
+        
     def svg_addRect(self, node, **opts):
         """Add an svg rect"""
         if opts is None:
             opts = {}
+        if self.merge_paths and opts.get("rx") is None:
+            # drawn as a path, which the paths around it can join
+            x, y = float(opts.get("x", 0)), float(opts.get("y", 0))
+            width, height = float(opts["width"]), float(opts["height"])
+            self.svg_addPathCommands(node, [("M", [x, y]), ("L", [x + width, y]),
+                                            ("L", [x + width, y + height]),
+                                            ("L", [x, y + height]), ("Z",)], **opts)
+            return
         rect_tag = self.svg_dom.createElement("rect")
-        rect_tag.setAttribute("id",opts.get("id",""))
-        rect_tag.setAttribute("width",str(opts["width"]))
-        rect_tag.setAttribute("height",str(opts["height"]))
-        rect_tag.setAttribute("x",str(opts.get("x","0")))
-        rect_tag.setAttribute("y",str(opts.get("y","0")))
+        rect_tag.setAttribute("id",self.svgElementId(opts))
+        rect_tag.setAttribute("width",self.svgNumber(float(opts["width"])))
+        rect_tag.setAttribute("height",self.svgNumber(float(opts["height"])))
+        rect_tag.setAttribute("x",self.svgNumber(float(opts.get("x",0))))
+        rect_tag.setAttribute("y",self.svgNumber(float(opts.get("y",0))))
         if opts.get("rx") is not None:
-            rect_tag.setAttribute("rx",str(opts["rx"]))
-            rect_tag.setAttribute("ry",str(opts["ry"]))
+            rect_tag.setAttribute("rx",self.svgNumber(opts["rx"]))
+            rect_tag.setAttribute("ry",self.svgNumber(opts["ry"]))
             
-        rect_tag.setAttribute("style", str(self.style.scopeStyle()))
+        rect_tag.setAttribute("style", self.svgScopeStyle())
         node.appendChild(rect_tag)
         
         
     def svg_addText(self,node,**opts):
         """Add an svg text element"""
-        text_tag = self.svg_dom.createElement("text")
-        text_tag.setAttribute("id",opts.get("id",""))
-        text_tag.setAttribute("x",str(opts.get("x","0")))
-        text_tag.setAttribute("y",str(opts.get("y","0")))
-        text_tag.setAttribute("style", ";".join( \
-                                [str(self.style.scopeStyle()),self.svg_current_font]))
-        node.appendChild(text_tag)
+        text_tag = self.svg_addTextElement(node, **opts)
         
         # TODO: lines need to be moved down by the correct size
         
-        # Generator
-        lines = extractRTFString(opts["rtftext"])
+        with self.stats.timer("rtf"):
+            lines = list(extractRTFString(opts["rtftext"]))
+        self.stats.count("rtf spans", len(lines))
         
         i = 0
         for span in lines:
@@ -756,11 +1268,22 @@ class GraffleParser(object):
                     y_offset = i, line_height = 12, **opts)
             i+=1
         
+    def svg_addTextElement(self, node, **opts):
+        """Add (and return) the svg text element the lines go in"""
+        text_tag = self.svg_dom.createElement("text")
+        text_tag.setAttribute("id",self.svgElementId(opts))
+        text_tag.setAttribute("x",str(float(opts.get("x",0))))
+        text_tag.setAttribute("y",str(float(opts.get("y",0))))
+        text_tag.setAttribute("style", ";".join( \
+                                [self.svgScopeStyle(),self.svg_current_font]))
+        node.appendChild(text_tag)
+        return text_tag
+        
     def svg_addLine(self,textnode, **opts):
         """Add a line of text"""
         tspan_node = self.svg_dom.createElement("tspan")
-        tspan_node.setAttribute("id",opts.get("id",""))
-        tspan_node.setAttribute("x",str(opts.get("x","0")))
+        tspan_node.setAttribute("id",self.svgElementId(opts))
+        tspan_node.setAttribute("x",str(float(opts.get("x",0))))
         y_pos = float(opts.get("y",0)) + \
                 opts.get("line_height",12) * (opts.get("y_offset",0)+1)
         if opts.get("style") is not None:
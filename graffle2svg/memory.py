@@ -0,0 +1,153 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Keep a conversion inside a memory budget"""
+import os
+import sys
+import threading
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from limits import ResourceLimitExceeded
+
+STATM = "/proc/self/statm"
+STATUS = "/proc/self/status"
+
+# tracemalloc is global to the process: it is started for the first
+# budget which needs it and stopped after the last one (and only if a
+# budget started it), so budgets in other threads keep their tracing
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+def startTracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_users += 1
+
+def stopTracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def residentSize():
+    """Bytes of memory the process is using now, or None where that
+       can't be read (only Linux has /proc/self/statm)"""
+    try:
+        f = open(STATM)
+        try:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def peakResidentSize():
+    """The most memory the process (since it last exec'd) has used, in
+       bytes - ru_maxrss is kept across exec on Linux, so VmHWM is read
+       where there is one"""
+    try:
+        f = open(STATUS)
+        try:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+        finally:
+            f.close()
+    except (IOError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        # kilobytes, except on macOS
+        peak *= 1024
+    return peak
+
+
+def processMemory():
+    """What a budget counts: python's traced allocations where tracemalloc
+       is running, otherwise the current resident size, or failing that
+       the process's peak resident size"""
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    size = residentSize()
+    if size is None:
+        size = peakResidentSize()
+    return size or 0
+
+
+class MemoryBudgetExceeded(ResourceLimitExceeded):
+    """Raised when a conversion needs more memory than it was allowed"""
+    def describe(self, stage, used, limit):
+        return "%s needed %.1f MB, over the %.1f MB memory budget" \
+               % (stage, used / 1048576., limit / 1048576.)
+
+
+class MemoryBudget(object):
+    """Tracks memory use against a limit in bytes.
+
+       Counts what the process uses beyond what it used when start() was
+       called: python allocations where the interpreter has tracemalloc,
+       otherwise the resident size - so memory freed by an earlier
+       conversion and used again isn't counted, and the budget limits how
+       much the process grows.
+
+       Both are measured for the whole process, so a budget is only
+       meaningful when its conversion is the only one running in the
+       process: memory used by conversions in other threads is charged
+       to it too. Run conversions which need a budget in their own
+       processes.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.tracing = False
+        self.base = 0
+        self.peak = 0
+
+    def start(self):
+        if tracemalloc is not None:
+            startTracing()
+            self.tracing = True
+        self.base = processMemory()
+        return self
+
+    def stop(self):
+        if self.tracing:
+            stopTracing()
+            self.tracing = False
+
+    def used(self):
+        return max(processMemory() - self.base, 0)
+
+    def check(self, stage):
+        """Raise MemoryBudgetExceeded if we're now over the limit"""
+        used = self.used()
+        if used > self.peak:
+            self.peak = used
+        if used > self.limit:
+            raise MemoryBudgetExceeded(stage, used, self.limit)
@@ -0,0 +1,282 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Make a drawn svg smaller without changing how it looks.
+
+Run over the svg DOM once a sheet is drawn (GraffleParser's optimise
+option), this does what an svg optimiser such as svgo would:
+
+ - drops empty id attributes and whitespace between elements
+ - drops style properties which only repeat the inherited (or initial)
+   value
+ - hoists properties every child of a group (or text) sets to the same
+   value onto the group
+ - unwraps groups with no attributes, moves the style of a group with
+   a single child onto the child, and merges neighbouring groups with
+   the same style (and no other attributes)
+
+Every element keeps the computed style it had. Svg already serialised
+(fragments.CachedFragment) is left as it is and never has the style
+it inherits changed.
+"""
+from collections import OrderedDict
+
+# properties children inherit
+INHERITED = frozenset(["fill", "fill-opacity", "fill-rule", "stroke", "stroke-width",
+                       "stroke-opacity", "stroke-linecap", "stroke-linejoin",
+                       "stroke-miterlimit", "stroke-dasharray", "stroke-dashoffset",
+                       "marker-start", "marker-mid", "marker-end", "font-family",
+                       "font-size", "font-style", "font-weight", "font-variant",
+                       "text-anchor", "text-align", "visibility", "color"])
+
+# values properties have when nothing sets them
+INITIAL = {"fill": "#000000", "fill-opacity": "1", "fill-rule": "nonzero",
+           "stroke": "none", "stroke-width": "1", "stroke-opacity": "1",
+           "stroke-linecap": "butt", "stroke-linejoin": "miter",
+           "stroke-dasharray": "none", "stroke-dashoffset": "0",
+           "marker-start": "none", "marker-mid": "none", "marker-end": "none",
+           "font-style": "normal", "font-weight": "normal", "font-variant": "normal",
+           "visibility": "visible", "filter": "none", "opacity": "1"}
+
+# elements whose style can be hoisted into, from their children
+CONTAINERS = ("g", "text")
+
+COLOUR_NAMES = {"black": "#000000", "white": "#ffffff"}
+
+
+def parseStyle(text):
+    """"a:1;b:2" -> OrderedDict, the last of repeated properties winning
+       and declarations which aren't property:value dropped"""
+    style = OrderedDict()
+    for declaration in text.split(";"):
+        if ":" not in declaration:
+            continue
+        name, value = declaration.split(":", 1)
+        name = name.strip()
+        value = value.strip()
+        if name and value:
+            style.pop(name, None)
+            style[name] = value
+    return style
+
+def formatStyle(style):
+    return ";".join(["%s:%s" % item for item in style.items()])
+
+def sameValue(a, b):
+    """Do two property values mean the same"""
+    if a is None or b is None:
+        return False
+    return normalValue(a) == normalValue(b)
+
+def normalValue(value):
+    value = value.strip().lower()
+    value = COLOUR_NAMES.get(value, value)
+    if len(value) == 4 and value[0] == "#":
+        value = "#" + "".join([c * 2 for c in value[1:]])
+    if value.endswith("px"):
+        value = value[:-2]
+    try:
+        return repr(float(value))
+    except ValueError:
+        return value
+
+
+def isIgnorable(node):
+    """Whitespace between elements"""
+    return node.nodeType == node.TEXT_NODE and not node.data.strip()
+
+def elementsBelow(root):
+    """Every element under root, parents before their children"""
+    found = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        found.append(node)
+        stack.extend([child for child in reversed(node.childNodes)
+                      if child.nodeType == child.ELEMENT_NODE])
+    return found
+
+
+def setChildren(element, children):
+    """Replace all of element's children at once - one by one, with
+       removeChild and insertBefore, takes time quadratic in their number"""
+    element.childNodes[:] = children
+    previous = None
+    for child in children:
+        child.parentNode = element
+        child.previousSibling = previous
+        if previous is not None:
+            previous.nextSibling = child
+        previous = child
+    if previous is not None:
+        previous.nextSibling = None
+
+
+class SvgOptimiser(object):
+    """Optimises the svg under one element - see optimiseSvg"""
+    def __init__(self, root):
+        self.root = root
+        # element -> its parsed style, written back at the end
+        self.styles = {}
+
+    def run(self):
+        self.clean()
+        self.hoist()
+        self.dropRedundant()
+        self.collapse()
+        self.writeStyles()
+
+    def style(self, element):
+        return self.styles.setdefault(element, OrderedDict())
+
+    def clean(self):
+        for element in elementsBelow(self.root):
+            if element.getAttribute("id") == "" and element.hasAttribute("id"):
+                element.removeAttribute("id")
+            if element.hasAttribute("style"):
+                self.styles[element] = parseStyle(element.getAttribute("style"))
+            if element.tagName not in ("text", "tspan"):
+                if [child for child in element.childNodes if isIgnorable(child)]:
+                    setChildren(element, [child for child in element.childNodes
+                                          if not isIgnorable(child)])
+
+    def hoist(self):
+        """Move properties all of a container's children set alike onto it"""
+        for element in reversed(elementsBelow(self.root)):
+            if element.tagName not in CONTAINERS:
+                continue
+            children = [child for child in element.childNodes if not isIgnorable(child)]
+            if len(children) < 2 or \
+                    [child for child in children if child.nodeType != child.ELEMENT_NODE]:
+                continue
+            shared = None
+            for child in children:
+                style = self.styles.get(child, {})
+                found = set([(name, value) for (name, value) in style.items()
+                             if name in INHERITED])
+                if shared is None:
+                    shared = found
+                else:
+                    shared &= found
+                if not shared:
+                    break
+            if not shared:
+                continue
+            own = self.style(element)
+            for name, value in sorted(shared):
+                own.pop(name, None)
+                own[name] = value
+                for child in children:
+                    del self.styles[child][name]
+
+    def dropRedundant(self):
+        """Drop properties with the value they'd have anyway"""
+        stack = [(self.root, {})]
+        while stack:
+            element, inherited = stack.pop()
+            style = self.styles.get(element)
+            if style:
+                for name, value in style.items():
+                    if name in INHERITED:
+                        if sameValue(value, inherited.get(name, INITIAL.get(name))):
+                            del style[name]
+                    elif sameValue(value, INITIAL.get(name)):
+                        del style[name]
+                passed = dict(inherited)
+                passed.update([(name, value) for (name, value) in style.items()
+                               if name in INHERITED])
+            else:
+                passed = inherited
+            for child in element.childNodes:
+                if child.nodeType == child.ELEMENT_NODE:
+                    stack.append((child, passed))
+
+    def attributes(self, element):
+        """An element's attributes, other than style, and its style"""
+        attrs = sorted([(name, element.getAttribute(name))
+                        for name in element.attributes.keys() if name != "style"])
+        return attrs, self.styles.get(element) or {}
+
+    def collapse(self):
+        """Unwrap and merge groups"""
+        for element in reversed(elementsBelow(self.root)):
+            children = []
+            changed = False
+            for child in element.childNodes:
+                inside = self.unwrapped(child)
+                if inside is None:
+                    children.append(child)
+                else:
+                    children.extend(inside)
+                    changed = True
+            kept = []
+            # group -> its children, with those of the groups merged into it
+            grown = {}
+            for child in children:
+                previous = kept and kept[-1]
+                if self.mergeable(previous, child):
+                    grown.setdefault(previous, list(previous.childNodes)).extend(child.childNodes)
+                    self.styles.pop(child, None)
+                    changed = True
+                else:
+                    kept.append(child)
+            for group, inside in grown.items():
+                setChildren(group, inside)
+            if changed:
+                setChildren(element, kept)
+
+    def unwrapped(self, node):
+        """What to put in place of node, if it's a group which can go"""
+        if node.nodeType != node.ELEMENT_NODE or node.tagName != "g":
+            return None
+        attrs, style = self.attributes(node)
+        if attrs:
+            return None
+        inside = [child for child in node.childNodes if not isIgnorable(child)]
+        if not style:
+            # a group which does nothing
+            return inside
+        if len(inside) == 1 and inside[0].nodeType == node.ELEMENT_NODE and \
+                not [name for name in style if name not in INHERITED]:
+            # the group's style can go on its only child
+            only = inside[0]
+            merged = OrderedDict(style)
+            for name, value in self.styles.get(only, {}).items():
+                merged.pop(name, None)
+                merged[name] = value
+            self.styles[only] = merged
+            del self.styles[node]
+            return inside
+        return None
+
+    def mergeable(self, previous, node):
+        """Can node's children join those of the group before it.
+           Only groups with just a style - layers (class="layer") stay apart."""
+        if not previous or previous.nodeType != node.ELEMENT_NODE or \
+                node.nodeType != node.ELEMENT_NODE:
+            return False
+        if previous.tagName != "g" or node.tagName != "g":
+            return False
+        attrs, style = self.attributes(node)
+        return not attrs and (attrs, style) == self.attributes(previous)
+
+    def writeStyles(self):
+        for element in elementsBelow(self.root):
+            style = self.styles.get(element)
+            if style:
+                element.setAttribute("style", formatStyle(style))
+            elif element.hasAttribute("style"):
+                element.removeAttribute("style")
+
+
+def optimiseSvg(document):
+    """Optimise a drawn svg Document in place"""
+    SvgOptimiser(document.documentElement).run()
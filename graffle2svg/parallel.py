@@ -0,0 +1,226 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Draw the sheets of one document in parallel worker processes.
+
+The decoded document is handed to each worker once, when the pool
+starts (with fork it is simply inherited), and each task only names a
+sheet number, so nothing large is pickled per task. Every sheet is drawn
+by a fresh GraffleParser, so the output is the same as drawing the
+sheets one after another.
+
+A single big sheet can be split too (renderPartitioned): its top level
+graphics are cut into contiguous runs, keeping groups whole, each drawn
+by a worker into a fragment of svg. The fragments are joined in order
+inside the page (and layers) the parent draws, with the defs they need
+merged.
+"""
+import codecs
+import multiprocessing
+import StringIO
+
+from main import GraffleParser, graffleSheets, graphicIndex, sheetElementIds, writeXML
+from instrument import Instrumentation
+import fileinfo
+
+# stands in for a layer's fragments while the rest of the document is written
+FRAGMENT_MARKER = "graffle2svg-fragments-%d"
+# depth of the graphics within <svg><g> - matches the pretty printed output
+FRAGMENT_INDENT = "\t\t"
+# sheets with fewer top level graphics than this aren't worth splitting
+MIN_PARTITION = 200
+
+# the document being drawn, and the GraffleParser options (layers, draft)
+# to draw it with, in each worker process
+_worker_document = None
+_worker_options = {}
+
+def _initWorker(document, options):
+    global _worker_document, _worker_options
+    _worker_document = document
+    _worker_options = options
+
+def _renderPage(page):
+    return renderPage(_worker_document, page, **_worker_options)
+
+def _renderChunk(task):
+    return renderChunk(_worker_document, _worker_options, *task)
+
+
+def renderPage(document, page, **options):
+    """svg (utf-8) of one sheet, and the Instrumentation of drawing it.
+       options are passed on to the GraffleParser."""
+    stats = Instrumentation()
+    gp = GraffleParser(stats = stats, **options)
+    gp.renderSheet(document, graffleSheets(document)[page])
+    with stats.timer("requirements"):
+        gp.svg_add_requirements()
+    gp.svgOptimise()
+    out = StringIO.StringIO()
+    gp.writeSvg(out)
+    return out.getvalue(), stats
+
+
+def renderSheets(document, pages = None, processes = None, stats = None, **options):
+    """Draw the given pages (default: all) of a decoded document,
+       returning their svg in the same order. processes defaults to the
+       number of CPUs; 1 draws them in this process. options (layers,
+       draft) are passed on to the GraffleParser."""
+    if pages is None:
+        pages = range(len(graffleSheets(document)))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(pages))
+
+    if processes <= 1:
+        results = [renderPage(document, page, **options) for page in pages]
+    else:
+        pool = multiprocessing.Pool(processes, _initWorker, (document, options))
+        try:
+            results = pool.map(_renderPage, pages, chunksize = 1)
+        finally:
+            pool.close()
+            pool.join()
+
+    if stats is not None:
+        for svg, page_stats in results:
+            stats.merge(page_stats)
+    return [svg for (svg, page_stats) in results]
+
+
+def fragmentIndent(layer):
+    if layer is None:
+        return FRAGMENT_INDENT
+    return FRAGMENT_INDENT + "\t"
+
+
+def renderChunk(document, options, page, layer_no, start, stop, font):
+    """Draw graphics[start:stop] of the sheet's layer_no'th layer to be
+       drawn, as it would be drawn after the graphics before it (which
+       leave font as the current font). Returns the fragment of pretty
+       printed svg, the <defs> it needs and the Instrumentation of
+       drawing it."""
+    sheet = graffleSheets(document)[page]
+    stats = Instrumentation()
+    gp = GraffleParser(stats = stats, **options)
+    gp.fileinfo = fileinfo.FileInfo(document)
+    gp.imagelist = document.get("ImageList", [])
+    gp.svg_current_font = font
+    gp.graphic_index = graphicIndex(sheet)
+    if gp.stable_ids:
+        gp.element_ids = sheetElementIds(document, sheet)
+    layer, graphics = gp.layers.sheetLayers(sheet)[layer_no]
+    with stats.timer("render"):
+        gp.svgItterateGraffleGraphics(graphics[start:stop])
+    out = StringIO.StringIO()
+    writer = codecs.getwriter("utf-8")(out)
+    indent = fragmentIndent(layer)
+    with stats.timer("serialise"):
+        for node in gp.svg_current_layer.childNodes:
+            writeXML(node, writer, indent, "\t", "\n")
+    return out.getvalue(), gp.required_defs, stats
+
+
+def graphicWeight(graphic):
+    """Roughly how much work drawing a graphic is - one per graphic inside it"""
+    weight = 0
+    stack = [graphic]
+    while stack:
+        g = stack.pop()
+        weight += 1
+        if g.get("Graphics") is not None:
+            stack.extend(g["Graphics"])
+    return weight
+
+
+def partition(graphics, count):
+    """Split a GraphicsList into at most count contiguous (start, stop)
+       ranges of about the same weight - groups are never split"""
+    weights = [graphicWeight(g) for g in graphics]
+    target = float(sum(weights)) / max(count, 1)
+    ranges = []
+    start = 0
+    total = 0.
+    for i, w in enumerate(weights):
+        total += w
+        if total >= target * (len(ranges) + 1) and len(ranges) < count - 1:
+            ranges.append((start, i + 1))
+            start = i + 1
+    if start < len(graphics):
+        ranges.append((start, len(graphics)))
+    return ranges
+
+
+def renderPartitioned(document, page = 0, processes = None, chunks = None, stats = None,
+                      **options):
+    """Draw one sheet, splitting its graphics between worker processes.
+       Returns the svg (utf-8), identical to drawing it in one go (except
+       that with merge_paths, paths either side of a split aren't joined)."""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    sheet = graffleSheets(document)[page]
+    # the fragments are joined as text, too late to optimise
+    if processes <= 1 or len(sheet["GraphicsList"]) < MIN_PARTITION or \
+            options.get("optimise"):
+        svg, page_stats = renderPage(document, page, **options)
+        if stats is not None:
+            stats.merge(page_stats)
+        return svg
+    if chunks is None:
+        chunks = processes * 4
+
+    # the background, the layers, and the font each chunk starts with,
+    # come from here
+    gp = GraffleParser(stats = stats, **options)
+    gp.fileinfo = fileinfo.FileInfo(document)
+    gp.imagelist = document.get("ImageList", [])
+    if gp.stable_ids:
+        gp.element_ids = sheetElementIds(document, sheet)
+    with gp.stats.timer("render"):
+        gp.extractBackground(sheet)
+    sheet_layers = gp.layers.sheetLayers(sheet)
+    total = sum(len(graphics) for layer, graphics in sheet_layers)
+    tasks = []
+    markers = []
+    for layer_no, (layer, graphics) in enumerate(sheet_layers):
+        parent = gp.svg_current_layer
+        if layer is not None:
+            parent = gp.svgAddLayer(layer)
+        ranges = partition(graphics, max(1, chunks * len(graphics) // max(total, 1)))
+        for start, stop in ranges:
+            tasks.append((page, layer_no, start, stop, gp.svg_current_font))
+            gp.svgSkipGraffleGraphics(graphics[start:stop])
+        markers.append((parent, FRAGMENT_MARKER % layer_no, fragmentIndent(layer)))
+
+    pool = multiprocessing.Pool(processes, _initWorker, (document, options))
+    try:
+        results = pool.map(_renderChunk, tasks, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+
+    fragments = [[] for marker in markers]
+    for task, (fragment, required_defs, chunk_stats) in zip(tasks, results):
+        fragments[task[1]].append(fragment)
+        gp.required_defs.update(required_defs)
+        gp.stats.merge(chunk_stats)
+    fragments = ["".join(layer_fragments) for layer_fragments in fragments]
+    for (parent, marker, indent), layer_fragments in zip(markers, fragments):
+        if layer_fragments:
+            parent.appendChild(gp.svg_dom.createComment(marker))
+    with gp.stats.timer("requirements"):
+        gp.svg_add_requirements()
+    out = StringIO.StringIO()
+    gp.writeSvg(out)
+    svg = out.getvalue()
+    for (parent, marker, indent), layer_fragments in zip(markers, fragments):
+        svg = svg.replace("%s<!--%s-->\n" % (indent, marker), layer_fragments, 1)
+    return svg
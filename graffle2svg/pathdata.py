@@ -0,0 +1,152 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Compact svg path data.
+
+Paths are given as a list of commands with absolute coordinates:
+
+    [("M", (x, y)), ("L", (x, y)), ("C", (x1, y1), (x2, y2), (x, y)), ("Z",)]
+
+and written with whichever of the absolute, relative, H and V forms is
+shortest, rounded to a number of decimal places, without repeating
+command letters or separators that aren't needed.
+"""
+
+DEFAULT_PRECISION = 3
+
+
+def checkPrecision(precision):
+    """Refuse a number of decimal places that can't be written"""
+    if precision < 0:
+        raise ValueError("precision must be 0 or more, not %r" % (precision,))
+
+
+def formatUnits(n, precision):
+    """n (an int, in units of 10**-precision) as the shortest decimal"""
+    checkPrecision(precision)
+    sign = ""
+    if n < 0:
+        sign = "-"
+        n = -n
+    if precision == 0:
+        return sign + str(n)
+    whole, frac = divmod(n, 10 ** precision)
+    frac = ("%0*d" % (precision, frac)).rstrip("0")
+    if not frac:
+        return sign + str(whole)
+    if whole:
+        return "%s%d.%s" % (sign, whole, frac)
+    return "%s.%s" % (sign, frac)
+
+
+class PathWriter(object):
+    """Joins commands and numbers, leaving out what the grammar allows"""
+    def __init__(self):
+        self.parts = []
+        self.letter = None
+        self.last_number = None
+
+    def needsLetter(self, letter, numbers):
+        implicit = {"M": "L", "m": "l"}.get(self.letter, self.letter)
+        return letter != implicit or letter in "Mm" or not numbers
+
+    def needsSeparator(self, last_number, number):
+        return last_number is not None and not (
+            number[0] == "-" or (number[0] == "." and "." in last_number))
+
+    def cost(self, letter, numbers):
+        """How many characters command() would write"""
+        last_number = self.last_number
+        length = 0
+        if self.needsLetter(letter, numbers):
+            length += 1
+            last_number = None
+        for number in numbers:
+            if self.needsSeparator(last_number, number):
+                length += 1
+            length += len(number)
+            last_number = number
+        return length
+
+    def command(self, letter, numbers):
+        if self.needsLetter(letter, numbers):
+            self.parts.append(letter)
+            self.last_number = None
+        for number in numbers:
+            if self.needsSeparator(self.last_number, number):
+                self.parts.append(" ")
+            self.parts.append(number)
+            self.last_number = number
+        self.letter = letter
+
+    def data(self):
+        return "".join(self.parts)
+
+
+def encodePath(commands, precision = DEFAULT_PRECISION):
+    """The d attribute for a list of path commands"""
+    checkPrecision(precision)
+    scale = 10 ** precision
+    writer = PathWriter()
+    current = start = None
+    dropped = False
+    fmt = lambda n: formatUnits(n, precision)
+
+    for command in commands:
+        op = command[0]
+        if op == "Z":
+            writer.command("z", [])
+            current = start
+            continue
+        pts = [(int(round(x * scale)), int(round(y * scale))) for (x, y) in command[1:]]
+        end = pts[-1]
+        if op == "C" and pts[0] == current and pts[1] == end:
+            # a straight line written as a curve
+            op = "L"
+        if op == "M":
+            options = [("M", [end[0], end[1]])]
+            if current is not None:
+                options.append(("m", [end[0] - current[0], end[1] - current[1]]))
+            start = end
+        elif op == "L":
+            if end == current:
+                dropped = True
+                continue
+            dx, dy = end[0] - current[0], end[1] - current[1]
+            if dy == 0:
+                options = [("H", [end[0]]), ("h", [dx])]
+            elif dx == 0:
+                options = [("V", [end[1]]), ("v", [dy])]
+            else:
+                options = [("L", [end[0], end[1]]), ("l", [dx, dy])]
+        elif op == "C":
+            absolute = []
+            relative = []
+            for x, y in pts:
+                absolute.extend([x, y])
+                relative.extend([x - current[0], y - current[1]])
+            options = [("C", absolute), ("c", relative)]
+        else:
+            raise ValueError("unknown path command %r" % (op,))
+
+        best = None
+        for letter, numbers in options:
+            numbers = [fmt(n) for n in numbers]
+            cost = writer.cost(letter, numbers)
+            if best is None or cost < best[0]:
+                best = (cost, letter, numbers)
+        writer.command(best[1], best[2])
+        current = end
+
+    if dropped and writer.letter in ("M", "m"):
+        # the path was a single point - keep it as one, as before
+        writer.command("l", ["0", "0"])
+    return writer.data()
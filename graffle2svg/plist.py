@@ -0,0 +1,254 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Decode a graffle plist straight from the xml, without building a DOM.
+
+Gives the same python structure as GraffleParser.ReturnGraffleDict:
+dicts, lists, True/False and the text of <string>, <real>, <integer>.
+"""
+import xml.dom
+import xml.parsers.expat
+import StringIO
+
+TEXT_ELEMENTS = ("key", "string", "real", "integer", "date")
+CHUNK_SIZE = 64 * 1024
+# how many elements to decode between calls to the progress callback
+PROGRESS_INTERVAL = 1000
+
+
+def unescape(text):
+    """Replace the &amp;, &lt; and &gt; entities in a string of xml
+       (xml.sax.saxutils.unescape, whose import pulls in urllib)"""
+    if "&" not in text:
+        return text
+    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+class PlistDecoder(object):
+    """Builds the decoded document from expat events.
+
+       Only the containers currently open are kept on the stack, so
+       memory use is the size of the result plus one read chunk.
+    """
+    def __init__(self, progress = None, limits = None):
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.startElement
+        self.parser.EndElementHandler = self.endElement
+        self.parser.CharacterDataHandler = self.characters
+        # entries are [tag, value, pending dict key]
+        self.stack = []
+        self.text = None
+        self.result = None
+        self.elements = 0
+        self.progress = progress
+        # a limits.ResourceLimits to check each element against
+        self.limits = limits
+        if limits is not None:
+            self.parser.StartDoctypeDeclHandler = self.startDoctype
+            self.parser.EntityDeclHandler = self.entityDecl
+
+    def startElement(self, name, attrs):
+        self.elements += 1
+        if self.limits is not None:
+            self.limits.checkElement(self.elements, len(self.stack) + 1)
+        if self.progress is not None and self.elements % PROGRESS_INTERVAL == 0:
+            self.progress(self.elements, len(self.stack))
+        if name == "dict":
+            self.stack.append([name, {}, None])
+        elif name == "array":
+            self.stack.append([name, [], None])
+        elif name in TEXT_ELEMENTS:
+            self.text = []
+            self.stack.append([name, None, None])
+        else:
+            self.stack.append([name, None, None])
+
+    def startDoctype(self, name, system_id, public_id, has_internal_subset):
+        if has_internal_subset:
+            self.limits.refuseEntity("an internal DTD subset")
+
+    def entityDecl(self, name, *args):
+        self.limits.refuseEntity("the entity " + name)
+
+    def characters(self, data):
+        if self.text is not None:
+            self.text.append(data)
+            if self.limits is not None:
+                self.limits.addText(len(data))
+
+    def endElement(self, name):
+        frame = self.stack.pop()
+        if name in ("dict", "array"):
+            value = frame[1]
+        elif name in TEXT_ELEMENTS:
+            value = u"".join(self.text)
+            self.text = None
+        elif name == "true":
+            value = True
+        elif name == "false":
+            value = False
+        elif name == "plist":
+            return
+        else:
+            # matches what the DOM walker gives for elements it doesn't know
+            value = xml.dom.Node.ELEMENT_NODE
+
+        if not self.stack or self.stack[-1][0] == "plist":
+            if name == "dict" or self.result is None:
+                self.result = value
+            return
+        parent = self.stack[-1]
+        if parent[0] == "dict":
+            if name == "key":
+                parent[2] = value
+            else:
+                parent[1][parent[2]] = value
+        elif parent[0] == "array":
+            parent[1].append(value)
+
+    def feed(self, data, final = False):
+        self.parser.Parse(data, final)
+
+    def close(self):
+        self.parser.Parse("", True)
+        return self.result
+
+
+def decodePlist(source, progress = None, limits = None):
+    """Decode a plist from a string or anything with a read() method"""
+    decoder = PlistDecoder(progress, limits)
+    if hasattr(source, "read"):
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            decoder.feed(chunk)
+    else:
+        decoder.feed(source)
+    return decoder.close()
+
+
+class PlistScanner(object):
+    """Steps over the elements of plist xml without parsing them, for
+       reading a few values from a large document.
+
+       Whole values are skipped by finding their closing tags, so the
+       contents of a big GraphicsList cost next to nothing, and only a
+       little of the document is held at once. Values which are wanted
+       are decoded with decodePlist.
+    """
+    def __init__(self, source):
+        if not hasattr(source, "read"):
+            source = StringIO.StringIO(source)
+        self.source = source
+        self.buf = ""
+        self.pos = 0
+        # start of the value being kept, which mustn't be dropped
+        self.mark = None
+        self.eof = False
+
+    def fill(self):
+        """Read more of the document, dropping what's been passed"""
+        if self.eof:
+            raise ValueError("plist ended unexpectedly")
+        keep = self.pos
+        if self.mark is not None:
+            keep = min(keep, self.mark)
+            self.mark -= keep
+        chunk = self.source.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[keep:] + chunk
+        self.pos -= keep
+
+    def find(self, text):
+        """Index in buf of the next text, reading further as needed"""
+        while True:
+            i = self.buf.find(text, self.pos)
+            if i >= 0:
+                return i
+            self.fill()
+
+    def nextTag(self):
+        """The next tag ("dict", "/dict", "true/", ...), moving past it"""
+        start = self.find("<")
+        self.pos = start
+        end = self.find(">")
+        tag = self.buf[start + 1:end].split(None, 1)
+        self.pos = end + 1
+        if not tag:
+            return ""
+        if tag[0][:1] in "?!":
+            # the declaration, doctype or a comment
+            return self.nextTag()
+        if tag[0].endswith("/"):
+            return tag[0]
+        if len(tag) > 1 and tag[1].endswith("/"):
+            return tag[0] + "/"
+        return tag[0]
+
+    def skipValue(self, tag):
+        """Move past the value opened by tag"""
+        if tag.endswith("/"):
+            return
+        close = "</%s>" % tag
+        if tag not in ("dict", "array"):
+            self.pos = self.find(close) + len(close)
+            return
+        opening = "<%s>" % tag
+        depth = 1
+        while depth:
+            end = self.find(close)
+            depth += self.buf.count(opening, self.pos, end) - 1
+            self.pos = end + len(close)
+
+    def readKey(self):
+        """The text of a <key> whose tag has just been read"""
+        end = self.find("</key>")
+        key = unescape(self.buf[self.pos:end])
+        self.pos = end + len("</key>")
+        return key.decode("utf-8")
+
+    def readValue(self):
+        """Decode the next value"""
+        self.mark = self.find("<")
+        self.pos = self.mark
+        self.skipValue(self.nextTag())
+        value = decodePlist(self.buf[self.mark:self.pos])
+        self.mark = None
+        return value
+
+    def dictKeys(self):
+        """Iterate over the keys of the dict whose <dict> has just been
+           read. The caller must readValue or skipNext each key's value
+           before the next key."""
+        while True:
+            tag = self.nextTag()
+            if tag == "key":
+                yield self.readKey()
+            elif tag in ("/dict", "dict/"):
+                return
+            else:
+                raise ValueError("expected a <key> in a dict, not <%s>" % tag)
+
+    def arrayItems(self):
+        """Iterate over the values in the array whose <array> has just
+           been read, giving each one's opening tag, which the caller
+           then reads from or skipValue()s"""
+        while True:
+            tag = self.nextTag()
+            if tag in ("/array", "array/"):
+                return
+            yield tag
+
+    def skipNext(self):
+        self.skipValue(self.nextTag())
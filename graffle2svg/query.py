@@ -0,0 +1,169 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Walk the graphics of a document without drawing anything.
+
+    for info in iter_graphics("diagram.graffle", classes = ["ShapedGraphic"]):
+        print info.id, info.shape, info.bounds, info.text
+
+Linters, link extractors and stencil statistics only want to look at the
+graphics; this decodes the document (streaming, without a DOM) and goes
+through its sheets' GraphicsLists, leaving out all the svg, style and
+RTF styling work of a conversion.
+"""
+from main import graffleSheets, graphicID, parseCoords
+from rtf import rtfPlainText
+from engine import isXMLData, documentXML
+import plist
+import filepack
+
+
+class GraphicInfo(object):
+    """What iter_graphics gives for each graphic.
+
+       graphic - the decoded graphic dict itself
+       sheet   - index of the sheet it's on
+       layer   - name of its layer (None when the sheet has no layers)
+       depth   - 0 for top level graphics, 1 inside a group, ...
+       parent  - ID of the group it's in, or None
+       bounds  - (x, y, width, height), or None for graphics without any
+    """
+    __slots__ = ("graphic", "sheet", "layer", "depth", "parent", "bounds")
+
+    def __init__(self, graphic, sheet, layer, depth, parent, bounds):
+        self.graphic = graphic
+        self.sheet = sheet
+        self.layer = layer
+        self.depth = depth
+        self.parent = parent
+        self.bounds = bounds
+
+    @property
+    def id(self):
+        return graphicID(self.graphic)
+
+    @property
+    def cls(self):
+        return self.graphic.get("Class")
+
+    @property
+    def shape(self):
+        return self.graphic.get("Shape")
+
+    @property
+    def text(self):
+        """The graphic's text without its styling, or None"""
+        text = self.graphic.get("Text")
+        if not isinstance(text, dict) or text.get("Text") is None:
+            return None
+        return rtfPlainText(text["Text"])
+
+    def __repr__(self):
+        return "<GraphicInfo %s %s %r>" % (self.cls, self.id, self.bounds)
+
+
+def ownBounds(graphic):
+    """(x, y, width, height) of a graphic's Bounds or a line's Points"""
+    if graphic.get("Bounds") is not None:
+        # "{{x, y}, {w, h}}"
+        return tuple(float(b) for b in
+                     graphic["Bounds"].replace("{", "").replace("}", "").split(","))
+    if graphic.get("Points"):
+        pts = [parseCoords(p) for p in graphic["Points"]]
+        xs = [p[0] for p in pts]
+        ys = [p[1] for p in pts]
+        return (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+    return None
+
+
+def graphicBounds(graphic):
+    """(x, y, width, height) of a graphic's Bounds, of a line's Points or
+       around a group's graphics"""
+    bounds = ownBounds(graphic)
+    if bounds is not None or not graphic.get("Graphics"):
+        return bounds
+    inside = []
+    stack = list(graphic["Graphics"])
+    while stack:
+        g = stack.pop()
+        bounds = ownBounds(g)
+        if bounds is not None:
+            inside.append(bounds)
+        elif g.get("Graphics"):
+            stack.extend(g["Graphics"])
+    if not inside:
+        return None
+    x = min(b[0] for b in inside)
+    y = min(b[1] for b in inside)
+    return (x, y, max(b[0] + b[2] for b in inside) - x,
+            max(b[1] + b[3] for b in inside) - y)
+
+
+def readDocument(source):
+    """Decode source - a file name, file object, the xml or an already
+       decoded document dict"""
+    if isinstance(source, dict):
+        return source
+    if isinstance(source, basestring):
+        if isXMLData(source):
+            return plist.decodePlist(documentXML(source))
+        gfp = filepack.GraffleFilePack(source)
+        try:
+            return plist.decodePlist(gfp)
+        finally:
+            gfp.close()
+    return plist.decodePlist(source)
+
+
+def sheetLayerName(sheet, graphic):
+    layers = sheet.get("Layers")
+    if not layers:
+        return None
+    try:
+        index = int(graphic.get("Layer", 0))
+    except ValueError:
+        index = 0
+    if not 0 <= index < len(layers):
+        # as layers.LayerFilter does
+        index = 0
+    return layers[index].get("Name")
+
+
+def iter_graphics(source, sheet = None, classes = None, recursive = True):
+    """Yield a GraphicInfo for each graphic of the document, front to back
+       as they are listed.
+
+       sheet     - index of the only sheet to look at (default all)
+       classes   - only graphics of these Classes (groups are still
+                   looked inside)
+       recursive - look inside groups and tables too
+    """
+    document = readDocument(source)
+    sheets = graffleSheets(document)
+    if sheet is None:
+        numbered = enumerate(sheets)
+    else:
+        numbered = [(sheet, sheets[sheet])]
+    if classes is not None:
+        classes = set(classes)
+    for sheet_no, sheet_dict in numbered:
+        for top in sheet_dict.get("GraphicsList", []):
+            layer = sheetLayerName(sheet_dict, top)
+            stack = [(top, 0, None)]
+            while stack:
+                graphic, depth, parent = stack.pop()
+                if classes is None or graphic.get("Class") in classes:
+                    yield GraphicInfo(graphic, sheet_no, layer, depth, parent,
+                                      graphicBounds(graphic))
+                if recursive and graphic.get("Graphics"):
+                    group_id = graphicID(graphic)
+                    for child in reversed(graphic["Graphics"]):
+                        stack.append((child, depth + 1, group_id))
@@ -198,3 +198,122 @@ class ColorTable(object):
 
     def __getitem__(self, key):
         return self.color[key]
+
+
+# groups holding tables and other things which aren't text
+RTF_SKIP_GROUPS = ("fonttbl", "colortbl", "expandedcolortbl", "stylesheet", "info", "*")
+
+def rtfSkipFallback(s, i, count):
+    """The index after the count characters from i standing in for a \\u
+       character - an escape such as \\'e9 counts as one character, and
+       the stand-in ends with its group"""
+    n = len(s)
+    while count > 0 and i < n and s[i] not in "{}":
+        if s[i] == "\\":
+            i += 1
+            if i < n and s[i] == "'":
+                i += 3
+            elif i < n and s[i].isalpha():
+                while i < n and s[i].isalpha():
+                    i += 1
+                if i < n and s[i] == "-":
+                    i += 1
+                while i < n and s[i].isdigit():
+                    i += 1
+                if i < n and s[i] == " ":
+                    i += 1
+            else:
+                i += 1
+        else:
+            i += 1
+        count -= 1
+    return i
+
+def rtfPlainText(s):
+    """Just the text of an RTF string, lines separated by \\n, without
+       working out any of its styling"""
+    out = []
+    # depth of the group being skipped, if any
+    skip_depth = None
+    depth = 0
+    # characters standing in for each \\u character (set by \\uc), kept
+    # for each group
+    uc = 1
+    uc_stack = []
+    # the next group's first control word decides whether it is skipped
+    group_start = False
+    i = 0
+    n = len(s)
+    while i < n:
+        c = s[i]
+        if c == "{":
+            depth += 1
+            group_start = True
+            uc_stack.append(uc)
+            i += 1
+            continue
+        if c == "}":
+            if skip_depth == depth:
+                skip_depth = None
+            depth -= 1
+            if uc_stack:
+                uc = uc_stack.pop()
+            i += 1
+            continue
+        starting = group_start
+        group_start = False
+        if c == "\\":
+            i += 1
+            if i >= n:
+                break
+            c = s[i]
+            if c.isalpha():
+                start = i
+                while i < n and s[i].isalpha():
+                    i += 1
+                word = s[start:i]
+                param_start = i
+                if i < n and s[i] == "-":
+                    i += 1
+                while i < n and s[i].isdigit():
+                    i += 1
+                param = s[param_start:i]
+                if i < n and s[i] == " ":
+                    i += 1
+                if skip_depth is not None:
+                    continue
+                if starting and word in RTF_SKIP_GROUPS:
+                    skip_depth = depth
+                elif word in ("par", "line"):
+                    out.append("\n")
+                elif word == "tab":
+                    out.append("\t")
+                elif word == "uc" and param:
+                    uc = int(param)
+                elif word == "u" and param:
+                    out.append(unichr(int(param) % 65536))
+                    # the plain text stand-in for the character follows
+                    i = rtfSkipFallback(s, i, uc)
+                continue
+            i += 1
+            if skip_depth is not None:
+                if c == "'":
+                    i += 2
+                continue
+            if c == "*" and starting:
+                skip_depth = depth
+            elif c in "\n\r":
+                out.append("\n")
+            elif c == "'":
+                try:
+                    out.append(chr(int(s[i:i + 2], 16)).decode("cp1252"))
+                except (ValueError, UnicodeDecodeError):
+                    pass
+                i += 2
+            elif c in "\\{}":
+                out.append(c)
+            continue
+        i += 1
+        if skip_depth is None and c not in "\r\n":
+            out.append(c)
+    return u"".join(out)
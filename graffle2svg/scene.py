@@ -0,0 +1,390 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""A compact scene graph between decoding a sheet and writing svg.
+
+SceneBuilder draws a decoded sheet as GraffleParser does, but into
+Group, Rect, Ellipse, Path, Image and Text nodes holding numbers and
+handles into the scene's table of styles, rather than into a DOM. An
+emitter then writes the scene out:
+
+    scene = buildScene(document, page = 0)
+    DOMEmitter().document(scene)            # a minidom Document
+    StreamEmitter().write(scene, stream)    # the svg, as utf-8
+    JSONEmitter().write(scene, stream)      # the scene itself
+
+The DOM and stream emitters give the same bytes as GraffleParser. The
+optimise and merge_paths options work on the svg DOM as it is drawn, so
+a scene can't be built with them.
+"""
+import codecs
+import json
+import xml.dom.minidom
+
+from main import GraffleParser, DEF_TEMPLATES, defTemplate, graffleSheets, writeXML, xmlEscape
+from pathdata import encodePath
+
+
+class Group(object):
+    __slots__ = ("id", "style", "cls", "children")
+    tag = "g"
+
+    def __init__(self, style = None, cls = None, id = ""):
+        self.id = id
+        self.style = style
+        self.cls = cls
+        self.children = []
+
+
+class Rect(object):
+    # rx and ry are as given in the document
+    __slots__ = ("id", "x", "y", "width", "height", "rx", "ry", "style")
+    tag = "rect"
+
+    def __init__(self, x, y, width, height, rx, ry, style, id = ""):
+        self.id = id
+        self.x, self.y, self.width, self.height = x, y, width, height
+        self.rx, self.ry = rx, ry
+        self.style = style
+
+
+class Ellipse(object):
+    __slots__ = ("id", "cx", "cy", "rx", "ry", "style")
+    tag = "ellipse"
+
+    def __init__(self, cx, cy, rx, ry, style, id = ""):
+        self.id = id
+        self.cx, self.cy, self.rx, self.ry = cx, cy, rx, ry
+        self.style = style
+
+
+class Path(object):
+    # commands as pathdata.encodePath takes them
+    __slots__ = ("id", "commands", "style")
+    tag = "path"
+
+    def __init__(self, commands, style, id = ""):
+        self.id = id
+        self.commands = commands
+        self.style = style
+
+
+class Image(object):
+    __slots__ = ("id", "x", "y", "width", "height", "href", "style")
+    tag = "image"
+
+    def __init__(self, x, y, width, height, href, style, id = ""):
+        self.id = id
+        self.x, self.y, self.width, self.height = x, y, width, height
+        self.href = href
+        self.style = style
+
+
+class Text(object):
+    __slots__ = ("id", "x", "y", "style", "children")
+    tag = "text"
+
+    def __init__(self, x, y, style, id = ""):
+        self.id = id
+        self.x, self.y = x, y
+        self.style = style
+        self.children = []
+
+
+class TextSpan(object):
+    __slots__ = ("id", "x", "y", "style", "text")
+    tag = "tspan"
+
+    def __init__(self, x, y, style, text, id = ""):
+        self.id = id
+        self.x, self.y = x, y
+        self.style = style
+        self.text = text
+
+
+class Scene(object):
+    """The drawing of one sheet, and what's needed to write it out"""
+    def __init__(self, precision, draft = None):
+        self.precision = precision
+        self.draft = draft
+        self.root = None
+        self.defs = []
+        # every distinct style string once; nodes hold indices into this
+        self.styles = []
+        self.style_handles = {}
+
+    def styleHandle(self, style):
+        if style is None:
+            return None
+        handle = self.style_handles.get(style)
+        if handle is None:
+            handle = len(self.styles)
+            self.styles.append(style)
+            self.style_handles[style] = handle
+        return handle
+
+    def style(self, handle):
+        if handle is None:
+            return None
+        return self.styles[handle]
+
+    def number(self, value):
+        if self.draft is not None:
+            return self.draft.number(value)
+        return str(value)
+
+    def pathData(self, commands):
+        precision = self.precision
+        if self.draft is not None:
+            precision = min(precision, self.draft.precision)
+        return encodePath(commands, precision)
+
+
+class SceneBuilder(GraffleParser):
+    """A GraffleParser drawing into a Scene instead of a DOM"""
+    def __init__(self, **options):
+        for name in ("optimise", "merge_paths"):
+            if options.get(name):
+                raise ValueError("a scene can't be built with %s" % name)
+        # graphics go into the scene, never as cached svg text
+        options["fragment_cache"] = None
+        GraffleParser.__init__(self, **options)
+
+    def reset(self):
+        GraffleParser.reset(self)
+        self.scene = Scene(self.precision, self.draft)
+        self.scene.root = Group(self.scene.styleHandle(str(self.style)))
+        self.svg_current_layer = self.scene.root
+
+    def scopeStyle(self):
+        return self.scene.styleHandle(self.svgScopeStyle())
+
+    def svg_add_requirements(self):
+        self.scene.defs = [name for (name, template) in DEF_TEMPLATES
+                           if name in self.required_defs]
+
+    def svg_addGroup(self, node, style = None, cls = None):
+        group = Group(self.scene.styleHandle(style), cls, self.svgElementId({}))
+        node.children.append(group)
+        return group
+
+    def svg_addRect(self, node, **opts):
+        node.children.append(Rect(float(opts.get("x", 0)), float(opts.get("y", 0)),
+                                  float(opts["width"]), float(opts["height"]),
+                                  opts.get("rx"), opts.get("ry"),
+                                  self.scopeStyle(), self.svgElementId(opts)))
+
+    def svg_addEllipse(self, node, bounds, **opts):
+        node.children.append(Ellipse(bounds[0] + (bounds[2] / 2.), bounds[1] + (bounds[3] / 2.),
+                                     bounds[2] / 2., bounds[3] / 2.,
+                                     self.scopeStyle(), self.svgElementId(opts)))
+
+    def svg_addPathCommands(self, node, commands, **opts):
+        node.children.append(Path(commands, self.scopeStyle(), self.svgElementId(opts)))
+
+    def svg_addImage(self, node, bounds, **opts):
+        x, y, width, height = [float(a) for a in bounds]
+        node.children.append(Image(x, y, width, height, str(opts.get("href", "")),
+                                   self.scopeStyle(), self.svgElementId(opts)))
+
+    def svg_addTextElement(self, node, **opts):
+        style = ";".join([self.svgScopeStyle(), self.svg_current_font])
+        text = Text(float(opts.get("x", 0)), float(opts.get("y", 0)),
+                    self.scene.styleHandle(style), self.svgElementId(opts))
+        node.children.append(text)
+        return text
+
+    def svg_addLine(self, textnode, **opts):
+        y_pos = float(opts.get("y", 0)) + \
+                opts.get("line_height", 12) * (opts.get("y_offset", 0) + 1)
+        style = opts.get("style")
+        if style is not None:
+            style = str(style)
+        textnode.children.append(TextSpan(float(opts.get("x", 0)), y_pos,
+                                          self.scene.styleHandle(style),
+                                          opts.get("text", " "), self.svgElementId(opts)))
+
+
+def buildScene(document, page = 0, **options):
+    """The Scene for one sheet of a decoded document - options are those
+       of GraffleParser"""
+    builder = SceneBuilder(**options)
+    builder.renderSheet(document, graffleSheets(document)[page])
+    builder.svg_add_requirements()
+    return builder.scene
+
+
+def nodeAttributes(scene, node):
+    """The svg attributes of a scene node, as GraffleParser sets them"""
+    tag = node.tag
+    if tag == "g":
+        attrs = []
+        if node.id:
+            attrs.append(("id", node.id))
+        if node.style is not None:
+            attrs.append(("style", scene.style(node.style)))
+        if node.cls is not None:
+            attrs.append(("class", node.cls))
+        return attrs
+    if tag == "path":
+        return [("id", node.id), ("style", scene.style(node.style)),
+                ("d", scene.pathData(node.commands))]
+    if tag == "rect":
+        attrs = [("id", node.id), ("width", scene.number(node.width)),
+                 ("height", scene.number(node.height)),
+                 ("x", scene.number(node.x)), ("y", scene.number(node.y))]
+        if node.rx is not None:
+            attrs.append(("rx", scene.number(node.rx)))
+            attrs.append(("ry", scene.number(node.ry)))
+        attrs.append(("style", scene.style(node.style)))
+        return attrs
+    if tag == "ellipse":
+        return [("id", node.id), ("style", scene.style(node.style)),
+                ("cx", scene.number(node.cx)), ("cy", scene.number(node.cy)),
+                ("rx", scene.number(node.rx)), ("ry", scene.number(node.ry))]
+    if tag == "text":
+        return [("id", node.id), ("x", str(node.x)), ("y", str(node.y)),
+                ("style", scene.style(node.style))]
+    if tag == "tspan":
+        attrs = [("id", node.id), ("x", str(node.x))]
+        if node.style is not None:
+            attrs.append(("style", scene.style(node.style)))
+        attrs.append(("y", str(node.y)))
+        return attrs
+    if tag == "image":
+        attrs = []
+        if node.id:
+            attrs.append(("id", node.id))
+        return attrs + [("x", scene.number(node.x)), ("y", scene.number(node.y)),
+                ("width", scene.number(node.width)),
+                ("height", scene.number(node.height)),
+                ("xlink:href", node.href), ("style", scene.style(node.style))]
+    raise ValueError("unknown scene node %r" % (node,))
+
+
+class DOMEmitter(object):
+    """Builds the minidom Document GraffleParser would have"""
+    def document(self, scene):
+        dom = xml.dom.minidom.Document()
+        dom.doctype = ""
+        svg_tag = dom.createElement("svg")
+        svg_tag.setAttribute("xmlns", "http://www.w3.org/2000/svg")
+        svg_tag.setAttribute("xmlns:xlink", "http://www.w3.org/1999/xlink")
+        dom.appendChild(svg_tag)
+        def_tag = dom.createElement("defs")
+        svg_tag.appendChild(def_tag)
+        for name in scene.defs:
+            for node in defTemplate(name):
+                def_tag.appendChild(dom.importNode(node, True))
+        stack = [(svg_tag, scene.root)]
+        while stack:
+            parent, node = stack.pop()
+            element = dom.createElement(node.tag)
+            for name, value in nodeAttributes(scene, node):
+                element.setAttribute(name, value)
+            parent.appendChild(element)
+            if node.tag == "tspan":
+                element.appendChild(dom.createTextNode(node.text))
+            else:
+                for child in reversed(getattr(node, "children", ())):
+                    stack.append((element, child))
+        return dom
+
+    def write(self, scene, stream):
+        writer = codecs.getwriter("utf-8")(stream)
+        writeXML(self.document(scene), writer, "", "\t", "\n")
+
+
+class StreamEmitter(object):
+    """Writes the svg straight from the scene, without building a DOM"""
+    def write(self, scene, stream):
+        writer = codecs.getwriter("utf-8")(stream)
+        write = writer.write
+        write('<?xml version="1.0" ?>\n')
+        write('<svg xmlns="http://www.w3.org/2000/svg" '
+              'xmlns:xlink="http://www.w3.org/1999/xlink">\n')
+        if scene.defs:
+            write("\t<defs>\n")
+            for name in scene.defs:
+                for node in defTemplate(name):
+                    writeXML(node, writer, "\t\t", "\t", "\n")
+            write("\t</defs>\n")
+        else:
+            write("\t<defs/>\n")
+        # entries are (indent, node) to open, or (indent, tag) to close
+        stack = [("\t", scene.root)]
+        while stack:
+            indent, node = stack.pop()
+            if isinstance(node, basestring):
+                write("%s</%s>\n" % (indent, node))
+                continue
+            attrs = sorted(nodeAttributes(scene, node))
+            write(indent + "<" + node.tag)
+            for name, value in attrs:
+                write(' %s="%s"' % (name, xmlEscape(value)))
+            if node.tag == "tspan":
+                write(">%s</tspan>\n" % xmlEscape(node.text))
+            elif getattr(node, "children", None):
+                write(">\n")
+                stack.append((indent, node.tag))
+                for child in reversed(node.children):
+                    stack.append((indent + "\t", child))
+            else:
+                write("/>\n")
+        write("</svg>\n")
+
+
+def writeJSON(value, write):
+    """Write nested dicts, lists and tuples as json.dumps(value, separators =
+       (",", ":")) would, but without recursion, however deep they go"""
+    # entries are (True, text to write) or (False, value to encode)
+    stack = [(False, value)]
+    while stack:
+        raw, item = stack.pop()
+        if raw:
+            write(item)
+        elif isinstance(item, dict):
+            pieces = [(True, "{")]
+            for i, (key, child) in enumerate(item.items()):
+                pieces.append((True, (i and "," or "") + json.dumps(key) + ":"))
+                pieces.append((False, child))
+            pieces.append((True, "}"))
+            stack.extend(reversed(pieces))
+        elif isinstance(item, (list, tuple)):
+            pieces = [(True, "[")]
+            for i, child in enumerate(item):
+                if i:
+                    pieces.append((True, ","))
+                pieces.append((False, child))
+            pieces.append((True, "]"))
+            stack.extend(reversed(pieces))
+        else:
+            write(json.dumps(item))
+
+
+class JSONEmitter(object):
+    """Writes the scene itself as JSON"""
+    def asDict(self, scene):
+        root = {}
+        stack = [(scene.root, root)]
+        while stack:
+            node, out = stack.pop()
+            out["type"] = node.tag
+            for name in node.__slots__:
+                if name == "children":
+                    out[name] = [{} for child in node.children]
+                    stack.extend(zip(node.children, out[name]))
+                else:
+                    out[name] = getattr(node, name)
+        return {"styles": scene.styles, "defs": scene.defs, "root": root}
+
+    def write(self, scene, stream):
+        writeJSON(self.asDict(scene), stream.write)
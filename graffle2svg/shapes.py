@@ -0,0 +1,122 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Renderers for the Shapes of ShapedGraphics.
+
+A renderer is called as renderer(parser, node, graphic, bounds, **opts)
+and draws the graphic into node; bounds is (x, y, width, height) and
+opts carries HFlip, VFlip and Rotation. Shapes made of straight lines
+are outlines in the unit square, worked out once and scaled into each
+graphic's bounds.
+
+Other shapes can be added without touching the parser:
+
+    from graffle2svg.shapes import registerOutline
+    registerOutline("Pentagon", [(0.5, 0), (1, 0.38), (0.81, 1), (0.19, 1), (0, 0.38)])
+"""
+import math
+
+SHAPE_RENDERERS = {}
+
+
+def registerShape(name, renderer):
+    """Draw graphics with this Shape using renderer"""
+    SHAPE_RENDERERS[name] = renderer
+
+
+def shapeRenderer(name):
+    """The renderer for a Shape, or None if nothing can draw it"""
+    return SHAPE_RENDERERS.get(name)
+
+
+class UnitOutline(object):
+    """A path of points in the unit square, (0, 0) top left"""
+    def __init__(self, points, closed = True):
+        self.points = tuple(tuple(float(a) for a in pt) for pt in points)
+        self.closed = closed
+
+    def place(self, bounds):
+        """The points scaled and moved into bounds"""
+        x, y, width, height = bounds
+        return [[x + ux * width, y + uy * height] for ux, uy in self.points]
+
+    def __call__(self, gp, node, graphic, bounds, **opts):
+        gp.svg_addPath(node, self.place(bounds), closepath = self.closed, **opts)
+
+
+def registerOutline(name, points, closed = True):
+    """Draw graphics with this Shape as the given unit square outline"""
+    registerShape(name, UnitOutline(points, closed))
+
+
+def cloudOutline(lobes = 9, steps = 8):
+    """A scalloped ellipse filling the unit square"""
+    points = []
+    for lobe in range(lobes):
+        for step in range(steps):
+            t = (lobe + step / float(steps)) * 2 * math.pi / lobes
+            # each lobe bulges out between the dips at its ends
+            r = 0.4 + 0.1 * math.sin(math.pi * step / float(steps))
+            points.append((math.cos(t) * r, math.sin(t) * r))
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    xmin, ymin = min(xs), min(ys)
+    xsize, ysize = max(xs) - xmin, max(ys) - ymin
+    return [((px - xmin) / xsize, (py - ymin) / ysize) for px, py in points]
+
+
+def drawRectangle(gp, node, graphic, bounds, **opts):
+    if graphic.get("ImageID") is not None:
+        gp.svgAddGraffleImage(node, graphic, bounds)
+        return
+    # radius of corners is stored on the style in graffle
+    radius = graphic.get("Style", {}).get("stroke", {}).get("CornerRadius", None)
+    x, y, width, height = bounds
+    gp.svg_addRect(node, x = x, y = y, width = width, height = height,
+                   rx = radius, ry = radius, **opts)
+
+
+def drawEllipse(gp, node, graphic, bounds, **opts):
+    # a "Circle" can be an ellipse
+    gp.svg_addEllipse(node, bounds = bounds, **opts)
+
+
+def drawBezier(gp, node, graphic, bounds, **opts):
+    gp.svg_addBezier(node, bounds, graphic["ShapeData"], **opts)
+
+
+def drawAdjustableArrow(gp, node, graphic, bounds, **opts):
+    # the shape depends on the graphic's ShapeData, so isn't a fixed outline
+    gp.svg_addAdjustableArrow(node, bounds = bounds, graphic = graphic, **opts)
+
+
+SUBPROCESS_SIDES = (UnitOutline([(0.1, 0), (0.1, 1)], closed = False),
+                    UnitOutline([(0.9, 0), (0.9, 1)], closed = False))
+
+def drawSubprocess(gp, node, graphic, bounds, **opts):
+    # TODO: check ISO flowchart specification for correct ratio?
+    x, y, width, height = bounds
+    gp.svg_addRect(node, x = x, y = y, width = width, height = height, **opts)
+    for side in SUBPROCESS_SIDES:
+        side(gp, node, graphic, bounds, **opts)
+
+
+registerShape("Rectangle", drawRectangle)
+registerShape("RoundRect", drawRectangle)
+registerShape("Circle", drawEllipse)
+registerShape("Bezier", drawBezier)
+registerShape("AdjustableArrow", drawAdjustableArrow)
+registerShape("Subprocess", drawSubprocess)
+registerOutline("Diamond", [(0.5, 0), (1, 0.5), (0.5, 1), (0, 0.5)])
+registerOutline("HorizontalTriangle", [(0, 0), (1, 0.5), (0, 1)])
+registerOutline("RightTriangle", [(0, 0), (1, 1), (0, 1)])
+registerOutline("VerticalTriangle", [(0, 0), (1, 0), (0.5, 1)])
+registerOutline("Cloud", cloudOutline())
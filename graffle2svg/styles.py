@@ -33,8 +33,9 @@ class CascadingStyles(object):
         self.scopes[-1][k] = v
         
     def __str__(self):
+        # sorted, so the same styles always give the same text
         style = self.currentStyle()
-        return ";".join(["%s:%s"%(k,v) for (k,v) in style.items()])
+        return ";".join(["%s:%s"%(k,v) for (k,v) in sorted(style.items())])
         
     def currentStyle(self):
         """return all styles applied at this point"""
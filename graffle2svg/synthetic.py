@@ -0,0 +1,237 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Generate synthetic graffle documents for benchmarks and tests.
+
+The same arguments (including seed) always produce the same document.
+"""
+import gzip
+import random
+import StringIO
+from xml.sax.saxutils import escape
+
+SHAPES = ["Rectangle", "RoundRect", "Circle", "Diamond", "HorizontalTriangle",
+          "RightTriangle", "VerticalTriangle", "Subprocess"]
+WORDS = ["server", "client", "queue", "cache", "database", "router", "proxy",
+         "worker", "storage", "gateway", "index", "backup", "monitor"]
+# how many leaf graphics go in each innermost group
+GROUP_SIZE = 5
+
+RTF_TEMPLATE = r"""{\rtf1\ansi\ansicpg1252\cocoartf949
+{\fonttbl\f0\fswiss\fcharset0 Helvetica;}
+{\colortbl;\red255\green255\blue255;\red40\green40\blue160;}
+\pard\tx560\tx1120\qc\pardirnatural
+
+\f0\fs24 \cf2 %s}"""
+
+
+def plistValue(value, out):
+    """Write value as Apple plist xml"""
+    if isinstance(value, bool):
+        out.append(value and "<true/>" or "<false/>")
+    elif isinstance(value, dict):
+        out.append("<dict>")
+        for k in sorted(value.keys()):
+            out.append("<key>%s</key>" % escape(k))
+            plistValue(value[k], out)
+        out.append("</dict>\n")
+    elif isinstance(value, (list, tuple)):
+        out.append("<array>")
+        for v in value:
+            plistValue(v, out)
+        out.append("</array>\n")
+    elif isinstance(value, int):
+        out.append("<integer>%d</integer>" % value)
+    elif isinstance(value, float):
+        out.append("<real>%s</real>" % repr(value))
+    else:
+        out.append("<string>%s</string>" % escape(value))
+
+
+def plistDocument(value):
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+           '<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" '
+           '"http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n',
+           '<plist version="1.0">\n']
+    plistValue(value, out)
+    out.append("</plist>\n")
+    return "".join(out)
+
+
+def nestedGroups(depth):
+    """The xml of a document whose one shape is inside depth nested groups"""
+    inner = "<dict><key>Class</key><string>ShapedGraphic</string>" \
+            "<key>Shape</key><string>Circle</string><key>ID</key><integer>1</integer>" \
+            "<key>Bounds</key><string>{{0, 0}, {10, 10}}</string></dict>"
+    for i in range(depth):
+        inner = "<dict><key>Class</key><string>Group</string><key>Graphics</key>" \
+                "<array>%s</array></dict>" % inner
+    return "<plist><dict><key>GraphDocumentVersion</key><integer>5</integer>" \
+           "<key>GraphicsList</key><array>%s</array></dict></plist>" % inner
+
+
+def network(nodes, lines, seed = 1):
+    """The xml of a network diagram: a grid of nodes drawn alike, then
+       lines (without arrow heads) between random pairs of them"""
+    rnd = random.Random(seed)
+    columns = int(nodes ** 0.5) + 1
+    graphics = []
+    for i in range(nodes):
+        x, y = (i % columns) * 100, (i // columns) * 60
+        graphics.append({"Class": "ShapedGraphic", "ID": i + 3, "Shape": "Rectangle",
+                         "Bounds": "{{%d, %d}, {60, 30}}" % (x, y),
+                         "Style": {"fill": {"Color": {"r": "0.8", "g": "0.9", "b": "1"}},
+                                   "shadow": {"Draws": "NO"}}})
+    shapes = list(graphics)
+    for i in range(lines):
+        tail, head = rnd.sample(shapes, 2)
+        points = ["{%d, %d}" % (int(g["Bounds"][2:].split(",")[0]) + 30,
+                                int(g["Bounds"].split(",")[1].strip(" }")) + 15)
+                  for g in (tail, head)]
+        graphics.append({"Class": "LineGraphic", "ID": nodes + i + 3, "Points": points,
+                         "Tail": {"ID": tail["ID"]}, "Head": {"ID": head["ID"]},
+                         "Style": {"shadow": {"Draws": "NO"}}})
+    # the lines are drawn under the nodes
+    graphics.reverse()
+    return plistDocument({"GraphDocumentVersion": 5, "GraphicsList": graphics})
+
+
+class SyntheticGraffle(object):
+    """Builds a decoded graffle document with a controllable shape"""
+    def __init__(self, shapes = 100, depth = 0, text_density = 0.3, sheets = 1,
+                 images = 0, line_ratio = 0.2, seed = 1, layers = 1):
+        self.shapes = shapes
+        self.depth = depth
+        self.text_density = text_density
+        self.sheets = sheets
+        self.images = images
+        self.line_ratio = line_ratio
+        self.seed = seed
+        # the second layer is hidden, the third not printed
+        self.layers = layers
+
+    def colour(self, rnd):
+        return {"r": "%.3f" % rnd.random(), "g": "%.3f" % rnd.random(),
+                "b": "%.3f" % rnd.random()}
+
+    def text(self, rnd):
+        words = [rnd.choice(WORDS) for i in range(rnd.randint(1, 6))]
+        half = len(words) // 2
+        return RTF_TEMPLATE % ("%s\\\n%s" % (" ".join(words[:half]), " ".join(words[half:])))
+
+    def shape(self, rnd, gid, image_id = None):
+        x, y = rnd.randint(0, 2000), rnd.randint(0, 2000)
+        w, h = rnd.randint(20, 200), rnd.randint(20, 120)
+        graphic = {"Class": "ShapedGraphic", "ID": gid,
+                   "Bounds": "{{%d, %d}, {%d, %d}}" % (x, y, w, h),
+                   "Shape": rnd.choice(SHAPES)}
+        style = {"fill": {"Color": self.colour(rnd)},
+                 "shadow": {"Draws": rnd.random() < 0.3 and "YES" or "NO"}}
+        if rnd.random() < 0.2:
+            style["stroke"] = {"CornerRadius": "5", "Width": "2"}
+        graphic["Style"] = style
+        if image_id is not None:
+            graphic["Shape"] = "Rectangle"
+            graphic["ImageID"] = image_id
+        elif rnd.random() < self.text_density:
+            graphic["Text"] = {"Text": self.text(rnd), "Pad": "2"}
+            graphic["FontInfo"] = {"Font": "Helvetica", "Size": "12",
+                                   "Color": {"w": "0"}}
+        return graphic
+
+    def line(self, rnd, gid, tail, head):
+        def centre(g):
+            x, y, w, h = [float(a) for a in g["Bounds"].replace("{", "").replace("}", "").split(",")]
+            return "{%g, %g}" % (x + w / 2, y + h / 2)
+        return {"Class": "LineGraphic", "ID": gid,
+                "Points": [centre(tail), centre(head)],
+                "Tail": {"ID": tail["ID"]}, "Head": {"ID": head["ID"]},
+                "Style": {"stroke": {"HeadArrow": rnd.choice(["FilledArrow", "0", "Bar"]),
+                                     "TailArrow": rnd.choice(["0", "0", "CrowBall"]),
+                                     "Pattern": rnd.choice([0, 0, 1, 2])}}}
+
+    def graphicsList(self, rnd, sheet_no):
+        leaves = []
+        shapes = []
+        gid = 3
+        image_ids = range(self.images)
+        for i in range(self.shapes):
+            gid += 1
+            if len(shapes) > 1 and rnd.random() < self.line_ratio:
+                tail, head = rnd.sample(shapes[-20:], 2)
+                leaves.append(self.line(rnd, gid, tail, head))
+            else:
+                image_id = None
+                if image_ids and sheet_no == 0:
+                    image_id = image_ids.pop(0)
+                graphic = self.shape(rnd, gid, image_id)
+                shapes.append(graphic)
+                leaves.append(graphic)
+
+        graphics = leaves
+        for level in range(self.depth):
+            grouped = []
+            for i in range(0, len(graphics), GROUP_SIZE):
+                gid += 1
+                grouped.append({"Class": "Group", "ID": gid,
+                                "Graphics": graphics[i:i + GROUP_SIZE]})
+            graphics = grouped
+        for i, g in enumerate(graphics):
+            g["Layer"] = i % self.layers
+        return graphics
+
+    def layerList(self):
+        layers = []
+        for i in range(self.layers):
+            layers.append({"Name": "Layer %d" % (i + 1),
+                           "View": i == 1 and "NO" or "YES",
+                           "Print": i == 2 and "NO" or "YES", "Lock": "NO"})
+        return layers
+
+    def document(self):
+        """The decoded document, as GraffleParser.decodeGraffle returns it"""
+        rnd = random.Random(self.seed)
+        sheets = []
+        for sheet_no in range(self.sheets):
+            sheets.append({
+                "SheetTitle": "Canvas %d" % (sheet_no + 1),
+                "BackgroundGraphic": {"Bounds": "{{0, 0}, {2300, 2200}}",
+                                      "Class": "SolidGraphic", "ID": 2,
+                                      "Style": {"shadow": {"Draws": "NO"},
+                                                "stroke": {"Draws": "NO"}}},
+                "Layers": self.layerList(),
+                "GraphicsList": self.graphicsList(rnd, sheet_no)})
+        return {"Creator": "graffle2svg synthetic",
+                "GraphDocumentVersion": 6,
+                "ModificationDate": "2009-01-01 00:00:00 +0000",
+                "ImageList": ["image%d.png" % i for i in range(self.images)],
+                "PrintInfo": {"NSPaperSize": ["size", "{612, 792}"]},
+                "Sheets": sheets}
+
+    def xml(self):
+        return plistDocument(self.document())
+
+    def gzipped(self):
+        """The document as OmniGraffle's compressed file format"""
+        buf = StringIO.StringIO()
+        f = gzip.GzipFile(fileobj=buf, mode="wb", mtime=0)
+        f.write(self.xml())
+        f.close()
+        return buf.getvalue()
+
+    def shapeCount(self):
+        """Number of graphics drawn (leaves and groups, all sheets)"""
+        groups = 0
+        n = self.shapes
+        for level in range(self.depth):
+            n = (n + GROUP_SIZE - 1) // GROUP_SIZE
+            groups += n
+        return (self.shapes + groups + 1) * self.sheets
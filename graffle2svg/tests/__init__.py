@@ -7,10 +7,27 @@ class TestMe(TestCase):
         pass
 
 def get_tests():
-    import testCascadingStyles, testRTF, testGeom, testMain
+    import testCascadingStyles, testRTF, testGeom, testMain, testWatch, testGolden, testPlist, testEngine, testParallel, testLayers, testDraft, testShapes, testPathData, testFragments, testScene, testQuery, testTextIndex, testLimits, testOptimise, testBatch, testStartup
     TS = TestSuite()
     TS.addTest(testCascadingStyles.get_tests())
     TS.addTest(testRTF.get_tests())
     TS.addTest(testGeom.get_tests())
     TS.addTest(testMain.get_tests())
+    TS.addTest(testWatch.get_tests())
+    TS.addTest(testGolden.get_tests())
+    TS.addTest(testPlist.get_tests())
+    TS.addTest(testEngine.get_tests())
+    TS.addTest(testParallel.get_tests())
+    TS.addTest(testLayers.get_tests())
+    TS.addTest(testDraft.get_tests())
+    TS.addTest(testShapes.get_tests())
+    TS.addTest(testPathData.get_tests())
+    TS.addTest(testFragments.get_tests())
+    TS.addTest(testScene.get_tests())
+    TS.addTest(testQuery.get_tests())
+    TS.addTest(testTextIndex.get_tests())
+    TS.addTest(testLimits.get_tests())
+    TS.addTest(testOptimise.get_tests())
+    TS.addTest(testBatch.get_tests())
+    TS.addTest(testStartup.get_tests())
     return TS
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+import os
+import shutil
+import tempfile
+import time
+
+import batch
+from synthetic import SyntheticGraffle
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, "src")
+        os.makedirs(os.path.join(self.src, "sub"))
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(i % 2 and "sub" or "", "d%d.graffle" % i)
+            f = open(os.path.join(self.src, path), "w")
+            f.write(SyntheticGraffle(shapes=10, sheets=1 + i % 2, seed=i).xml())
+            f.close()
+            self.paths.append(path)
+        self.paths.sort()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def dest(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def testShardOf(self):
+        self.assertEqual(batch.shardOf("a/b.graffle", 4), batch.shardOf("a/b.graffle", 4))
+        self.assertTrue(1 <= batch.shardOf("a/b.graffle", 4) <= 4)
+        self.assertEqual(batch.parseShard("2/4"), (2, 4))
+        self.assertRaises(ValueError, batch.parseShard, "0/4")
+        self.assertRaises(ValueError, batch.parseShard, "2")
+
+    def testShards(self):
+        whole = batch.runShard(self.src, self.dest("whole"), processes = 1)
+        self.assertEqual([f["path"] for f in whole["files"]], self.paths)
+        self.assertEqual((whole["converted"], whole["failed"]), (6, 0))
+        parts = [batch.runShard(self.src, self.dest("parts"), shard = (i, 3), processes = 1)
+                 for i in (1, 2, 3)]
+        merged = batch.mergeReports(parts)
+        self.assertEqual([f["path"] for f in merged["files"]], self.paths)
+        self.assertEqual(merged["bytes"], whole["bytes"])
+        self.assertEqual(sorted(os.listdir(self.dest("parts/sub"))),
+                         ["d1-0.svg", "d1-1.svg", "d3-0.svg", "d3-1.svg", "d5-0.svg", "d5-1.svg"])
+
+    def testErrors(self):
+        f = open(os.path.join(self.src, "broken.graffle"), "w")
+        f.write("not a graffle file")
+        f.close()
+        report = batch.runShard(self.src, self.dest("out"), processes = 1)
+        self.assertEqual((report["converted"], report["failed"]), (6, 1))
+        self.assertTrue(report["files"][0]["error"])
+
+    def testClaim(self):
+        spool = batch.Spool(self.dest("spool"))
+        self.assertEqual(spool.fill(self.src, self.paths), 6)
+        self.assertEqual(spool.fill(self.src, self.paths), 0)
+        job, path = spool.claim()
+        self.assertTrue(path in self.paths)
+        other = batch.Spool(self.dest("spool"))
+        claimed = [other.claim() for i in range(5)]
+        self.assertFalse(path in [p for (j, p) in claimed])
+        self.assertEqual(other.claim(), None)
+        spool.finish(job, {"path": path, "error": None, "bytes": 0, "seconds": 0})
+        self.assertEqual(spool.fill(self.src, self.paths), 0)
+        self.assertEqual(spool.report()["converted"], 1)
+
+    def testExpiredLease(self):
+        spool = batch.Spool(self.dest("spool"), lease = 60)
+        spool.fill(self.src, self.paths[:1])
+        job, path = spool.claim()
+        # the worker holding it has crashed
+        self.assertEqual(spool.requeueExpired(), 0)
+        self.assertTrue(abs(spool.now() - time.time()) < 5)
+        self.assertEqual(spool.requeueExpired(time.time() + 120), 1)
+        self.assertEqual(spool.claim(), (job, path))
+
+    def testSpool(self):
+        spool_dir = self.dest("spool")
+        batch.Spool(spool_dir).fill(self.src, self.paths[:2])
+        mine = batch.runSpool(spool_dir, self.src, self.dest("out"), processes = 1, poll = 0.01)
+        everyone = batch.Spool(spool_dir).report()
+        self.assertEqual(everyone["converted"], 6)
+        self.assertEqual(mine["files"], everyone["files"])
+        self.assertEqual(os.listdir(os.path.join(spool_dir, "claimed")), [])
+
+    def testReusedSpool(self):
+        spool_dir = self.dest("spool")
+        batch.runSpool(spool_dir, self.src, self.dest("out"), processes = 1, poll = 0.01)
+        # only the file changed since is converted again
+        changed = os.path.join(self.src, self.paths[0])
+        f = open(changed, "w")
+        f.write(SyntheticGraffle(shapes=12, seed=99).xml())
+        f.close()
+        # touching a file doesn't change its job
+        os.utime(os.path.join(self.src, self.paths[2]), (time.time() + 10, time.time() + 10))
+        second = batch.runSpool(spool_dir, self.src, self.dest("out"), processes = 1, poll = 0.01)
+        self.assertEqual([r["path"] for r in second["files"]], [self.paths[0]])
+        everyone = batch.Spool(spool_dir).report(self.src)
+        self.assertEqual(everyone["converted"], 6)
+        self.assertEqual(len(os.listdir(os.path.join(spool_dir, "done"))), 6)
+        # a file which has gone isn't reported
+        os.remove(os.path.join(self.src, self.paths[1]))
+        self.assertEqual(batch.Spool(spool_dir).report(self.src)["converted"], 5)
+
+    def testNonAsciiNames(self):
+        name = u"caf\xe9.graffle".encode("utf-8")
+        f = open(os.path.join(self.src, name), "w")
+        f.write(SyntheticGraffle(shapes=10, seed=7).xml())
+        f.close()
+        self.assertEqual(batch.shardOf(name, 2), batch.shardOf(name.decode("utf-8"), 2))
+        parts = [batch.runShard(self.src, self.dest("shards"), shard = (i, 2), processes = 1)
+                 for i in (1, 2)]
+        self.assertEqual(batch.mergeReports(parts)["converted"], 7)
+        report = batch.runSpool(self.dest("spool"), self.src, self.dest("spooled"),
+                                processes = 1, poll = 0.01)
+        self.assertEqual((report["converted"], report["failed"]), (7, 0))
+        self.assertTrue(os.path.exists(self.dest(os.path.join("spooled", u"caf\xe9.svg".encode("utf-8")))))
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestBatch))
+    return TS
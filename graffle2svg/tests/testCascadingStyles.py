@@ -24,6 +24,16 @@ class TestDefaults(TestCase):
         self.assertEqual(str(self.cs), "")
         
         
+class TestOrder(TestCase):
+    def testSorted(self):
+        cs = CascadingStyles()
+        cs.appendScope()
+        cs["stroke"] = "none"
+        cs["fill"] = "red"
+        cs.appendScope()
+        cs["font-size"] = "12px"
+        self.assertEqual(str(cs), "fill:red;font-size:12px;stroke:none")
+
 class TestScope(TestCase):
     def setUp(self):
         self.cs = CascadingStyles({"font":"arial","font-size":"12pt"})
@@ -38,4 +48,5 @@ def get_tests():
     TS = TestSuite()
     TS.addTest(makeSuite(TestDefaults))
     TS.addTest(makeSuite(TestScope))
+    TS.addTest(makeSuite(TestOrder))
     return TS
@@ -0,0 +1,55 @@
+from unittest import makeSuite, TestCase, TestSuite
+import draft
+from engine import convert
+from instrument import Instrumentation
+from synthetic import SyntheticGraffle
+
+class TestSimplify(TestCase):
+    def testStraight(self):
+        pts = [[0., 0.], [1., 0.1], [2., 0.], [3., -0.1], [4., 0.]]
+        self.assertEqual(draft.simplifyPoints(pts, 0.5), [[0., 0.], [4., 0.]])
+
+    def testCorner(self):
+        pts = [[0., 0.], [5., 0.], [5., 5.]]
+        self.assertEqual(draft.simplifyPoints(pts, 0.5), pts)
+
+    def testShort(self):
+        self.assertEqual(draft.simplifyPoints([[0., 0.], [1., 1.]], 5), [[0., 0.], [1., 1.]])
+
+class TestSettings(TestCase):
+    def testNumber(self):
+        settings = draft.DraftSettings(precision = 1)
+        self.assertEqual(settings.number(12.345), "12.3")
+        self.assertEqual(settings.number(12.0), "12")
+        self.assertEqual(settings.number("5"), "5")
+        self.assertEqual(settings.number(-0.01), "0")
+        self.assertEqual(draft.DraftSettings(precision = 0).number(12.6), "13")
+
+    def testTooSmall(self):
+        settings = draft.DraftSettings(min_size = 4)
+        self.assertTrue(settings.tooSmall(3, 3))
+        self.assertFalse(settings.tooSmall(3, 30))
+
+class TestDraftConversion(TestCase):
+    def setUp(self):
+        self.data = SyntheticGraffle(shapes=80, text_density=0.8, seed=6).xml()
+
+    def testRough(self):
+        full = convert(self.data)
+        rough = convert(self.data, draft = True)
+        self.assertTrue("<text" in full and "<text" not in rough)
+        self.assertTrue("marker" in full and "marker" not in rough)
+        self.assertTrue("DropShadow" in full and "DropShadow" not in rough)
+        self.assertTrue(len(rough) < len(full) / 2)
+
+    def testSmallSkipped(self):
+        stats = Instrumentation()
+        convert(self.data, draft = draft.DraftSettings(min_size = 50), stats = stats)
+        self.assertTrue(stats.counters["draft skipped"] > 0)
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestSimplify))
+    TS.addTest(makeSuite(TestSettings))
+    TS.addTest(makeSuite(TestDraftConversion))
+    return TS
@@ -0,0 +1,59 @@
+from unittest import makeSuite, TestCase, TestSuite
+import threading
+import StringIO
+import main
+from engine import ConversionEngine, convert
+from synthetic import SyntheticGraffle
+
+def direct(data, page = 0):
+    gp = main.GraffleParser()
+    gp.walkGraffle(data, page = page)
+    return gp.svg.encode("utf-8")
+
+class TestConvert(TestCase):
+    def setUp(self):
+        self.first = SyntheticGraffle(shapes=30, depth=1, seed=3).xml()
+        self.second = SyntheticGraffle(shapes=20, sheets=2, seed=4).xml()
+
+    def testSameAsParser(self):
+        self.assertEqual(convert(self.first), direct(self.first))
+
+    def testSink(self):
+        out = StringIO.StringIO()
+        written = convert(self.second, out, page = 1)
+        self.assertEqual(out.getvalue(), direct(self.second, 1))
+        self.assertEqual(written, len(out.getvalue()))
+
+    def testData(self):
+        import gzip
+        zipped = StringIO.StringIO()
+        f = gzip.GzipFile(fileobj = zipped, mode = "wb")
+        f.write(self.first)
+        f.close()
+        self.assertEqual(convert(zipped.getvalue()), direct(self.first))
+        self.assertEqual(convert("\n  " + self.first), direct(self.first))
+
+    def testReuseIsolated(self):
+        engine = ConversionEngine()
+        engine.convert(self.first)
+        self.assertEqual(engine.convert(self.second), direct(self.second))
+        self.assertEqual(engine.convert(self.first, streaming = True), direct(self.first))
+
+    def testThreads(self):
+        engine = ConversionEngine()
+        expected = [direct(self.first), direct(self.second)]
+        results = {}
+        def work(n):
+            results[n] = [engine.convert(self.first), engine.convert(self.second)]
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for n in range(4):
+            self.assertEqual(results[n], expected)
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestConvert))
+    return TS
@@ -0,0 +1,100 @@
+from unittest import makeSuite, TestCase, TestSuite
+import os
+import shutil
+import tempfile
+from engine import convert
+from fragments import FragmentCache, Fragment
+from instrument import Instrumentation
+from synthetic import SyntheticGraffle, plistDocument
+
+class TestFragmentCache(TestCase):
+    def testLRU(self):
+        cache = FragmentCache(maxsize = 2)
+        for key in "abc":
+            cache.put(key, Fragment(key, "", (), ""))
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.get("c").text, "c")
+        self.assertEqual(len(cache), 2)
+
+    def testDirectory(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            FragmentCache(directory = tmpdir).put("ab12", Fragment(u"<g/>", "\t", ("Bar",), "font"))
+            fragment = FragmentCache(directory = tmpdir).get("ab12")
+            self.assertEqual((fragment.text, fragment.indent, fragment.required_defs, fragment.font),
+                             (u"<g/>", "\t", ("Bar",), "font"))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def testCorruptFile(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = FragmentCache(directory = tmpdir)
+            cache.put("ab12", Fragment(u"<g/>", "\t", (), "font"))
+            marker = os.path.join(tmpdir, "unpickled")
+            pickled = "cos\nsystem\n(S'touch %s'\ntR." % marker
+            for junk in ("", "garbage", "[1, 2]", '{"text": 5}', pickled):
+                f = open(cache.path("ab12"), "wb")
+                f.write(junk)
+                f.close()
+                self.assertEqual(FragmentCache(directory = tmpdir).get("ab12"), None)
+                self.assertFalse(os.path.exists(cache.path("ab12")))
+            self.assertFalse(os.path.exists(marker))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def testPrune(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = FragmentCache(directory = tmpdir, max_bytes = 2000)
+            size = len(Fragment(u"x" * 100, "\t", (), "font").toJSON())
+            for i in range(40):
+                key = "%04d" % i
+                cache.put(key, Fragment(u"x" * 100, "\t", (), "font"))
+                # the first is used all along, so it stays
+                os.utime(cache.path("0000"), None)
+                os.utime(cache.path(key), (i, i))
+            cache.prune()
+            kept = [name for name in os.listdir(os.path.join(tmpdir, "00"))]
+            self.assertTrue(len(kept) * size <= 2000)
+            self.assertTrue("00" in kept)
+            self.assertTrue("39" in kept)
+            self.assertFalse("01" in kept)
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestCachedConversion(TestCase):
+    def setUp(self):
+        self.doc = SyntheticGraffle(shapes=60, depth=1, text_density=0.5, layers=2, seed=8).document()
+        self.cache = FragmentCache()
+
+    def convert(self):
+        stats = Instrumentation()
+        data = plistDocument(self.doc)
+        svg = convert(data, fragment_cache = self.cache, stats = stats)
+        self.assertEqual(svg, convert(data))
+        return stats.counters
+
+    def testReused(self):
+        first = self.convert()
+        second = self.convert()
+        self.assertEqual(second["fragment cache hits"], first["fragment cache misses"])
+        self.assertFalse("fragment cache misses" in second)
+
+    def testOptimise(self):
+        data = plistDocument(self.doc)
+        cold = convert(data, fragment_cache = self.cache, optimise = True)
+        warm = convert(data, fragment_cache = self.cache, optimise = True)
+        self.assertEqual(warm, cold)
+        self.assertEqual(cold, convert(data, optimise = True))
+
+    def testEdit(self):
+        self.convert()
+        self.doc["Sheets"][0]["GraphicsList"][3]["Graphics"][0]["Bounds"] = "{{1, 2}, {30, 40}}"
+        self.assertEqual(self.convert()["fragment cache misses"], 1)
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestFragmentCache))
+    TS.addTest(makeSuite(TestCachedConversion))
+    return TS
@@ -66,9 +66,22 @@ class TestRotate(TestGeom):
         rotated =geom.rotate_points(pts, 180.000001)
         self.assertFigureAlmostEqual(rotated,[[1., 1.], [-1., 1.]])
 
+
+class TestRect(TestCase):
+    def testInRect(self):
+        self.assertTrue(geom.in_rect((0, 0, 10, 10), (10, 5)))
+        self.assertFalse(geom.in_rect((0, 0, 10, 10), (12, 5)))
+        self.assertTrue(geom.in_rect((0, 0, 10, 10), (12, 5), 2))
+
+    def testEdgePoint(self):
+        self.assertEqual(geom.rect_edge_point((0, 0, 10, 20), (30, 10)), [10., 10.])
+        self.assertEqual(geom.rect_edge_point((0, 0, 10, 20), (5, -40)), [5., 0.])
+        self.assertEqual(geom.rect_edge_point((0, 0, 10, 20), (6, 11)), [6., 11.])
+
       
 def get_tests():
     TS = TestSuite()
     TS.addTest(makeSuite(TestCentre))
     TS.addTest(makeSuite(TestRotate))
+    TS.addTest(makeSuite(TestRect))
     return TS
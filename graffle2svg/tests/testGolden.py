@@ -0,0 +1,13 @@
+from unittest import makeSuite, TestCase, TestSuite
+import benchmark
+
+class TestGolden(TestCase):
+    """Converted output of the golden documents must only change on purpose
+       (run benchmark.py --update-golden to accept a change)"""
+    def testGoldenOutput(self):
+        self.assertEqual(benchmark.checkGolden(), [])
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestGolden))
+    return TS
@@ -0,0 +1,57 @@
+from unittest import makeSuite, TestCase, TestSuite
+from layers import LayerFilter
+from engine import convert
+from instrument import Instrumentation
+from synthetic import SyntheticGraffle
+
+SHEET = {"Layers": [{"Name": "Front"},
+                    {"Name": "Scratch", "View": "NO"},
+                    {"Name": "Back", "Print": "NO"}],
+         "GraphicsList": [{"ID": 1, "Layer": "0"}, {"ID": 2, "Layer": "2"},
+                          {"ID": 3, "Layer": "1"}, {"ID": 4, "Layer": "0"},
+                          {"ID": 5}]}
+
+def ids(sheet_layers):
+    return [(layer["Name"], [g["ID"] for g in graphics])
+            for layer, graphics in sheet_layers]
+
+class TestLayerFilter(TestCase):
+    def testBackToFront(self):
+        self.assertEqual(ids(LayerFilter().sheetLayers(SHEET)),
+                         [("Back", [2]), ("Scratch", [3]), ("Front", [1, 4, 5])])
+
+    def testSkip(self):
+        self.assertEqual(ids(LayerFilter(skip_hidden = True).sheetLayers(SHEET)),
+                         [("Back", [2]), ("Front", [1, 4, 5])])
+        self.assertEqual(ids(LayerFilter(skip_hidden = True, skip_nonprinting = True).sheetLayers(SHEET)),
+                         [("Front", [1, 4, 5])])
+
+    def testNames(self):
+        self.assertEqual(ids(LayerFilter(["Scratch", 2]).sheetLayers(SHEET)),
+                         [("Back", [2]), ("Scratch", [3])])
+
+    def testNoLayers(self):
+        graphics = [{"ID": 1}]
+        self.assertEqual(LayerFilter(["Front"]).sheetLayers({"GraphicsList": graphics}),
+                         [(None, graphics)])
+
+class TestLayerRendering(TestCase):
+    def setUp(self):
+        self.data = SyntheticGraffle(shapes=30, layers=3, seed=5).xml()
+
+    def testGroups(self):
+        self.assertEqual(convert(self.data).count('<g class="layer">'), 3)
+
+    def testSkipped(self):
+        stats = Instrumentation()
+        svg = convert(self.data, skip_hidden_layers = True, stats = stats)
+        self.assertEqual(svg.count('<g class="layer">'), 2)
+        everything = Instrumentation()
+        convert(self.data, stats = everything)
+        self.assertTrue(stats.counters["class:ShapedGraphic"] < everything.counters["class:ShapedGraphic"])
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestLayerFilter))
+    TS.addTest(makeSuite(TestLayerRendering))
+    return TS
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+import StringIO
+
+from engine import convert
+from synthetic import SyntheticGraffle, nestedGroups
+from memory import MemoryBudgetExceeded
+from limits import ResourceLimits, ResourceLimitExceeded, TooManyElements, NestingTooDeep, \
+                   TooManyPoints, TooMuchText, OutputTooLarge, TimeLimitExceeded, \
+                   EntityDeclared, UNTRUSTED
+import plist
+
+class TestLimits(TestCase):
+    def setUp(self):
+        self.data = SyntheticGraffle(shapes=40, depth=1, text_density=0.5, seed=5).xml()
+
+    def testWithinLimits(self):
+        self.assertEqual(convert(self.data, limits = UNTRUSTED), convert(self.data))
+
+    def testElements(self):
+        self.assertRaises(TooManyElements, convert, self.data,
+                          limits = ResourceLimits(max_elements = 100))
+
+    def testDepth(self):
+        self.assertRaises(NestingTooDeep, convert, nestedGroups(200),
+                          limits = ResourceLimits(max_depth = 50))
+        convert(nestedGroups(20), limits = ResourceLimits(max_depth = 50))
+
+    def testPoints(self):
+        self.assertRaises(TooManyPoints, convert, self.data, limits = ResourceLimits(max_points = 1))
+
+    def testText(self):
+        self.assertRaises(TooMuchText, convert, self.data, limits = ResourceLimits(max_text = 1000))
+
+    def testOutput(self):
+        self.assertRaises(OutputTooLarge, convert, self.data, limits = ResourceLimits(max_output = 1000))
+        self.assertRaises(OutputTooLarge, convert, self.data, StringIO.StringIO(),
+                          limits = ResourceLimits(max_output = 1000))
+
+    def testTime(self):
+        self.assertRaises(TimeLimitExceeded, convert, self.data, limits = ResourceLimits(max_seconds = 0))
+        # checked while decoding too, without a progress callback
+        try:
+            plist.decodePlist(self.data, limits = ResourceLimits(max_seconds = 0).start())
+        except TimeLimitExceeded, e:
+            self.assertEqual(e.stage, "decode")
+        else:
+            self.fail("time not limited while decoding")
+
+    def testEntities(self):
+        # each level expands ten times - in an attribute, where max_text doesn't see it
+        entities = ['<!ENTITY l0 "%s">' % ("x" * 100)]
+        for level in range(1, 6):
+            entities.append('<!ENTITY l%d "%s">' % (level, ("&l%d;" % (level - 1)) * 10))
+        bomb = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<!DOCTYPE plist [%s]>\n'
+                '<plist version="&l5;"><dict><key>GraphicsList</key><array/></dict></plist>'
+                % "".join(entities))
+        self.assertRaises(EntityDeclared, convert, bomb, limits = UNTRUSTED)
+        # the usual DOCTYPE is fine
+        self.assertTrue("<!DOCTYPE plist PUBLIC" in self.data)
+        convert(self.data, limits = ResourceLimits())
+
+    def testShared(self):
+        limits = ResourceLimits(max_text = len(self.data))
+        for i in range(3):
+            convert(self.data, limits = limits)
+        self.assertEqual(limits.text, 0)
+
+    def testErrorTypes(self):
+        self.assertTrue(issubclass(MemoryBudgetExceeded, ResourceLimitExceeded))
+        try:
+            plist.decodePlist(nestedGroups(10), limits = ResourceLimits(max_depth = 5).start())
+        except ResourceLimitExceeded, e:
+            self.assertEqual((e.stage, e.used, e.limit), ("decode", 6, 5))
+        else:
+            self.fail("nesting not limited")
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestLimits))
+    return TS
@@ -1,7 +1,11 @@
 
 from unittest import makeSuite, TestCase, TestSuite
+import difflib
 import main
 import xml.dom.minidom
+import plist
+from engine import convert
+from synthetic import nestedGroups, SyntheticGraffle, network, plistDocument
 
 class TestMkHex(TestCase):
 
@@ -43,8 +47,173 @@ class TestGraffleParser(TestCase):
         self.assertEqual(dict['Shape'], 'RoundRect')
 
 
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.gp = main.GraffleParser()
+        self.gp.walkGraffle("""<plist><dict><key>GraphDocumentVersion</key><integer>5</integer>
+<key>GraphicsList</key><array>
+<dict><key>Class</key><string>Mystery</string></dict>
+<dict><key>Class</key><string>Mystery</string></dict>
+<dict><key>Class</key><string>ShapedGraphic</string><key>Shape</key><string>Circle</string>
+<key>Bounds</key><string>{{0, 0}, {10, 10}}</string></dict>
+</array></dict></plist>""")
+
+    def testWarningsCounted(self):
+        self.assertEqual(self.gp.stats.warnings, {'Don\'t know how to display Class "Mystery"': 2})
+
+    def testCounters(self):
+        self.assertEqual(self.gp.stats.counters["class:Mystery"], 2)
+        self.assertEqual(self.gp.stats.counters["shape:Circle"], 1)
+
+    def testPhases(self):
+        self.assertEqual(self.gp.stats.phase_order[:3], ["parse", "decode", "render"])
+
+class TestLineEnds(TestCase):
+    def setUp(self):
+        self.gp = main.GraffleParser()
+        self.gp.graphic_index = main.graphicIndex({"GraphicsList": [
+            {"ID": "3", "Bounds": "{{300, 100}, {100, 50}}"},
+            {"ID": "9", "Class": "Group", "Graphics": [
+                {"ID": "4", "Bounds": "{{50, 100}, {100, 50}}",
+                 "Magnets": ["{1, 0}", "{0, 1}"]}]}]})
+        self.line = {"Tail": {"ID": "4"}, "Head": {"ID": "3"}}
+
+    def testIndex(self):
+        self.assertEqual(sorted(self.gp.graphic_index.keys()), [3, 4, 9])
+
+    def testUpToDate(self):
+        pts = [[150., 125.], [300., 125.]]
+        self.assertEqual(self.gp.connectLineEnds(self.line, pts), pts)
+        self.assertFalse("moved line ends" in self.gp.stats.counters)
+
+    def testMoved(self):
+        # tail goes to the nearest magnet, head to the edge of the bounds
+        self.assertEqual(self.gp.connectLineEnds(self.line, [[0., 0.], [900., 125.]]),
+                         [[150., 125.], [300., 125.]])
+        self.assertEqual(self.gp.stats.counters["moved line ends"], 2)
+
+    def testUnconnected(self):
+        pts = [[0., 0.], [900., 125.]]
+        self.assertEqual(self.gp.connectLineEnds({"Head": {"ID": "77"}}, pts), pts)
+
+
+class TestDeepNesting(TestCase):
+    """Nesting is only limited by memory, not the python stack"""
+    def setUp(self):
+        self.data = nestedGroups(3000)
+
+    def testDecode(self):
+        gp = main.GraffleParser()
+        # comparing such deep dicts directly would itself recurse
+        self.assertEqual(main.graffleFingerprint(gp.findGraffleDict(xml.dom.minidom.parseString(self.data))),
+                         main.graffleFingerprint(plist.decodePlist(self.data)))
+
+    def testConvert(self):
+        svg = convert(self.data)
+        self.assertEqual(svg, convert(self.data, streaming = True))
+        self.assertEqual(svg.count("<g"), 3001)
+        self.assertEqual(svg.count("<ellipse"), 1)
+
+    def testSameOrder(self):
+        data = SyntheticGraffle(shapes=60, depth=4, text_density=0.5, seed=9).xml()
+        gp = main.GraffleParser()
+        gp.walkGraffle(data)
+        self.assertEqual(gp.svg, xml.dom.minidom.Document.toprettyxml(gp.svg_dom))
+
+class TestMergePaths(TestCase):
+    def paths(self, svg):
+        dom = xml.dom.minidom.parseString(svg)
+        return [(p.getAttribute("style"), p.getAttribute("d"))
+                for p in dom.getElementsByTagName("path")]
+
+    def testNetwork(self):
+        data = network(100, 300)
+        plain = convert(data)
+        merged = convert(data, merge_paths = True)
+        self.assertTrue(len(merged) < len(plain) / 2)
+        # one path of lines under one of the nodes
+        self.assertEqual(merged.count("<path"), 2)
+        self.assertEqual(merged.count("<rect"), 0)
+        lines = lambda svg: "".join([d for (style, d) in self.paths(svg) if "fill:none" in style])
+        self.assertEqual(lines(merged), lines(plain))
+
+    def testLongRun(self):
+        merged = convert(network(2, main.MAX_MERGED_PATHS * 2 + 1), merge_paths = True)
+        self.assertEqual(merged.count("<path"), 4)
+
+    def testKeptApart(self):
+        # lines with arrow heads, and shapes with shadows, are never joined
+        data = SyntheticGraffle(shapes=80, seed=3).xml()
+        plain = convert(data)
+        merged = convert(data, merge_paths = True)
+        self.assertTrue(merged.count("<path") < plain.count("<path") + plain.count("<rect"))
+        for part in ("marker-end:url", "filter:url"):
+            self.assertEqual(merged.count(part), plain.count(part))
+
+    def testOverlapping(self):
+        shape = lambda gid, x: {"Class": "ShapedGraphic", "ID": gid, "Shape": "Rectangle",
+                                "Bounds": "{{%d, 0}, {50, 50}}" % x,
+                                "Style": {"shadow": {"Draws": "NO"}}}
+        data = plistDocument({"GraphDocumentVersion": 5,
+                              "GraphicsList": [shape(1, 0), shape(2, 100), shape(3, 130)]})
+        merged = self.paths(convert(data, merge_paths = True))
+        self.assertEqual(len(merged), 2)
+
+class TestStableIds(TestCase):
+    def setUp(self):
+        self.document = SyntheticGraffle(shapes=40, depth=1, text_density=0.5, seed=6).document()
+
+    def ids(self, svg):
+        dom = xml.dom.minidom.parseString(svg)
+        return [e.getAttribute("id") for e in dom.getElementsByTagName("*")
+                if e.getAttribute("id")]
+
+    def testIds(self):
+        svg = convert(plistDocument(self.document), stable_ids = True)
+        ids = self.ids(svg)
+        self.assertEqual(len(ids), len(set(ids)))
+        sheet = self.document["Sheets"][0]
+        group = sheet["GraphicsList"][0]
+        self.assertTrue('<g id="s0-g%d"' % group["ID"] in svg)
+        self.assertTrue('id="s0-g%d"' % group["Graphics"][0]["ID"] in svg)
+
+    def testUniqueID(self):
+        self.document["Sheets"][0]["UniqueID"] = 7
+        svg = convert(plistDocument(self.document), stable_ids = True)
+        self.assertTrue('id="s7-g2"' in svg)
+
+    def testRepeatedID(self):
+        graphics = self.document["Sheets"][0]["GraphicsList"][0]["Graphics"]
+        graphics[1]["ID"] = graphics[0]["ID"]
+        ids = self.ids(convert(plistDocument(self.document), stable_ids = True))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertTrue("s0-g%d-2" % graphics[0]["ID"] in ids)
+
+    def testLocalDiff(self):
+        before = convert(plistDocument(self.document), stable_ids = True).splitlines()
+        graphics = self.document["Sheets"][0]["GraphicsList"][0]["Graphics"]
+        # (a shape no line is connected to, as those would move too)
+        connected = set(main.connectedIDs({"Graphics": self.document["Sheets"][0]["GraphicsList"]}))
+        shape = [g for g in graphics if g["Class"] == "ShapedGraphic" and "Text" in g
+                 and g["ID"] not in connected][0]
+        del shape["Text"]
+        shape["Bounds"] = "{{5, 5}, {50, 50}}"
+        after = convert(plistDocument(self.document), stable_ids = True).splitlines()
+        # only the lines of the shape, and its text, change
+        changed = [line for line in difflib.unified_diff(before, after, n = 0, lineterm = "")
+                   if line[:1] in "+-" and line[:3] not in ("+++", "---")]
+        self.assertTrue(changed)
+        for line in changed:
+            if not line[1:].strip().startswith("</"):
+                self.assertTrue('id="s0-g%d' % shape["ID"] in line, line)
+
 def get_tests():
     TS = TestSuite()
     TS.addTest(makeSuite(TestMkHex))
     TS.addTest(makeSuite(TestGraffleParser))
+    TS.addTest(makeSuite(TestInstrumentation))
+    TS.addTest(makeSuite(TestLineEnds))
+    TS.addTest(makeSuite(TestDeepNesting))
+    TS.addTest(makeSuite(TestMergePaths))
+    TS.addTest(makeSuite(TestStableIds))
     return TS
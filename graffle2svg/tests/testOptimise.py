@@ -0,0 +1,101 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+import xml.dom.minidom
+
+from engine import convert
+from synthetic import SyntheticGraffle, nestedGroups
+from optimise import optimiseSvg, parseStyle, normalValue, INHERITED, INITIAL, sameValue
+
+def drawnElements(svg):
+    """(tag, attributes, computed style) of each element drawn, in order"""
+    dom = xml.dom.minidom.parseString(svg)
+    drawn = []
+    stack = [(dom.documentElement, {})]
+    while stack:
+        element, inherited = stack.pop()
+        style = parseStyle(element.getAttribute("style"))
+        computed = dict(inherited)
+        computed.update(style)
+        passed = dict((name, value) for (name, value) in computed.items() if name in INHERITED)
+        children = [child for child in element.childNodes
+                    if child.nodeType == child.ELEMENT_NODE]
+        text = [child.data for child in element.childNodes if child.nodeType == child.TEXT_NODE]
+        text = "".join(text).strip()
+        # text can take its style from the tspans inside it
+        if element.tagName not in ("svg", "g", "defs", "text") or text:
+            attrs = sorted((name, element.getAttribute(name))
+                           for name in element.attributes.keys()
+                           if name != "style" and (name != "id" or element.getAttribute(name)))
+            computed = sorted((name, normalValue(value)) for (name, value) in computed.items()
+                              if not sameValue(value, INITIAL.get(name)))
+            drawn.append((element.tagName, attrs, computed, text))
+        stack.extend((child, passed) for child in reversed(children))
+    return drawn
+
+class TestOptimise(TestCase):
+    def assertSameDrawing(self, data, **options):
+        plain = convert(data, **options)
+        optimised = convert(data, optimise = True, **options)
+        self.assertTrue(len(optimised) < len(plain))
+        self.assertEqual(drawnElements(optimised), drawnElements(plain))
+        return optimised
+
+    def testSynthetic(self):
+        svg = self.assertSameDrawing(SyntheticGraffle(shapes=80, depth=2, text_density=0.5,
+                                                      layers=2, seed=11).xml())
+        self.assertFalse('id=""' in svg)
+        self.assertFalse("<g>" in svg)
+        self.assertEqual(svg.count('class="layer"'), 2)
+
+    def testDraft(self):
+        self.assertSameDrawing(SyntheticGraffle(shapes=60, depth=1, seed=4).xml(), draft = True)
+
+    def testNested(self):
+        svg = self.assertSameDrawing(nestedGroups(30))
+        self.assertTrue(svg.count("<g") < 30)
+
+    def testHoist(self):
+        dom = xml.dom.minidom.parseString(
+            '<svg><g style="fill:#fff"><g><rect style="fill:red;stroke:blue"/>'
+            '<rect style="stroke:blue;fill:red;opacity:1" id=""/></g></g></svg>')
+        optimiseSvg(dom)
+        self.assertEqual(dom.documentElement.toxml(),
+                         '<svg><g style="fill:red;stroke:blue"><rect/><rect/></g></svg>')
+
+    def testMergeSiblings(self):
+        dom = xml.dom.minidom.parseString(
+            '<svg><g class="layer"><g style="fill:red"><rect/><rect x="1"/></g>'
+            '<g style="fill:red"><rect y="1"/><rect/></g><rect/></g></svg>')
+        optimiseSvg(dom)
+        self.assertEqual(dom.documentElement.toxml(),
+                         '<svg><g class="layer"><g style="fill:red"><rect/><rect x="1"/>'
+                         '<rect y="1"/><rect/></g><rect/></g></svg>')
+
+    def testTextKept(self):
+        # the text node inherits from the text element - nothing is hoisted past it
+        dom = xml.dom.minidom.parseString(
+            '<svg><text style="fill:red">a<tspan style="fill:blue">b</tspan>'
+            '<tspan style="fill:blue">c</tspan></text></svg>')
+        optimiseSvg(dom)
+        self.assertEqual(dom.documentElement.toxml(),
+                         '<svg><text style="fill:red">a<tspan style="fill:blue">b</tspan>'
+                         '<tspan style="fill:blue">c</tspan></text></svg>')
+
+    def testOff(self):
+        data = SyntheticGraffle(shapes=20, seed=2).xml()
+        self.assertEqual(convert(data, optimise = False), convert(data))
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestOptimise))
+    return TS
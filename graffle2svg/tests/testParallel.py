@@ -0,0 +1,83 @@
+from unittest import makeSuite, TestCase, TestSuite
+import main
+import parallel
+from instrument import Instrumentation
+from synthetic import SyntheticGraffle
+
+class TestRenderSheets(TestCase):
+    def setUp(self):
+        self.gen = SyntheticGraffle(shapes=15, sheets=4, images=2, seed=9)
+        self.document = main.GraffleParser().decodeGraffle(self.gen.xml())
+
+    def serial(self):
+        out = []
+        for page in range(self.gen.sheets):
+            gp = main.GraffleParser()
+            gp.walkGraffle(self.gen.xml(), page = page)
+            out.append(gp.svg.encode("utf-8"))
+        return out
+
+    def testSameAsSerial(self):
+        stats = Instrumentation()
+        self.assertEqual(parallel.renderSheets(self.document, processes = 3, stats = stats), self.serial())
+        self.assertEqual(stats.counters["class:SolidGraphic"], self.gen.sheets)
+
+    def testSomePages(self):
+        self.assertEqual(parallel.renderSheets(self.document, pages = [2, 0], processes = 1),
+                         [self.serial()[2], self.serial()[0]])
+
+class TestRenderPartitioned(TestCase):
+    def setUp(self):
+        self.gen = SyntheticGraffle(shapes=60, depth=2, text_density=0.5, images=2, seed=4)
+        self.document = main.GraffleParser().decodeGraffle(self.gen.xml())
+        self.min_partition = parallel.MIN_PARTITION
+        parallel.MIN_PARTITION = 1
+
+    def tearDown(self):
+        parallel.MIN_PARTITION = self.min_partition
+
+    def serial(self):
+        gp = main.GraffleParser()
+        gp.walkGraffle(self.gen.xml())
+        return gp.svg.encode("utf-8")
+
+    def testSameAsSerial(self):
+        stats = Instrumentation()
+        svg = parallel.renderPartitioned(self.document, processes = 3, chunks = 7, stats = stats)
+        self.assertEqual(svg, self.serial())
+        self.assertEqual(stats.counters["class:SolidGraphic"], 1)
+
+    def testStableIds(self):
+        gp = main.GraffleParser(stable_ids = True)
+        gp.walkGraffle(self.gen.xml())
+        svg = parallel.renderPartitioned(self.document, processes = 3, chunks = 7,
+                                         stable_ids = True)
+        self.assertEqual(svg, gp.svg.encode("utf-8"))
+
+    def testEngine(self):
+        import engine
+        self.assertEqual(engine.convert(self.gen.xml(), processes = 2), self.serial())
+
+    def testPartition(self):
+        graphics = main.graffleSheets(self.document)[0]["GraphicsList"]
+        ranges = parallel.partition(graphics, 5)
+        self.assertTrue(len(ranges) <= 5)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(graphics))
+        for (a, b), (c, d) in zip(ranges, ranges[1:]):
+            self.assertEqual(b, c)
+        self.assertEqual(parallel.partition([{}, {}], 4), [(0, 1), (1, 2)])
+
+class TestRenderPartitionedLayers(TestRenderPartitioned):
+    """The same, with the graphics split between two layers"""
+    def setUp(self):
+        TestRenderPartitioned.setUp(self)
+        self.gen = SyntheticGraffle(shapes=60, depth=1, text_density=0.5, images=2, seed=4, layers=2)
+        self.document = main.GraffleParser().decodeGraffle(self.gen.xml())
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestRenderSheets))
+    TS.addTest(makeSuite(TestRenderPartitioned))
+    TS.addTest(makeSuite(TestRenderPartitionedLayers))
+    return TS
@@ -0,0 +1,57 @@
+from unittest import makeSuite, TestCase, TestSuite
+from pathdata import encodePath, formatUnits
+import main
+
+class TestFormat(TestCase):
+    def testNumbers(self):
+        self.assertEqual(formatUnits(12500, 3), "12.5")
+        self.assertEqual(formatUnits(-500, 3), "-.5")
+        self.assertEqual(formatUnits(0, 3), "0")
+        self.assertEqual(formatUnits(3000, 3), "3")
+        self.assertEqual(formatUnits(7, 0), "7")
+        self.assertRaises(ValueError, formatUnits, 7, -1)
+
+class TestEncode(TestCase):
+    def testHorizontalVertical(self):
+        self.assertEqual(encodePath([("M", (0, 0)), ("L", (10, 0)), ("L", (10, 10)), ("Z",)]),
+                         "M0 0H10V10z")
+
+    def testRelativeWhenShorter(self):
+        self.assertEqual(encodePath([("M", (1000, 1000)), ("L", (1001, 1002)), ("L", (1003, 1001))]),
+                         "M1000 1000l1 2 2-1")
+
+    def testPrecision(self):
+        self.assertEqual(encodePath([("M", (0.12345, 1.5)), ("L", (2.25, 3.75))], 1),
+                         "M.1 1.5 2.3 3.8")
+
+    def testWholeNumbers(self):
+        self.assertEqual(encodePath([("M", (0.4, 14.6)), ("L", (20.4, 3.2))], 0),
+                         "M0 15 20 3")
+
+    def testNegativePrecision(self):
+        self.assertRaises(ValueError, encodePath, [("M", (10, 20))], -1)
+
+    def testCurves(self):
+        self.assertEqual(encodePath([("M", (0, 0)), ("C", (0, 5), (5, 10), (10, 10)),
+                                     ("C", (10, 10), (20, 10), (20, 10))]),
+                         "M0 0C0 5 5 10 10 10H20")
+
+    def testPoint(self):
+        self.assertEqual(encodePath([("M", (5, 5)), ("L", (5, 5))]), "M5 5l0 0")
+
+class TestBezier(TestCase):
+    def testCurvesFromUnitPoints(self):
+        gp = main.GraffleParser()
+        unit = ["{-0.5, 0}", "{-0.5, -0.5}", "{0.5, -0.5}", "{0.5, 0}",
+                "{0.5, 0.5}", "{-0.5, 0.5}"]
+        gp.svg_addBezier(gp.svg_current_layer, [0., 0., 40., 40.], {"UnitPoints": unit})
+        path = gp.svg_dom.getElementsByTagName("path")[0]
+        # two curves, the second back to the start
+        self.assertEqual(path.getAttribute("d"), "M10 20c0-10 20-10 20 0 0 10-20 10-20 0z")
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestFormat))
+    TS.addTest(makeSuite(TestEncode))
+    TS.addTest(makeSuite(TestBezier))
+    return TS
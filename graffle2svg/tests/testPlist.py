@@ -0,0 +1,120 @@
+from unittest import makeSuite, TestCase, TestSuite, skipIf
+import StringIO
+import xml.dom.minidom
+import main
+import plist
+import memory
+from memory import MemoryBudget, MemoryBudgetExceeded
+from engine import convert
+from synthetic import SyntheticGraffle
+from fileinfo import read_info
+
+class TestDecodePlist(TestCase):
+    def testScalars(self):
+        d = plist.decodePlist("<plist><dict><key>a</key><integer>1</integer>"
+                              "<key>b</key><true/><key>c</key><string></string></dict></plist>")
+        self.assertEqual(d, {"a": "1", "b": True, "c": ""})
+
+    def testNested(self):
+        d = plist.decodePlist("<dict><key>a</key><array><dict/><array><real>2</real></array></array></dict>")
+        self.assertEqual(d, {"a": [{}, ["2"]]})
+
+    def testSameAsDOM(self):
+        data = SyntheticGraffle(shapes=60, depth=2, sheets=2, images=2).xml()
+        gp = main.GraffleParser()
+        expected = gp.findGraffleDict(xml.dom.minidom.parseString(data))
+        self.assertEqual(plist.decodePlist(data), expected)
+        self.assertEqual(plist.decodePlist(StringIO.StringIO(data)), expected)
+
+class TestStreamingConversion(TestCase):
+    def setUp(self):
+        self.data = SyntheticGraffle(shapes=40, depth=1, text_density=0.5).xml()
+
+    def testSameOutput(self):
+        gp = main.GraffleParser()
+        gp.walkGraffle(self.data)
+        streamed = main.GraffleParser()
+        streamed.walkGraffle(StringIO.StringIO(self.data), streaming=True)
+        out = StringIO.StringIO()
+        streamed.writeSvg(out)
+        self.assertEqual(out.getvalue(), gp.svg.encode("utf-8"))
+
+    def testBudgetExceeded(self):
+        gp = main.GraffleParser(budget = MemoryBudget(1))
+        self.assertRaises(MemoryBudgetExceeded, gp.walkGraffle, self.data, streaming=True)
+
+    def testBudgetAfterLargeConversion(self):
+        # what earlier conversions used doesn't count against this one
+        convert(SyntheticGraffle(shapes=500, text_density=0.5).xml())
+        self.assertTrue(memory.processMemory() > 20 * 1048576)
+        convert(self.data, max_memory = 20)
+
+    @skipIf(memory.tracemalloc is None, "tracemalloc not available")
+    def testSharedTracing(self):
+        first = MemoryBudget(1 << 30).start()
+        second = MemoryBudget(1 << 30).start()
+        first.stop()
+        self.assertTrue(memory.tracemalloc.is_tracing())
+        second.stop()
+        self.assertFalse(memory.tracemalloc.is_tracing())
+
+class LimitedReader(object):
+    """A file which fails if read beyond limit bytes"""
+    def __init__(self, data, limit):
+        self.data = StringIO.StringIO(data)
+        self.limit = limit
+
+    def read(self, size):
+        if self.data.tell() >= self.limit:
+            raise AssertionError("read too far")
+        return self.data.read(size)
+
+class TestPlistScanner(TestCase):
+    def testSkip(self):
+        scanner = plist.PlistScanner("<dict><key>a</key><array><array/><array><dict><key>x</key>"
+                                     "<array></array></dict></array></array>"
+                                     "<key>b &amp; c</key><string>text</string></dict>")
+        self.assertEqual(scanner.nextTag(), "dict")
+        keys = scanner.dictKeys()
+        self.assertEqual(keys.next(), "a")
+        scanner.skipNext()
+        self.assertEqual(keys.next(), "b & c")
+        self.assertEqual(scanner.readValue(), "text")
+        self.assertRaises(StopIteration, keys.next)
+
+    def testSmallReads(self):
+        data = SyntheticGraffle(shapes=30, sheets=2).xml()
+        scanner = plist.PlistScanner(StringIO.StringIO(data))
+        self.assertEqual(scanner.nextTag(), "plist")
+        self.assertEqual(scanner.nextTag(), "dict")
+        keys = [key for key in scanner.dictKeys() if scanner.skipNext() is None]
+        self.assertEqual(keys, sorted(plist.decodePlist(data).keys()))
+
+class TestReadInfo(TestCase):
+    def testInfo(self):
+        data = SyntheticGraffle(shapes=30, sheets=3).xml()
+        info = read_info(data)
+        self.assertEqual((info["version"], info["creator"], info["paper_size"]),
+                         (6, "graffle2svg synthetic", [612., 792.]))
+        self.assertEqual(info["sheet_titles"], ["Canvas 1", "Canvas 2", "Canvas 3"])
+        self.assertEqual(info["sheet_count"], 3)
+
+    def testStopsEarly(self):
+        # nothing is wanted after the top level keys up to PrintInfo
+        data = ("<plist><dict><key>Creator</key><string>me</string>"
+                "<key>GraphDocumentVersion</key><integer>5</integer>"
+                "<key>GraphicsList</key><array>%s</array>"
+                "<key>ModificationDate</key><string>today</string>"
+                "<key>SheetTitle</key><string>Only</string>"
+                "<key>Zoom</key><real>1</real>" % ("<dict/>" * 50))
+        info = read_info(LimitedReader(data + " " * 100000 + "</dict></plist>", len(data) + 1))
+        self.assertEqual((info["version"], info["creator"], info["modified"], info["sheet_titles"]),
+                         (5, "me", "today", ["Only"]))
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestDecodePlist))
+    TS.addTest(makeSuite(TestStreamingConversion))
+    TS.addTest(makeSuite(TestPlistScanner))
+    TS.addTest(makeSuite(TestReadInfo))
+    return TS
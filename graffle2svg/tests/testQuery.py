@@ -0,0 +1,73 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+
+from query import iter_graphics, graphicBounds
+from synthetic import SyntheticGraffle
+from rtf import rtfPlainText
+
+class TestIterGraphics(TestCase):
+    def setUp(self):
+        self.doc = {"Sheets": [
+            {"Layers": [{"Name": "Front"}, {"Name": "Back"}],
+             "GraphicsList": [
+                {"Class": "ShapedGraphic", "ID": 1, "Shape": "Circle", "Layer": 1,
+                 "Bounds": "{{10, 20}, {30, 40}}",
+                 "Text": {"Text": r"{\rtf1{\fonttbl\f0 Helvetica;}\f0\fs24 \cf0 Hello\
+world}"}},
+                {"Class": "Group", "ID": 2, "Graphics": [
+                    {"Class": "LineGraphic", "ID": 3, "Points": ["{0, 5}", "{10, 0}"]},
+                    {"Class": "ShapedGraphic", "ID": 4, "Bounds": "{{5, 5}, {20, 20}}"}]}]},
+            {"GraphicsList": [{"Class": "ShapedGraphic", "ID": 5,
+                               "Bounds": "{{0, 0}, {1, 1}}"}]}]}
+
+    def testAll(self):
+        found = [(g.sheet, g.id, g.depth, g.parent) for g in iter_graphics(self.doc)]
+        self.assertEqual(found, [(0, 1, 0, None), (0, 2, 0, None), (0, 3, 1, 2),
+                                 (0, 4, 1, 2), (1, 5, 0, None)])
+
+    def testFilters(self):
+        self.assertEqual([g.id for g in iter_graphics(self.doc, sheet = 0, recursive = False)],
+                         [1, 2])
+        self.assertEqual([g.id for g in iter_graphics(self.doc, classes = ["ShapedGraphic"])],
+                         [1, 4, 5])
+
+    def testDetails(self):
+        first = iter_graphics(self.doc).next()
+        self.assertEqual((first.cls, first.shape, first.layer, first.bounds),
+                         ("ShapedGraphic", "Circle", "Back", (10., 20., 30., 40.)))
+        self.assertEqual(first.text, "Hello\nworld")
+
+    def testBounds(self):
+        group = self.doc["Sheets"][0]["GraphicsList"][1]
+        self.assertEqual(graphicBounds(group["Graphics"][0]), (0., 0., 10., 5.))
+        self.assertEqual(graphicBounds(group), (0., 0., 25., 25.))
+
+    def testSource(self):
+        gen = SyntheticGraffle(shapes=30, depth=1, text_density=0.5, seed=4)
+        self.assertEqual(len(list(iter_graphics(gen.xml()))),
+                         len(list(iter_graphics(gen.document()))))
+
+class TestPlainText(TestCase):
+    def testEscapes(self):
+        self.assertEqual(rtfPlainText(r"{\rtf1\ansi{\colortbl;\red0\green0\blue0;}"
+                                      r"{\*\expandedcolortbl;;}caf\'e9 \{1\}\\ \u8364? x}"),
+                         u"caf\xe9 {1}\\ \u20ac x")
+        # stand-ins written as escapes, and more than one of them
+        self.assertEqual(rtfPlainText(r"{\rtf1 caf\u233\'e9 {\uc2 \u8364\'80\'80x} \u8364?}"),
+                         u"caf\xe9 \u20acx \u20ac")
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestIterGraphics))
+    TS.addTest(makeSuite(TestPlainText))
+    return TS
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+import json
+import StringIO
+
+from main import GraffleParser
+from engine import convert
+from synthetic import SyntheticGraffle, nestedGroups
+from draft import DraftSettings
+import scene
+
+class TestScene(TestCase):
+    def setUp(self):
+        self.xml = SyntheticGraffle(shapes=80, depth=2, text_density=0.5, images=3,
+                                    layers=2, seed=21).xml()
+        self.document = GraffleParser().decodeGraffle(self.xml)
+
+    def emit(self, emitter, built):
+        out = StringIO.StringIO()
+        emitter.write(built, out)
+        return out.getvalue()
+
+    def testStreamMatchesParser(self):
+        self.assertEqual(self.emit(scene.StreamEmitter(), scene.buildScene(self.document)),
+                         convert(self.xml))
+
+    def testDOMMatchesParser(self):
+        self.assertEqual(self.emit(scene.DOMEmitter(), scene.buildScene(self.document)),
+                         convert(self.xml))
+
+    def testStableIds(self):
+        built = scene.buildScene(self.document, stable_ids = True)
+        self.assertEqual(self.emit(scene.StreamEmitter(), built),
+                         convert(self.xml, stable_ids = True))
+
+    def testDraft(self):
+        built = scene.buildScene(self.document, draft = DraftSettings())
+        self.assertEqual(self.emit(scene.StreamEmitter(), built),
+                         convert(self.xml, draft = True))
+
+    def testDOMOnlyOptions(self):
+        self.assertRaises(ValueError, scene.buildScene, self.document, optimise = True)
+        self.assertRaises(ValueError, scene.buildScene, self.document, merge_paths = True)
+        built = scene.buildScene(self.document, optimise = False, merge_paths = False)
+        self.assertEqual(self.emit(scene.StreamEmitter(), built),
+                         convert(self.xml, optimise = False, merge_paths = False))
+
+    def testStyleHandles(self):
+        built = scene.buildScene(self.document)
+        self.assertEqual(len(built.styles), len(set(built.styles)))
+        self.assertTrue(isinstance(built.root.style, int))
+
+    def testSlots(self):
+        node = scene.Rect(0, 0, 10, 10, None, None, 0)
+        self.assertRaises(AttributeError, setattr, node, "colour", "red")
+
+    def testNumbers(self):
+        builder = scene.SceneBuilder()
+        builder.reset()
+        layer = builder.svg_current_layer
+        builder.svg_addRect(layer, x = "1", y = 2, width = "30", height = "40.5")
+        text = builder.svg_addTextElement(layer, x = "5", y = 6)
+        builder.svg_addLine(text, x = "5", y = 6, text = u"a")
+        rect = layer.children[0]
+        for value in (rect.x, rect.y, rect.width, rect.height, text.x, text.y,
+                      text.children[0].x, text.children[0].y):
+            self.assertTrue(isinstance(value, float))
+        self.assertEqual((rect.x, rect.width, text.x), (1., 30., 5.))
+
+    def testJSON(self):
+        built = scene.buildScene(self.document)
+        tree = json.loads(self.emit(scene.JSONEmitter(), built))
+        self.assertEqual(tree["styles"], built.styles)
+        self.assertEqual(tree["root"]["type"], "g")
+        self.assertEqual(len(tree["root"]["children"]), len(built.root.children))
+        self.assertEqual(self.emit(scene.JSONEmitter(), built),
+                         json.dumps(scene.JSONEmitter().asDict(built), separators = (",", ":")))
+
+    def testDeepNesting(self):
+        deep = GraffleParser().decodeGraffle(nestedGroups(5000))
+        built = scene.buildScene(deep)
+        self.assertEqual(self.emit(scene.StreamEmitter(), built), convert(nestedGroups(5000)))
+        text = self.emit(scene.JSONEmitter(), built)
+        self.assertTrue(text.count('"type":"g"') > 5000)
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestScene))
+    return TS
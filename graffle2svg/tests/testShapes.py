@@ -0,0 +1,61 @@
+from unittest import makeSuite, TestCase, TestSuite
+import main
+import shapes
+
+def drawShape(shape):
+    gp = main.GraffleParser()
+    gp.walkGraffle("""<plist><dict><key>GraphDocumentVersion</key><integer>5</integer>
+<key>GraphicsList</key><array>
+<dict><key>Class</key><string>ShapedGraphic</string><key>Shape</key><string>%s</string>
+<key>Bounds</key><string>{{10, 20}, {100, 50}}</string></dict>
+</array></dict></plist>""" % shape)
+    return gp
+
+class TestOutline(TestCase):
+    def testPlace(self):
+        outline = shapes.UnitOutline([(0.5, 0), (1, 1), (0, 1)])
+        self.assertEqual(outline.place((10, 20, 100, 50)), [[60., 20.], [110., 70.], [10., 70.]])
+
+    def testCloudFillsSquare(self):
+        pts = shapes.cloudOutline()
+        self.assertEqual(min(p[0] for p in pts), 0)
+        self.assertEqual(max(p[0] for p in pts), 1)
+        self.assertEqual(min(p[1] for p in pts), 0)
+        self.assertEqual(max(p[1] for p in pts), 1)
+
+class TestRegistry(TestCase):
+    def tearDown(self):
+        shapes.SHAPE_RENDERERS.pop("Pentagon", None)
+
+    def testDiamond(self):
+        path = drawShape("Diamond").svg_dom.getElementsByTagName("path")[0]
+        self.assertEqual(path.getAttribute("d"), "M60 20l50 25L60 70 10 45z")
+
+    def testCloudOutline(self):
+        gp = drawShape("Cloud")
+        self.assertEqual(gp.svg_dom.getElementsByTagName("rect"), [])
+        self.assertEqual(len(gp.svg_dom.getElementsByTagName("path")), 1)
+
+    def testOldMethods(self):
+        for shape in ("Diamond", "Subprocess", "Cloud", "HorizontalTriangle",
+                      "RightTriangle", "VerticalTriangle"):
+            gp = main.GraffleParser()
+            gp.reset()
+            getattr(gp, "svg_add" + shape)(gp.svg_current_layer, ["10", "20", "100", "50"])
+            drawn = drawShape(shape)
+            for tag, attr in (("path", "d"), ("rect", "width")):
+                self.assertEqual([e.getAttribute(attr) for e in gp.svg_dom.getElementsByTagName(tag)],
+                                 [e.getAttribute(attr) for e in drawn.svg_dom.getElementsByTagName(tag)])
+
+    def testRegister(self):
+        self.assertTrue("Pentagon" in drawShape("Pentagon").stats.warnings.keys()[0])
+        shapes.registerOutline("Pentagon", [(0.5, 0), (1, 0.38), (0.81, 1), (0.19, 1), (0, 0.38)])
+        gp = drawShape("Pentagon")
+        self.assertEqual(gp.stats.warnings, {})
+        self.assertEqual(len(gp.svg_dom.getElementsByTagName("path")), 1)
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestOutline))
+    TS.addTest(makeSuite(TestRegistry))
+    return TS
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+import subprocess
+import sys
+
+import benchmark
+
+def childModules(code):
+    """The modules loaded after running code in a fresh interpreter"""
+    child = subprocess.Popen([sys.executable, "-c",
+                              "import sys\n" + code + "\n"
+                              "sys.stdout.write(' '.join(sorted(name for name, module in "
+                              "sys.modules.items() if module is not None)))\n"],
+                             stdout = subprocess.PIPE, env = benchmark.startupEnvironment())
+    output = child.communicate()[0]
+    if child.returncode != 0:
+        raise AssertionError("%r failed" % code)
+    return output.split()
+
+class TestLazyImports(TestCase):
+    def testPackage(self):
+        loaded = childModules("import graffle2svg")
+        self.assertEqual([name for name in loaded if name.startswith("graffle2svg.")], [])
+
+    def testSubmodules(self):
+        childModules("import graffle2svg\n"
+                     "assert graffle2svg.main.GraffleParser is graffle2svg.GraffleParser\n"
+                     "assert graffle2svg.engine.convert is graffle2svg.convert\n"
+                     "assert graffle2svg.scene.buildScene\n"
+                     "assert graffle2svg.geom is graffle2svg.main.geom")
+
+    def testConvert(self):
+        loaded = childModules("import graffle2svg.engine")
+        for name in ("multiprocessing", "xml.sax.saxutils", "zipfile", "subprocess",
+                     "graffle2svg.parallel", "graffle2svg.optimise", "graffle2svg.memory"):
+            self.assertFalse(name in loaded, name)
+
+    def testExports(self):
+        childModules("import graffle2svg, graffle2svg.engine, graffle2svg.main\n"
+                     "assert graffle2svg.convert is graffle2svg.engine.convert\n"
+                     "assert graffle2svg.GraffleParser is graffle2svg.main.GraffleParser\n"
+                     "assert 'read_info' in graffle2svg.__all__\n"
+                     "assert 'sheetElementIds' in graffle2svg.__all__\n"
+                     "import graffle2svg.scene\n"
+                     "from graffle2svg import *\n"
+                     "assert ResourceLimitExceeded and iter_graphics")
+
+class TestStartupBenchmark(TestCase):
+    def testMeasure(self):
+        result = benchmark.measureStartup(repeat = 1)
+        self.assertTrue(0 < result["import_seconds"] < result["first_byte_seconds"])
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestLazyImports))
+    TS.addTest(makeSuite(TestStartupBenchmark))
+    return TS
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from unittest import makeSuite, TestCase, TestSuite
+import os
+import shutil
+import tempfile
+
+from textindex import TextIndex, textStrings
+from synthetic import SyntheticGraffle, WORDS
+
+def writeDocument(directory, name, **args):
+    f = open(os.path.join(directory, name), "w")
+    f.write(SyntheticGraffle(**args).xml())
+    f.close()
+
+class TestTextIndex(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.docs = os.path.join(self.tmpdir, "docs")
+        os.mkdir(self.docs)
+        writeDocument(self.docs, "a.graffle", shapes=20, text_density=1.0, seed=1)
+        writeDocument(self.docs, "b.graffle", shapes=20, text_density=1.0, seed=2)
+        self.index = TextIndex(os.path.join(self.tmpdir, "index.sqlite"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def testSearch(self):
+        self.assertEqual(self.index.update(self.docs, processes = 1)["added"], 2)
+        sheet, graphic, bounds, text = list(textStrings(os.path.join(self.docs, "a.graffle")))[0]
+        word = text.split()[0]
+        matches = [(m.path, m.graphic) for m in self.index.search(word, limit = 1000)]
+        self.assertTrue(("a.graffle", graphic) in matches)
+        match = self.index.search(word)[0]
+        self.assertTrue(word in match.text)
+        self.assertEqual(len(match.bounds), 4)
+
+    def testIncremental(self):
+        self.index.update(self.docs, processes = 1)
+        result = self.index.update(self.docs, processes = 1)
+        self.assertEqual((result["added"], result["unchanged"]), (0, 2))
+        writeDocument(self.docs, "a.graffle", shapes=3, text_density=1.0, seed=3)
+        os.remove(os.path.join(self.docs, "b.graffle"))
+        result = self.index.update(self.docs, processes = 1)
+        self.assertEqual((result["updated"], result["removed"]), (1, 1))
+        paths = set(m.path for m in self.index.search(" OR ".join(WORDS), limit = 1000))
+        self.assertEqual(paths, set(["a.graffle"]))
+
+    def testErrors(self):
+        f = open(os.path.join(self.docs, "broken.graffle"), "w")
+        f.write("<?xml version='1.0'?><plist><dict>")
+        f.close()
+        result = self.index.update(self.docs, processes = 1)
+        self.assertEqual(result["added"], 2)
+        self.assertEqual(result["errors"].keys(), ["broken.graffle"])
+        # a file which breaks after it was indexed isn't found any more
+        shutil.copy(os.path.join(self.docs, "broken.graffle"), os.path.join(self.docs, "a.graffle"))
+        result = self.index.update(self.docs, processes = 1)
+        self.assertEqual(sorted(result["errors"]), ["a.graffle", "broken.graffle"])
+        paths = set(m.path for m in self.index.search(" OR ".join(WORDS), limit = 1000))
+        self.assertEqual(paths, set(["b.graffle"]))
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestTextIndex))
+    return TS
@@ -0,0 +1,67 @@
+from unittest import makeSuite, TestCase, TestSuite
+import os
+import shutil
+import tempfile
+import watch
+from main import graffleFingerprint
+
+SHEET = """<dict><key>GraphicsList</key><array><dict>
+<key>Bounds</key><string>{{%d, 0}, {10, 10}}</string>
+<key>Class</key><string>ShapedGraphic</string>
+<key>Shape</key><string>Rectangle</string>
+</dict></array></dict>"""
+
+def graffleDoc(*xs):
+    return """<?xml version="1.0" encoding="UTF-8"?><plist version="1.0"><dict>
+<key>GraphDocumentVersion</key><integer>5</integer>
+<key>Sheets</key><array>%s</array></dict></plist>""" % "".join([SHEET % x for x in xs])
+
+class TestOutputName(TestCase):
+    def testSingleSheet(self):
+        self.assertEqual(watch.sheetOutputName("out", "in/a.graffle", 0, 1), os.path.join("out", "a.svg"))
+
+    def testMultiSheet(self):
+        self.assertEqual(watch.sheetOutputName("out", "in/a.graffle", 2, 3), os.path.join("out", "a-2.svg"))
+
+class TestFingerprint(TestCase):
+    def testKeyOrder(self):
+        self.assertEqual(graffleFingerprint({"a":1, "b":[1, 2]}), graffleFingerprint({"b":[1, 2], "a":1}))
+
+    def testChanged(self):
+        self.assertNotEqual(graffleFingerprint({"a":[1, 2]}), graffleFingerprint({"a":[2, 1]}))
+
+class TestWatcher(TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.mkdtemp()
+        self.outdir = tempfile.mkdtemp()
+        self.watcher = watch.GraffleWatcher(self.srcdir, self.outdir, use_inotify=False)
+        self.source = os.path.join(self.srcdir, "doc.graffle")
+
+    def tearDown(self):
+        shutil.rmtree(self.srcdir)
+        shutil.rmtree(self.outdir)
+
+    def write(self, *xs):
+        f = open(self.source, "w")
+        f.write(graffleDoc(*xs))
+        f.close()
+
+    def testOnlyChangedSheets(self):
+        self.write(0, 10)
+        self.assertEqual(len(self.watcher.convertFile(self.source)), 2)
+        self.write(0, 20)
+        self.assertEqual(self.watcher.convertFile(self.source), [os.path.join(self.outdir, "doc-1.svg")])
+
+    def testRemovedSheets(self):
+        self.write(0, 10)
+        self.watcher.convertFile(self.source)
+        self.write(0)
+        self.watcher.convertFile(self.source)
+        self.assertEqual(os.listdir(self.outdir), ["doc.svg"])
+
+def get_tests():
+    TS = TestSuite()
+    TS.addTest(makeSuite(TestOutputName))
+    TS.addTest(makeSuite(TestFingerprint))
+    TS.addTest(makeSuite(TestWatcher))
+    return TS
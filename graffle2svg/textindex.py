@@ -0,0 +1,166 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""A full text index of the diagrams in a directory.
+
+    index = TextIndex("diagrams.sqlite")
+    index.update("docs/diagrams")       # only reads files which changed
+    for match in index.search("load balancer"):
+        print match.path, match.sheet, match.graphic, match.text
+
+Only the text of each graphic is read (through query.iter_graphics and
+rtf.rtfPlainText) - nothing is drawn. Changed files are read in worker
+processes; the index, a SQLite database with an FTS4 table, keeps a hash
+of each file so unchanged files are skipped next time.
+"""
+import os
+import sqlite3
+import multiprocessing
+
+from query import iter_graphics
+from graffledir import graffleFiles, fileHash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS strings (id INTEGER PRIMARY KEY, path TEXT NOT NULL,
+    sheet INTEGER, graphic INTEGER, x REAL, y REAL, width REAL, height REAL);
+CREATE INDEX IF NOT EXISTS strings_path ON strings (path);
+CREATE VIRTUAL TABLE IF NOT EXISTS strings_text USING fts4 (text);
+"""
+
+
+class TextMatch(object):
+    """A string found by TextIndex.search - bounds are (x, y, width, height)
+       or None"""
+    __slots__ = ("path", "sheet", "graphic", "bounds", "text")
+
+    def __init__(self, path, sheet, graphic, bounds, text):
+        self.path = path
+        self.sheet = sheet
+        self.graphic = graphic
+        self.bounds = bounds
+        self.text = text
+
+    def __repr__(self):
+        return "<TextMatch %s sheet %s graphic %s %r>" % (self.path, self.sheet,
+                                                        self.graphic, self.text)
+
+
+def textStrings(source):
+    """(sheet, graphic ID, bounds, text) for each graphic with some text"""
+    for info in iter_graphics(source):
+        text = info.text
+        if text and text.strip():
+            yield (info.sheet, info.id, info.bounds, text)
+
+
+def readStrings(task):
+    """What the workers run: (path, hash, strings, error)"""
+    path, full_path, digest = task
+    try:
+        return path, digest, list(textStrings(full_path)), None
+    except Exception, e:
+        return path, digest, None, "%s: %s" % (e.__class__.__name__, e)
+
+
+class TextIndex(object):
+    """The full text index kept in the SQLite database db_path"""
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def removeFile(self, path):
+        ids = [row[0] for row in
+               self.db.execute("SELECT id FROM strings WHERE path = ?", (path,))]
+        self.db.executemany("DELETE FROM strings_text WHERE docid = ?",
+                            [(i,) for i in ids])
+        self.db.execute("DELETE FROM strings WHERE path = ?", (path,))
+        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def addFile(self, path, digest, strings):
+        for sheet, graphic, bounds, text in strings:
+            x = y = width = height = None
+            if bounds is not None:
+                x, y, width, height = bounds
+            cursor = self.db.execute("INSERT INTO strings (path, sheet, graphic, x, y, width, height) "
+                                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (path, sheet, graphic, x, y, width, height))
+            self.db.execute("INSERT INTO strings_text (docid, text) VALUES (?, ?)",
+                            (cursor.lastrowid, text))
+        self.db.execute("INSERT INTO files (path, hash) VALUES (?, ?)", (path, digest))
+
+    def update(self, directory, processes = None):
+        """Bring the index up to date with the graffle files under
+           directory (paths are kept relative to it). Returns a dict of
+           how many files were added, updated, removed, unchanged, and
+           the errors from files which couldn't be read - an indexed file
+           which can no longer be read is dropped from the index, so its
+           old text isn't found, and read again next time."""
+        known = dict(self.db.execute("SELECT path, hash FROM files"))
+        result = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "errors": {}}
+        tasks = []
+        present = set()
+        for path in graffleFiles(directory):
+            present.add(path)
+            full_path = os.path.join(directory, path)
+            digest = fileHash(full_path)
+            if known.get(path) == digest:
+                result["unchanged"] += 1
+            else:
+                tasks.append((path, full_path, digest))
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        processes = min(processes, len(tasks))
+        if processes <= 1:
+            results = [readStrings(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(readStrings, tasks, chunksize = 1)
+            finally:
+                pool.close()
+                pool.join()
+
+        with self.db:
+            for path in set(known) - present:
+                self.removeFile(path)
+                result["removed"] += 1
+            for path, digest, strings, error in results:
+                if error is not None:
+                    result["errors"][path] = error
+                    if path in known:
+                        self.removeFile(path)
+                    continue
+                if path in known:
+                    self.removeFile(path)
+                    result["updated"] += 1
+                else:
+                    result["added"] += 1
+                self.addFile(path, digest, strings)
+        return result
+
+    def search(self, query, limit = 100):
+        """TextMatches for an FTS query ("load balancer", "cache*", ...)"""
+        rows = self.db.execute("SELECT s.path, s.sheet, s.graphic, s.x, s.y, s.width, s.height, t.text "
+                               "FROM strings_text t JOIN strings s ON s.id = t.docid "
+                               "WHERE strings_text MATCH ? ORDER BY s.path, s.sheet, s.id LIMIT ?",
+                               (query, limit))
+        matches = []
+        for path, sheet, graphic, x, y, width, height, text in rows:
+            bounds = None
+            if x is not None:
+                bounds = (x, y, width, height)
+            matches.append(TextMatch(path, sheet, graphic, bounds, text))
+        return matches
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+#Copyright (c) 2009, Tim Wintle
+#All rights reserved.
+#
+#Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#    * Neither the name of the project nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+#THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Watch a directory and re-convert graffle files as they are saved"""
+import os
+import sys
+import time
+import struct
+import select
+
+from main import GraffleParser, graffleSheets, graffleFingerprint
+from fragments import FragmentCache
+from graffledir import GRAFFLE_EXTENSION
+import filepack
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0x00000800
+
+def sheetOutputName(outdir, source, page, sheet_count):
+    """foo.graffle -> foo.svg, or foo-N.svg when the document has several sheets"""
+    base = os.path.splitext(os.path.basename(source))[0]
+    if sheet_count > 1:
+        base = "%s-%d" % (base, page)
+    return os.path.join(outdir, base + ".svg")
+
+
+class InotifyChanges(object):
+    """Reports names changed in a directory using Linux's inotify.
+       Construction raises OSError where inotify isn't available."""
+    def __init__(self, path):
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+               IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self.fd, path, mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        """Return the names touched within timeout seconds"""
+        names = set()
+        readable = select.select([self.fd], [], [], timeout)[0]
+        if not readable:
+            return names
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError:
+            return names
+        i = 0
+        header = struct.calcsize("iIII")
+        while i + header <= len(data):
+            wd, mask, cookie, length = struct.unpack_from("iIII", data, i)
+            name = data[i + header:i + header + length].rstrip("\0")
+            if name:
+                names.add(name)
+            i += header + length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class GraffleWatcher(object):
+    """Keeps OUTDIR's svg files in step with the graffle files in SRCDIR.
+
+       OmniGraffle writes a file in several steps, so a file is only
+       converted once it has stopped changing for `settle` seconds. Only
+       sheets whose contents changed are drawn and written again.
+    """
+    def __init__(self, srcdir, outdir, interval = 0.2, settle = 0.3,
+                 use_inotify = True):
+        self.srcdir = srcdir
+        self.outdir = outdir
+        self.interval = interval
+        self.settle = settle
+        # one parser, reset for every sheet, keeping the svg of graphics
+        # so an edit only redraws what changed
+        self.parser = GraffleParser(fragment_cache = FragmentCache())
+        # path -> (mtime, size)
+        self.stats = {}
+        # path -> time of last change seen, waiting to settle
+        self.pending = {}
+        # path -> list of sheet fingerprints last written
+        self.sheets = {}
+        self.notifier = None
+        if use_inotify:
+            try:
+                self.notifier = InotifyChanges(srcdir)
+            except (OSError, ImportError, AttributeError):
+                self.notifier = None
+
+    def isGraffle(self, name):
+        return name.endswith(GRAFFLE_EXTENSION) and not name.startswith(".")
+
+    def statFile(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def noteChange(self, path, now):
+        """Record the current stat of path, marking it pending if it moved"""
+        st = self.statFile(path)
+        if st != self.stats.get(path):
+            if st is None:
+                self.stats.pop(path, None)
+            else:
+                self.stats[path] = st
+            self.pending[path] = now
+
+    def poll(self, now):
+        """Find changed files by stat'ing the directory's graffle files"""
+        names = [n for n in os.listdir(self.srcdir) if self.isGraffle(n)]
+        seen = set()
+        for name in names:
+            path = os.path.join(self.srcdir, name)
+            seen.add(path)
+            self.noteChange(path, now)
+        for path in list(self.stats.keys()):
+            if path not in seen:
+                self.noteChange(path, now)
+
+    def tick(self, timeout = None):
+        """Wait for changes and convert whatever has settled.
+           Returns the list of svg files written"""
+        if timeout is None:
+            timeout = self.interval
+        if self.notifier is not None:
+            names = self.notifier.wait(timeout)
+            now = time.time()
+            for name in names:
+                if self.isGraffle(name):
+                    self.noteChange(os.path.join(self.srcdir, name), now)
+            # a file that is still being written will be re-stat'ed until
+            # it stops changing
+            for path in list(self.pending.keys()):
+                self.noteChange(path, now)
+        else:
+            time.sleep(timeout)
+            now = time.time()
+            self.poll(now)
+
+        written = []
+        for path, changed in list(self.pending.items()):
+            if now - changed < self.settle:
+                continue
+            st = self.statFile(path)
+            if st != self.stats.get(path):
+                # still being written to
+                self.noteChange(path, now)
+                continue
+            del self.pending[path]
+            written.extend(self.convertFile(path))
+        return written
+
+    def convertFile(self, path):
+        """Re-convert the sheets of path which have changed"""
+        if not os.path.exists(path):
+            return self.removeOutputs(path, 0)
+        try:
+            gfp = filepack.GraffleFilePack(path)
+            data = gfp.read()
+            gfp.close()
+            mydict = self.parser.decodeGraffle(data)
+        except Exception, e:
+            sys.stderr.write("%s: could not read: %s\n" % (path, e))
+            return []
+
+        sheets = graffleSheets(mydict)
+        # drawing a sheet also depends on the document header
+        header = graffleFingerprint([mydict.get("GraphDocumentVersion"),
+                                     mydict.get("PrintInfo"),
+                                     mydict.get("ImageList")])
+        old = self.sheets.get(path, [])
+        new = []
+        written = []
+        for page, sheet in enumerate(sheets):
+            fp = header + graffleFingerprint(sheet)
+            new.append(fp)
+            outname = sheetOutputName(self.outdir, path, page, len(sheets))
+            if page < len(old) and old[page] == fp and \
+                    len(old) == len(sheets) and os.path.exists(outname):
+                continue
+            try:
+                self.parser.reset()
+                self.parser.walkGraffleDict(mydict, page)
+                self.parser.svg_add_requirements()
+                svg = self.parser.svg
+            except Exception, e:
+                sys.stderr.write("%s: could not convert sheet %d: %s\n" % (path, page, e))
+                new[-1] = None
+                continue
+            f = open(outname, "w")
+            f.write(svg.encode("utf-8"))
+            f.close()
+            written.append(outname)
+        self.parser.reset()
+
+        if len(old) != len(sheets):
+            # sheet numbering is part of the file name
+            self.removeOutputs(path, len(sheets), len(old))
+        self.sheets[path] = new
+        return written
+
+    def removeOutputs(self, path, count, previous = None):
+        """Remove svg files of sheets which no longer exist"""
+        if previous is None:
+            previous = len(self.sheets.pop(path, []))
+        keep = set([sheetOutputName(self.outdir, path, page, count)
+                    for page in range(count)])
+        for page in range(previous):
+            outname = sheetOutputName(self.outdir, path, page, previous)
+            if outname not in keep and os.path.exists(outname):
+                os.remove(outname)
+        return []
+
+    def run(self):
+        """Convert everything once, then keep watching until interrupted"""
+        self.poll(time.time() - self.settle)
+        try:
+            while True:
+                for outname in self.tick():
+                    sys.stderr.write("wrote %s\n" % outname)
+        finally:
+            if self.notifier is not None:
+                self.notifier.close()